@@ -1,17 +1,12 @@
-import io
-import base64
 import random
 import contextlib
 from typing import List, Optional, Dict, Any
 
 # --- LIBRERÍAS ---
+# (sklearn se importa sólo al agrupar; matplotlib no se usa en la API)
 import osmnx as ox
 import networkx as nx
 import numpy as np
-import matplotlib
-matplotlib.use('Agg') 
-import matplotlib.pyplot as plt
-from sklearn.cluster import AgglomerativeClustering
 
 # --- FASTAPI ---
 from fastapi import FastAPI, HTTPException
@@ -193,7 +188,8 @@ def simulacion_leaflet(
     id_inicio: str = None, 
     id_fin: str = None, 
     accion_id: str = None, 
-    accion_tipo: str = None
+    accion_tipo: str = None,
+    semilla: int = None  # misma semilla -> mismos puntos (escenarios reproducibles)
 ):
     global CACHE_SIMULACION
     if G is None: raise HTTPException(503, "Mapa cargando...")
@@ -222,13 +218,14 @@ def simulacion_leaflet(
     if not puntos_totales:
         print(">>> Generando puntos nuevos...")
         CANTIDAD = 30
+        rnd = random.Random(semilla)
         puntos_totales = []
         for i in range(CANTIDAD):
-            lat = LAT_CENTRO + random.uniform(-0.010, 0.010)
-            lon = LON_CENTRO + random.uniform(-0.010, 0.010)
+            lat = LAT_CENTRO + rnd.uniform(-0.010, 0.010)
+            lon = LON_CENTRO + rnd.uniform(-0.010, 0.010)
             
             # Determinamos rol al nacer
-            es_vip = random.random() < 0.20
+            es_vip = rnd.random() < 0.20
             rol = "VIP" if es_vip else "NORMAL"
             
             puntos_totales.append({
@@ -298,6 +295,7 @@ def simulacion_leaflet(
     
     # 6. CLUSTERING
     if num > 1:
+        from sklearn.cluster import AgglomerativeClustering
         model = AgglomerativeClustering(n_clusters=None, metric='precomputed', linkage='complete', distance_threshold=RADIO_CLUSTER_METROS)
         model.fit(cost_matrix_barrio)
         labels = model.labels_
@@ -0,0 +1,83 @@
+# backend_arquitecturado/app/core/compresion.py
+"""
+Middleware ASGI de compresión negociada: brotli (si el módulo está instalado y el cliente
+lo acepta) o gzip. Sólo comprime tipos de texto/JSON y cuerpos de al menos `minimo` bytes;
+las respuestas en streaming (NDJSON de /tabla) se comprimen por partes.
+"""
+import zlib
+
+try:
+    import brotli
+except ImportError:  # dependencia opcional
+    brotli = None
+
+COMPRIMIBLES = ("application/json", "application/x-ndjson", "application/vnd.mapbox-vector-tile", "text/")
+
+
+def _elegir(aceptadas):
+    aceptadas = aceptadas.lower()
+    if brotli is not None and "br" in aceptadas: return "br"
+    if "gzip" in aceptadas: return "gzip"
+    return None
+
+
+class _Compresor:
+    def __init__(self, codificacion, nivel_gzip):
+        self.codificacion = codificacion
+        if codificacion == "br": self._c = brotli.Compressor(quality=4)
+        else: self._c = zlib.compressobj(nivel_gzip, zlib.DEFLATED, 31)  # wbits=31 -> formato gzip
+
+    def parte(self, datos, vaciar=False):
+        """vaciar=True (streaming): lo comprimido sale ya, sin esperar a más datos."""
+        if self.codificacion == "br":
+            return self._c.process(datos) + (self._c.flush() if vaciar else b"")
+        return self._c.compress(datos) + (self._c.flush(zlib.Z_SYNC_FLUSH) if vaciar else b"")
+
+    def fin(self):
+        return self._c.finish() if self.codificacion == "br" else self._c.flush()
+
+
+class CompresionMiddleware:
+    def __init__(self, app, minimo=1024, nivel_gzip=5):
+        self.app, self.minimo, self.nivel_gzip = app, minimo, nivel_gzip
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        cabeceras = dict(scope.get("headers") or [])
+        codificacion = _elegir(cabeceras.get(b"accept-encoding", b"").decode("latin-1"))
+        if codificacion is None:
+            return await self.app(scope, receive, send)
+
+        inicio = None
+        compresor = None
+
+        async def enviar(mensaje):
+            nonlocal inicio, compresor
+            if mensaje["type"] == "http.response.start":
+                inicio = mensaje  # se manda junto con el primer cuerpo (hay que decidir cabeceras)
+                return
+            if mensaje["type"] != "http.response.body" or inicio is None:
+                return await send(mensaje)
+
+            cuerpo, mas = mensaje.get("body", b""), mensaje.get("more_body", False)
+            if compresor is None and inicio is not False:
+                hs = [(k, v) for k, v in inicio["headers"]]
+                tipo = next((v.decode("latin-1") for k, v in hs if k.lower() == b"content-type"), "")
+                ya = any(k.lower() == b"content-encoding" for k, _ in hs)
+                if ya or not tipo.startswith(COMPRIMIBLES) or (not mas and len(cuerpo) < self.minimo):
+                    await send(inicio); inicio = False
+                    return await send(mensaje)
+                compresor = _Compresor(codificacion, self.nivel_gzip)
+                hs = [(k, v) for k, v in hs if k.lower() != b"content-length"]
+                hs += [(b"content-encoding", codificacion.encode()), (b"vary", b"Accept-Encoding")]
+                datos = compresor.parte(cuerpo, vaciar=mas) + (b"" if mas else compresor.fin())
+                if not mas: hs.append((b"content-length", str(len(datos)).encode()))
+                await send({**inicio, "headers": hs}); inicio = False
+                return await send({"type": "http.response.body", "body": datos, "more_body": mas})
+            if compresor is None:
+                return await send(mensaje)
+            datos = compresor.parte(cuerpo, vaciar=mas) + (b"" if mas else compresor.fin())
+            await send({"type": "http.response.body", "body": datos, "more_body": mas})
+
+        await self.app(scope, receive, enviar)
@@ -1,4 +1,5 @@
 # backend_arquitecturado/app/core/config.py
+import os
 
 # ==========================================
 # 1. CONFIGURACIÓN DEL MAPA (TERRENO DE JUEGO)
@@ -15,12 +16,16 @@ DISTANCIA = 30000
 # Tipo de red ('drive' es lo más ligero para autos)
 TIPO_RED = "drive"
 
+# Modo ligero del artefacto: tipo de vía como entero y geometrías como bytes (no shapely)
+MODO_LIGERO = True
+
 # ==========================================
 # 2. CONFIGURACIÓN DE GENERACIÓN (PUNTOS)
 # ==========================================
 
 # Radio de dispersión de los puntos aleatorios.
 OFFSET_ALEATORIO = 0.015 
+OFFSET_POR_ZONA = {"polanco": 0.012}  # zonas con caja más chica
 
 # Centros donde aparecerán los puntos aleatorios
 COORDS_ZONAS = {
@@ -61,6 +66,10 @@ COORDS_ZONAS = {
 
 TIEMPO_SERVICIO_MIN = 5  # Tiempo promedio de entrega por parada (minutos)
 
+# Ventanas de entrega (suaves): al optimizar, cada segundo de retraso pesa como PESO_TARDANZA segundos
+# de manejo. Cada parada puede traer su propio servicio_min; si no, se usa TIEMPO_SERVICIO_MIN
+PESO_TARDANZA = 10
+
 # Velocidades promedio para estimaciones
 VEL_CALLE_KMH = 20 
 VEL_AVENIDA_KMH = 50
@@ -68,9 +77,173 @@ VEL_AVENIDA_KMH = 50
 # Tipos de vías que consideramos "rápidas"
 TIPOS_AVENIDA = ['primary', 'secondary', 'trunk', 'primary_link', 'secondary_link']
 
+# Perfiles de velocidad por hora del día (km/h por clase de vía; los *_link usan su clase y
+# cualquier clase no listada usa 'otro'). Sin hora de salida se usa travel_time (velocidades de arriba)
+PERFILES_VELOCIDAD = {
+    "pico":  {"motorway": 35, "trunk": 30, "primary": 22, "secondary": 18, "tertiary": 15, "otro": 12},
+    "valle": {"motorway": 70, "trunk": 55, "primary": 45, "secondary": 35, "tertiary": 28, "otro": 20},
+    "noche": {"motorway": 90, "trunk": 75, "primary": 60, "secondary": 50, "tertiary": 40, "otro": 30},
+}
+
+# Qué perfil aplica a cada hora de salida: (hora_inicio, hora_fin) -> perfil, fin exclusivo
+HORARIO_PERFILES = [
+    ((0, 6), "noche"), ((6, 10), "pico"), ((10, 17), "valle"), ((17, 21), "pico"), ((21, 24), "noche"),
+]
+
+# ==========================================
+# 4. BÚSQUEDA ACOTADA (MATRICES DE TIEMPO)
+# ==========================================
+
+# Tamaño de celda del índice espacial de nodos (grados, ~550 m)
+TAM_CELDA_INDICE = 0.005
+
+# Margen alrededor de la caja de las paradas para el corredor de búsqueda (metros)
+MARGEN_CORREDOR_M = 1500
+
+# Corte opcional por tiempo de viaje dentro del corredor (segundos). None = sin corte
+CORTE_CORREDOR_S = None
+
+# Almacenamiento de matrices: "float32" (4 B/celda) o "uint16" (segundos enteros, 2 B/celda)
+FORMATO_MATRIZ = "float32"
+
+# A partir de cuántas paradas se arranca con estimación geométrica y tiempos exactos perezosos
+UMBRAL_MATRIZ_APROX = 1500
+
+# Desvío inicial de la red respecto a la línea recta (se recalibra con los tiempos exactos)
+FACTOR_DESVIO_INICIAL = 1.35
+
+# Solver "anytime": tiempo por ruta dentro de la petición y mejora en segundo plano entre clics
+PRESUPUESTO_RUTA_S = 0.05
+PRESUPUESTO_FONDO_S = 1.0
+
+# Rutas chicas (zonas): orden exacto con Held-Karp hasta este número de paradas (memo LRU)
+UMBRAL_EXACTO = 12
+TAM_CACHE_EXACTO = 512
+
+# Tramos (camino + geometría entre dos paradas) que se recuerdan entre peticiones
+TAM_CACHE_TRAMOS = 20000
+
+# Caché en disco de tiempos entre nodos (versión del grafo, perfil, origen, destino): las direcciones
+# que se repiten día a día arman su matriz leyendo en lugar de buscar (services/cache_tiempos.py)
+USAR_CACHE_TIEMPOS = True
+ARCHIVO_CACHE_TIEMPOS = os.environ.get("FLEET_CACHE_TIEMPOS")  # sin definir: cache/tiempos.sqlite
+MAX_PARES_CACHE = 5_000_000  # ~60 B por par sin camino
+
+# Tablas precalculadas por zona de COORDS_ZONAS: tiempos y metros todos-contra-todos entre los nodos de
+# la caja de generación (+ MARGEN_ZONA). uint16 en disco, mapeadas en memoria al arrancar; se construyen con
+# python -m app.herramientas.precalcular_zonas (o en segundo plano al arrancar con PRECALCULAR_ZONAS)
+USAR_TABLAS_ZONA = True
+MARGEN_ZONA = 0.004            # grados alrededor de la caja (el nodo más cercano puede quedar afuera)
+PRECALCULAR_ZONAS = os.environ.get("FLEET_PRECALCULAR_ZONAS", "0") == "1"
+PERFILES_ZONA = [None]         # None = travel_time; o nombres de PERFILES_VELOCIDAD
+# Son dos arreglos k x k por zona y perfil (4 B por par): arriba de esto la zona no se construye
+# (6000 nodos ~ 144 MB en disco y en páginas mapeadas); se puede forzar con --max-nodos
+MAX_NODOS_ZONA = 6000
+
+# Versiones del plan que se recuerdan para responder en delta
+HISTORIAL_VERSIONES = 20
+
+# Árboles inversos de caminos (conductor en vivo): cuántos destinos se recuerdan
+TAM_CACHE_ARBOLES = 32
+
+# Tabla de duraciones/distancias (POST /tabla)
+MAX_CELDAS_TABLA = 250000      # origenes x destinos; arriba de esto -> 413
+UMBRAL_STREAM_TABLA = 10000    # arriba de esto la respuesta sale en NDJSON por partes
+
+# Isocronas (GET /isocrona)
+MAX_MINUTOS_ISOCRONA = 60
+TAM_CACHE_ISOCRONAS = 64
+
+# ==========================================
+# 5. BÚSQUEDA DIRIGIDA (A* BIDIRECCIONAL / ALT)
+# ==========================================
+
+# Landmarks ALT elegidos al cargar el grafo (se guardan en la carpeta cache/)
+USAR_LANDMARKS_ALT = True
+NUM_LANDMARKS = 8
+
+# ==========================================
+# 6. ARRANQUE
+# ==========================================
+
+# Antes de reportarse "listo", precalentar índice espacial y landmarks
+CALENTAR_CACHES = True
+
+# Respuestas: se comprimen (brotli si está instalado, si no gzip) a partir de este tamaño
+COMPRESION_MINIMA_BYTES = 1024
+
+# Artefacto de grafo alternativo (p. ej. uno sintético para pruebas de carga)
+RUTA_GRAFO = os.environ.get("FLEET_GRAFO")
+
+# Si la carga del mapa falla (descarga caída, artefacto a medio copiar) se reintenta sola:
+# espera inicial en segundos, se duplica en cada fallo hasta el máximo
+REINTENTO_CARGA_S = 5
+REINTENTO_CARGA_MAX_S = 300
+
+# ==========================================
+# 7. SESIONES Y GRABACIÓN
+# ==========================================
+
+# Sesiones con nombre (?sesion=...) que se mantienen en memoria; la más vieja se descarta
+MAX_SESIONES = 200
+
+# Si se define, cada acción de /simulacion-leaflet se agrega a este JSONL (ver herramientas/repeticion.py)
+ARCHIVO_GRABACION = os.environ.get("FLEET_GRABACION")
+
+# Almacén de escenarios: sin definir, en la memoria del proceso; con una ruta, un SQLite que
+# comparten todos los workers y que sobrevive reinicios (services/escenarios.py).
+# app.servidor con --workers > 1 usa cache/escenarios.sqlite si no se define (en memoria no se comparten)
+ARCHIVO_ESCENARIOS = os.environ.get("FLEET_ESCENARIOS")
+
+# Escenarios sin tocar por más de estos días se borran al abrir el SQLite
+DIAS_ESCENARIOS = 7
+
+# Si otro worker guardó el mismo escenario primero, la acción se repite con el estado fresco (409 al agotarse)
+REINTENTOS_ESCENARIO = 3
+
+# ==========================================
+# 8. INCIDENTES EN VIVO (POST /admin/incidentes)
+# ==========================================
+
+# Un cierre multiplica el tiempo de sus aristas por este factor (sólo se usan si no hay otra salida)
+FACTOR_CIERRE = 1000
+
+# Aristas máximas por incidente (un polígono enorme se rechaza en lugar de congelar el servidor)
+MAX_ARISTAS_INCIDENTE = 20000
+
+# Incidentes activos e historial de cambios: en el SQLite de FLEET_ESCENARIOS (todos los workers los
+# aplican antes de atender) o, sin él, en la memoria del proceso. Cada escenario recuerda la generación
+# con la que armó su matriz; uno más viejo que el historial recalcula toda la matriz.
+MAX_CAMBIOS_INCIDENTES = 1000
+
+# Si se define, /admin/* exige el encabezado X-Token-Admin con este valor
+TOKEN_ADMIN = os.environ.get("FLEET_TOKEN_ADMIN")
+
+# ==========================================
+# 9. TESELAS VECTORIALES (GET /tiles/{z}/{x}/{y})
+# ==========================================
+
+# Debajo de este zoom las teselas salen vacías; las calles (no avenidas) aparecen desde ZOOM_MIN_CALLES
+ZOOM_MIN_TESELAS = 10
+ZOOM_MIN_CALLES = 14
+
+# Simplificación (Douglas-Peucker): puntos a menos de esto (en píxeles de una tesela de 256) se descartan
+TOLERANCIA_TESELA_PX = 0.5
+
+# Teselas en memoria (LRU); además se guardan en cache/teselas/<versión>/ hasta ZOOM_MAX_DISCO_TESELAS.
+# Más adentro hay 4x teselas por nivel: sólo viven en la LRU (generarlas es barato), así el disco no crece sin fin
+TAM_CACHE_TESELAS = 2048
+ZOOM_MAX_DISCO_TESELAS = 15
+
+# Al terminar de cargar se generan de antemano las teselas de COORDS_ZONAS en estos zooms ([] = sólo bajo demanda)
+ZOOMS_SEMBRAR = [12, 13, 14, 15]
+RADIO_SEMBRAR = 0.03  # grados alrededor de cada zona
+
 # ==========================================
-# 4. LOGS DE INICIO
+# 10. LOGS DE INICIO
 # ==========================================
-print(f">>> ⚙️ CONFIG CARGADA: Centro Map={LAT_CENTRO},{LON_CENTRO} | Radio={DISTANCIA}m")
-print(f">>> 📍 ZONAS DISPONIBLES: {list(COORDS_ZONAS.keys())}")
-print(f">>> 🚚 PARÁMETROS: Offset={OFFSET_ALEATORIO} | Vel.Calle={VEL_CALLE_KMH}km/h")
\ No newline at end of file
+# Se imprimen al arrancar el servidor (no al importar: los scripts y workers no pagan el log)
+def imprimir_resumen():
+    print(f">>> ⚙️ CONFIG CARGADA: Centro Map={LAT_CENTRO},{LON_CENTRO} | Radio={DISTANCIA}m")
+    print(f">>> 📍 ZONAS DISPONIBLES: {list(COORDS_ZONAS.keys())}")
+    print(f">>> 🚚 PARÁMETROS: Offset={OFFSET_ALEATORIO} | Vel.Calle={VEL_CALLE_KMH}km/h")
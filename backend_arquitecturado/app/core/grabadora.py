@@ -0,0 +1,23 @@
+# backend_arquitecturado/app/core/grabadora.py
+import json
+import threading
+import time
+from app.core.config import ARCHIVO_GRABACION
+
+_LOCK = threading.Lock()
+_T0 = time.monotonic()
+
+
+def grabar_accion(ruta, sesion, params):
+    """
+    Agrega una línea JSONL {t, ruta, sesion, params} a ARCHIVO_GRABACION (si está definido).
+    `t` son segundos desde el arranque: la repetición puede respetar los tiempos entre acciones.
+    """
+    if not ARCHIVO_GRABACION: return
+    linea = json.dumps({
+        "t": round(time.monotonic() - _T0, 3), "ruta": ruta, "sesion": sesion,
+        "params": {k: v for k, v in params.items() if v is not None},
+    }, ensure_ascii=False)
+    with _LOCK:
+        with open(ARCHIVO_GRABACION, "a", encoding="utf-8") as f:
+            f.write(linea + "\n")
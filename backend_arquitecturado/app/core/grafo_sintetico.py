@@ -0,0 +1,53 @@
+# backend_arquitecturado/app/core/grafo_sintetico.py
+"""
+Cuadrícula de calles sintética (determinista por semilla) para pruebas de carga y
+repeticiones sin descargar OSM. Sale en el mismo formato que preparar_grafo().
+"""
+import math
+import random
+import networkx as nx
+from app.core.config import COORDS_ZONAS
+from app.core.indice_espacial import METROS_POR_GRADO
+from app.core.preparacion import preparar_grafo
+
+
+def generar_grafo(zona="neza", lado=60, paso_m=90, semilla=0, prob_sentido_unico=0.3, cada_avenida=10,
+                  prob_paralela=0.0, asimetria=0.0):
+    """
+    Cuadrícula de lado x lado nodos centrada en COORDS_ZONAS[zona], con ruido en las
+    posiciones, calles de un sentido al azar y una avenida cada `cada_avenida` cuadras.
+    prob_paralela: probabilidad de que una cuadra tenga además una lateral (arista paralela
+    u -> v de otro tipo y nunca más corta), para probar que se elige la más rápida.
+    asimetria: el regreso de una calle de doble sentido mide hasta (1 + asimetria) veces la ida.
+    Con ambos en 0 sale exactamente la misma cuadrícula de siempre para cada semilla.
+    """
+    rnd = random.Random(semilla)
+    centro = COORDS_ZONAS.get(zona, COORDS_ZONAS["neza"])
+    paso_lat = paso_m / METROS_POR_GRADO
+    paso_lon = paso_lat / math.cos(math.radians(centro["lat"]))
+    lat0 = centro["lat"] - paso_lat * lado / 2
+    lon0 = centro["lon"] - paso_lon * lado / 2
+
+    G = nx.MultiDiGraph(crs="epsg:4326")
+    nid = lambda i, j: 1000 + i * lado + j
+    for i in range(lado):
+        for j in range(lado):
+            G.add_node(nid(i, j), y=lat0 + i * paso_lat + rnd.uniform(-0.1, 0.1) * paso_lat,
+                       x=lon0 + j * paso_lon + rnd.uniform(-0.1, 0.1) * paso_lon)
+    for i in range(lado):
+        for j in range(lado):
+            for a, b in ((i, j + 1), (i + 1, j)):
+                if a >= lado or b >= lado: continue
+                u, v = nid(i, j), nid(a, b)
+                avenida = (i % cada_avenida == 0 and a == i) or (j % cada_avenida == 0 and b == j)
+                largo = paso_m * rnd.uniform(1.0, 1.2)
+                datos = {"length": largo, "highway": "primary" if avenida else "residential"}
+                r = rnd.random()
+                # las avenidas siempre son de doble sentido
+                if avenida or r >= prob_sentido_unico or r < prob_sentido_unico / 2: G.add_edge(u, v, **datos)
+                if avenida or r >= prob_sentido_unico / 2:
+                    G.add_edge(v, u, **(datos if not asimetria else {**datos, "length": largo * rnd.uniform(1, 1 + asimetria)}))
+                if prob_paralela and rnd.random() < prob_paralela:
+                    for x, y in [(x, y) for x, y in ((u, v), (v, u)) if G.has_edge(x, y)]:
+                        G.add_edge(x, y, length=largo * rnd.uniform(1.0, 1.5), highway=rnd.choice(("primary", "residential")))
+    return preparar_grafo(G)
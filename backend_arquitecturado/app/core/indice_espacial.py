@@ -0,0 +1,138 @@
+# backend_arquitecturado/app/core/indice_espacial.py
+import math
+import numpy as np
+from app.core.config import TAM_CELDA_INDICE
+
+METROS_POR_GRADO = 111320.0
+
+_INDICE_GLOBAL = None  # (grafo, indice) -> se reconstruye si cambia el grafo
+
+
+class IndiceRejilla:
+    """
+    Rejilla regular (lat/lon) sobre los nodos del grafo.
+    Permite sacar los nodos de una caja sin recorrer todo el mapa.
+    """
+
+    def __init__(self, G, tam_celda=TAM_CELDA_INDICE):
+        self.tam = tam_celda
+        datos = list(G.nodes(data=True))
+        self.ids = np.array([n for n, _ in datos], dtype=np.int64)
+        self.xs = np.array([d['x'] for _, d in datos], dtype=np.float64)
+        self.ys = np.array([d['y'] for _, d in datos], dtype=np.float64)
+
+        # Agrupamos las posiciones por celda (cx, cy)
+        cx = np.floor(self.xs / self.tam).astype(np.int64)
+        cy = np.floor(self.ys / self.tam).astype(np.int64)
+        orden = np.lexsort((cy, cx))
+        claves = np.stack([cx[orden], cy[orden]], axis=1)
+        self.celdas = {}
+        if len(orden):
+            cortes = np.flatnonzero(np.any(np.diff(claves, axis=0) != 0, axis=1)) + 1
+            for bloque in np.split(np.arange(len(orden)), cortes):
+                k = (int(claves[bloque[0], 0]), int(claves[bloque[0], 1]))
+                self.celdas[k] = orden[bloque]
+        self.rango_x = (int(cx.min()), int(cx.max())) if len(cx) else (0, 0)
+        self.rango_y = (int(cy.min()), int(cy.max())) if len(cy) else (0, 0)
+
+    def posiciones_en_caja(self, min_lat, max_lat, min_lon, max_lon):
+        """Posiciones (en self.ids) de los nodos dentro de la caja."""
+        cx0, cx1 = math.floor(min_lon / self.tam), math.floor(max_lon / self.tam)
+        cy0, cy1 = math.floor(min_lat / self.tam), math.floor(max_lat / self.tam)
+        trozos = []
+        for cx in range(cx0, cx1 + 1):
+            for cy in range(cy0, cy1 + 1):
+                pos = self.celdas.get((cx, cy))
+                if pos is not None: trozos.append(pos)
+        if not trozos: return np.empty(0, dtype=np.int64)
+        pos = np.concatenate(trozos)
+        dentro = (self.xs[pos] >= min_lon) & (self.xs[pos] <= max_lon) & \
+                 (self.ys[pos] >= min_lat) & (self.ys[pos] <= max_lat)
+        return pos[dentro]
+
+    def nodos_en_caja(self, min_lat, max_lat, min_lon, max_lon):
+        return self.ids[self.posiciones_en_caja(min_lat, max_lat, min_lon, max_lon)]
+
+    def mas_cercano(self, lon, lat):
+        """
+        Nodo más cercano a (lon, lat). Revisa anillos de celdas alrededor del punto
+        hasta que ningún anillo más lejano pueda tener algo más cerca.
+        """
+        k_lon = math.cos(math.radians(lat))
+        cx, cy = math.floor(lon / self.tam), math.floor(lat / self.tam)
+        mejor, mejor_d2 = None, float('inf')
+        max_r = 1 + max(abs(cx - self.rango_x[0]), abs(cx - self.rango_x[1]),
+                        abs(cy - self.rango_y[0]), abs(cy - self.rango_y[1]))
+        for r in range(max_r + 1):
+            for i in range(-r, r + 1):
+                for j in range(-r, r + 1):
+                    if max(abs(i), abs(j)) != r: continue
+                    pos = self.celdas.get((cx + i, cy + j))
+                    if pos is None: continue
+                    d2 = ((self.xs[pos] - lon) * k_lon) ** 2 + (self.ys[pos] - lat) ** 2
+                    k = int(np.argmin(d2))
+                    if d2[k] < mejor_d2: mejor_d2, mejor = float(d2[k]), int(self.ids[pos[k]])
+            # Todo lo que está fuera del anillo r queda al menos a r celdas de distancia
+            if mejor is not None and math.sqrt(mejor_d2) <= r * self.tam * k_lon:
+                break
+        return mejor
+
+    def mas_cercanos(self, lons, lats):
+        """
+        mas_cercano para muchos puntos de una vez: se agrupan por celda y cada grupo se compara
+        contra los nodos de sus 9 celdas vecinas en una sola operación de numpy. Sólo los puntos
+        cuyo mejor candidato no queda garantizado por ese anillo (zonas vacías) van uno por uno.
+        """
+        lons = np.asarray(lons, dtype=np.float64)
+        lats = np.asarray(lats, dtype=np.float64)
+        res = np.full(len(lons), -1, dtype=np.int64)
+        if not len(lons) or not len(self.ids): return res
+        cx = np.floor(lons / self.tam).astype(np.int64)
+        cy = np.floor(lats / self.tam).astype(np.int64)
+        k_lon = np.cos(np.radians(lats))
+        orden = np.lexsort((cy, cx))
+        claves = np.stack([cx[orden], cy[orden]], axis=1)
+        cortes = np.flatnonzero(np.any(np.diff(claves, axis=0) != 0, axis=1)) + 1
+        for bloque in np.split(orden, cortes):
+            x, y = int(cx[bloque[0]]), int(cy[bloque[0]])
+            trozos = [p for p in (self.celdas.get((x + i, y + j)) for i in (-1, 0, 1) for j in (-1, 0, 1)) if p is not None]
+            if not trozos: continue
+            cand = np.concatenate(trozos)
+            xs, ys = self.xs[cand], self.ys[cand]
+            for i in range(0, len(bloque), 1024):  # acota la matriz puntos x candidatos
+                sub = bloque[i:i + 1024]
+                d2 = ((xs[None, :] - lons[sub, None]) * k_lon[sub, None]) ** 2 + (ys[None, :] - lats[sub, None]) ** 2
+                k = np.argmin(d2, axis=1)
+                mejor = d2[np.arange(len(sub)), k]
+                # Mismo criterio que mas_cercano con r = 1: fuera del anillo nada puede estar más cerca
+                seguro = np.sqrt(mejor) <= self.tam * k_lon[sub]
+                res[sub[seguro]] = self.ids[cand[k[seguro]]]
+        for i in np.flatnonzero(res < 0): res[i] = self.mas_cercano(float(lons[i]), float(lats[i]))
+        return res
+
+
+def caja_con_margen(lats, lons, margen_m):
+    """Caja envolvente de los puntos ampliada `margen_m` metros por lado."""
+    min_lat, max_lat = min(lats), max(lats)
+    min_lon, max_lon = min(lons), max(lons)
+    d_lat = margen_m / METROS_POR_GRADO
+    d_lon = margen_m / (METROS_POR_GRADO * max(0.01, math.cos(math.radians((min_lat + max_lat) / 2))))
+    return min_lat - d_lat, max_lat + d_lat, min_lon - d_lon, max_lon + d_lon
+
+
+def get_indice(G):
+    global _INDICE_GLOBAL
+    if G is None: return None
+    if _INDICE_GLOBAL is None or _INDICE_GLOBAL[0] is not G:
+        _INDICE_GLOBAL = (G, IndiceRejilla(G))
+    return _INDICE_GLOBAL[1]
+
+
+def nodo_cercano(G, lon, lat):
+    """Equivalente a ox.distance.nearest_nodes para un punto, sin cargar osmnx."""
+    return get_indice(G).mas_cercano(lon, lat)
+
+
+def nodos_cercanos(G, lons, lats):
+    """Nodo más cercano de cada punto, en lote (ver IndiceRejilla.mas_cercanos)."""
+    return get_indice(G).mas_cercanos(lons, lats).tolist()
@@ -1,47 +1,104 @@
 # backend_arquitecturado/app/core/mapa.py
-import osmnx as ox
 import os
-from app.core.config import LAT_CENTRO, LON_CENTRO, DISTANCIA, TIPO_RED
-
-# Configuración para descargas grandes
-ox.settings.use_cache = True
-ox.settings.log_console = True
-ox.settings.timeout = 300  
+import threading
+import time
+from app.core.config import LAT_CENTRO, LON_CENTRO, DISTANCIA, TIPO_RED, RUTA_GRAFO
+from app.core.preparacion import preparar_grafo, guardar_artefacto, cargar_artefacto
 
 CACHE_DIR = "cache"
 if not os.path.exists(CACHE_DIR):
     os.makedirs(CACHE_DIR)
 
 _GRAFO_GLOBAL = None
+_LOCK_CARGA = threading.Lock()
+
+# Estado que reportan /salud/vivo y /salud/listo mientras el grafo carga en segundo plano
+# maestro / worker: pid del proceso que cargó el grafo e hizo fork, y número de este worker (modo app.servidor)
+ESTADO_CARGA = {"fase": "pendiente", "progreso": 0.0, "listo": False, "error": None, "inicio": None, "fin": None,
+                "maestro": None, "worker": None}
+
+
+def marcar_fase(fase, progreso):
+    ESTADO_CARGA["fase"] = fase
+    ESTADO_CARGA["progreso"] = progreso
+    if ESTADO_CARGA["inicio"] is None: ESTADO_CARGA["inicio"] = time.time()
+    print(f">>> ⏳ ARRANQUE: {fase} ({int(progreso*100)}%)")
+
+
+def _osmnx():
+    # osmnx arrastra geopandas/shapely/pandas: sólo se importa si hay que leer GraphML o descargar
+    import osmnx as ox
+    # Configuración para descargas grandes
+    ox.settings.use_cache = True
+    ox.settings.log_console = True
+    ox.settings.timeout = 300
+    return ox
+
+
+def ruta_graphml():
+    # Nombre de archivo basado en el radio para diferenciar versiones
+    return os.path.join(CACHE_DIR, f"mapa_cdmx_metropolitana_{DISTANCIA}.graphml")
+
 
-def get_grafo():
+def ruta_preparado():
+    # Artefacto ya podado y con pesos (lo escribe app/herramientas/construir_grafo.py)
+    if RUTA_GRAFO: return RUTA_GRAFO
+    return os.path.join(CACHE_DIR, f"mapa_cdmx_preparado_{DISTANCIA}.pkl")
+
+
+def descargar_grafo():
+    ox = _osmnx()
+    print(f"⬇️ Descargando mapa de la ZMVM (Radio: {DISTANCIA/1000}km)... esto tardará varios minutos.")
+    G = ox.graph_from_point(
+        (LAT_CENTRO, LON_CENTRO),
+        dist=DISTANCIA,
+        network_type=TIPO_RED
+    )
+    # Guardamos en formato GraphML
+    print("💾 Guardando mapa en caché para el futuro...")
+    ox.save_graphml(G, ruta_graphml())
+    return G
+
+
+def cargar_graphml(filepath):
+    return _osmnx().load_graphml(filepath)
+
+
+def get_grafo(esperar=True):
+    """
+    Devuelve el grafo global. Con esperar=False nunca dispara la carga:
+    devuelve None si todavía se está cargando (los endpoints responden 503).
+    """
     global _GRAFO_GLOBAL
-    if _GRAFO_GLOBAL is not None:
+    if _GRAFO_GLOBAL is not None or not esperar:
         return _GRAFO_GLOBAL
 
-    # Nombre de archivo basado en el radio para diferenciar versiones
-    filename = f"mapa_cdmx_metropolitana_{DISTANCIA}.graphml"
-    filepath = os.path.join(CACHE_DIR, filename)
-
-    if os.path.exists(filepath):
-        print(f"✅ Cargando mapa cacheado desde: {filename}")
-        # GraphML es mucho más rápido de leer que JSON para grafos grandes
-        _GRAFO_GLOBAL = ox.load_graphml(filepath)
-    else:
-        print(f"⬇️ Descargando mapa de la ZMVM (Radio: {DISTANCIA/1000}km)... esto tardará varios minutos.")
+    with _LOCK_CARGA:
+        if _GRAFO_GLOBAL is not None:
+            return _GRAFO_GLOBAL
+
+        # Un fallo anterior no es definitivo: cada intento empieza limpio (ver main._cargar_con_reintentos)
+        ESTADO_CARGA["error"] = None
+        filepath = ruta_preparado()
         try:
-            # Descarga el grafo
-            G = ox.graph_from_point(
-                (LAT_CENTRO, LON_CENTRO), 
-                dist=DISTANCIA, 
-                network_type=TIPO_RED
-            )
-            # Guardamos en formato GraphML
-            print("💾 Guardando mapa en caché para el futuro...")
-            ox.save_graphml(G, filepath)
+            if os.path.exists(filepath):
+                print(f"✅ Cargando mapa preparado desde: {os.path.basename(filepath)}")
+                _GRAFO_GLOBAL = cargar_artefacto(filepath)
+                return _GRAFO_GLOBAL
+
+            # Sin artefacto: lo construimos una vez aquí (lo normal es correr construir_grafo antes)
+            if os.path.exists(ruta_graphml()):
+                print(f"✅ Cargando mapa cacheado desde: {os.path.basename(ruta_graphml())}")
+                # GraphML es mucho más rápido de leer que JSON para grafos grandes
+                G = cargar_graphml(ruta_graphml())
+            else:
+                G = descargar_grafo()
+            G = preparar_grafo(G)
+            guardar_artefacto(G, filepath)
             _GRAFO_GLOBAL = G
         except Exception as e:
-            print(f"❌ Error descargando el mapa: {e}")
+            print(f"❌ Error cargando el mapa: {e}")
+            ESTADO_CARGA["error"] = str(e)
             return None
 
-    return _GRAFO_GLOBAL
\ No newline at end of file
+    return _GRAFO_GLOBAL
@@ -0,0 +1,126 @@
+# backend_arquitecturado/app/core/memoria.py
+"""
+Estimación de memoria por componente (grafo, índices, cachés) para dimensionar workers.
+Las estructuras grandes del grafo se miden sobre una muestra y se extrapolan.
+"""
+import os
+import random
+import sys
+import numpy as np
+
+
+def tam_profundo(obj, vistos=None):
+    """Bytes aproximados de `obj` y todo lo que cuelga de él (cada objeto se cuenta una vez)."""
+    if vistos is None: vistos = set()
+    pila, total = [obj], 0
+    while pila:
+        o = pila.pop()
+        if id(o) in vistos: continue
+        vistos.add(id(o))
+        if isinstance(o, np.ndarray):
+            total += sys.getsizeof(o)  # incluye los datos si el arreglo es dueño de ellos
+            continue
+        total += sys.getsizeof(o)
+        if type(o).__module__.startswith("shapely"):
+            # la geometría vive en GEOS (C): estimamos encabezado + 3 doubles por punto
+            total += 100 + 24 * len(o.coords)
+            continue
+        if isinstance(o, dict):
+            pila.extend(o.keys()); pila.extend(o.values())
+        elif isinstance(o, (list, tuple, set, frozenset)):
+            pila.extend(o)
+        elif hasattr(o, "__dict__"):
+            pila.append(o.__dict__)
+        elif hasattr(o, "__slots__"):
+            pila.extend(getattr(o, s) for s in o.__slots__ if hasattr(o, s))
+    return total
+
+
+def _muestra(seq, n, semilla=0):
+    seq = list(seq)
+    if len(seq) <= n: return seq, 1.0
+    return random.Random(semilla).sample(seq, n), len(seq) / n
+
+
+def memoria_grafo(G, muestra=2000):
+    """
+    Bytes estimados de nodos, adyacencia (_succ/_pred), atributos de aristas y geometrías.
+    Los atributos de arista se comparten entre _succ y _pred: se cuentan una sola vez.
+    """
+    nodos, factor_n = _muestra(G.nodes, muestra)
+    vistos = set()
+    tam_nodos = sum(sys.getsizeof(n) + tam_profundo(G._node[n], vistos) for n in nodos) * factor_n
+
+    # _succ[u][v] y _pred[v][u] son el MISMO dict de claves: se cuenta sólo por _succ
+    tam_adj = 0
+    for n in nodos:
+        tam_adj += sys.getsizeof(G._succ[n]) + sys.getsizeof(G._pred[n])
+        for claves in G._succ[n].values():
+            tam_adj += sys.getsizeof(claves)
+    tam_adj = tam_adj * factor_n + sys.getsizeof(G._succ) + sys.getsizeof(G._pred) + sys.getsizeof(G._node)
+
+    aristas, factor_e = _muestra(((u, v, k) for u, v, k in G.edges(keys=True)), muestra)
+    tam_aristas = tam_geom = 0
+    for u, v, k in aristas:
+        d = G._succ[u][v][k]
+        geom = d.get('geometry')
+        tam_aristas += sys.getsizeof(d) + sum(tam_profundo(x, vistos) for kk, x in d.items() if kk != 'geometry')
+        if geom is not None: tam_geom += tam_profundo(geom, set())
+    return {
+        "nodos": tam_nodos,
+        "adyacencia": tam_adj,
+        "atributos_aristas": tam_aristas * factor_e,
+        "geometria": tam_geom * factor_e,
+    }
+
+
+def rss_proceso():
+    """RSS actual y pico del proceso (bytes), desde /proc/self/status."""
+    datos = {}
+    try:
+        with open("/proc/self/status") as f:
+            for linea in f:
+                if linea.startswith(("VmRSS:", "VmHWM:")):
+                    clave, valor = linea.split(":")
+                    datos[clave] = int(valor.split()[0]) * 1024
+    except OSError:
+        pass
+    return {"rss": datos.get("VmRSS"), "rss_pico": datos.get("VmHWM")}
+
+
+def memoria_compartida(pid="self"):
+    """
+    Páginas compartidas vs privadas (bytes) desde /proc/<pid>/smaps_rollup (Linux >= 4.14).
+    pss reparte cada página compartida entre quienes la usan: sumar pss de todos los workers
+    da la memoria real del conjunto. {} si no se puede leer.
+    """
+    campos = {"Rss": "rss", "Pss": "pss", "Shared_Clean": "compartida", "Shared_Dirty": "compartida",
+              "Private_Clean": "privada", "Private_Dirty": "privada"}
+    datos = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for linea in f:
+                clave, _, valor = linea.partition(":")
+                if clave in campos:
+                    datos[campos[clave]] = datos.get(campos[clave], 0) + int(valor.split()[0]) * 1024
+    except (OSError, ValueError):
+        return {}
+    return datos
+
+
+def procesos_hijos(pid):
+    """PIDs cuyo padre es `pid` (recorre /proc; [] fuera de Linux)."""
+    hijos = []
+    try:
+        entradas = os.listdir("/proc")
+    except OSError:
+        return hijos
+    for e in entradas:
+        if not e.isdigit(): continue
+        try:
+            with open(f"/proc/{e}/stat") as f:
+                # el nombre del proceso va entre paréntesis y puede tener espacios: el ppid es el 2º campo tras ')'
+                if int(f.read().rsplit(")", 1)[1].split()[1]) == pid: hijos.append(int(e))
+        except (OSError, ValueError, IndexError):
+            continue
+    return sorted(hijos)
@@ -0,0 +1,129 @@
+# backend_arquitecturado/app/core/preparacion.py
+import hashlib
+import pickle
+import sys
+import networkx as nx
+import numpy as np
+from app.core.config import VEL_CALLE_KMH, VEL_AVENIDA_KMH, TIPOS_AVENIDA, MODO_LIGERO
+
+# Lo único que leen el ruteo y el trazado; lo demás de OSM se descarta
+# 'eid' numera las aristas: índice en los arreglos de pesos por perfil (services/perfiles.py)
+ATRIBUTOS_ARISTA = ('eid', 'length', 'highway', 'travel_time', 'costo_agrupacion', 'geometry')
+ATRIBUTOS_NODO = ('x', 'y')
+
+# Modo ligero: 'highway' se guarda como su posición en esta tupla (enteros chicos, compartidos)
+CLASES_VIA = (
+    'residential', 'primary', 'secondary', 'tertiary', 'trunk', 'motorway', 'unclassified',
+    'living_street', 'service', 'primary_link', 'secondary_link', 'tertiary_link', 'trunk_link',
+    'motorway_link', 'road', 'busway', 'otro',
+)
+_CODIGO_VIA = {c: i for i, c in enumerate(CLASES_VIA)}
+
+
+def codigo_via(tipo):
+    return _CODIGO_VIA.get(tipo, _CODIGO_VIA['otro'])
+
+
+def nombre_via(valor):
+    """Nombre OSM del tipo de vía, venga como entero (modo ligero) o como texto."""
+    if isinstance(valor, int): return CLASES_VIA[valor]
+    return _tipo_principal(valor)
+
+
+def es_avenida(valor):
+    return nombre_via(valor) in TIPOS_AVENIDA
+
+
+class GeometriaCompacta:
+    """
+    Reemplazo de shapely.LineString para el trazado: los puntos (lon, lat) en un bytes float64.
+    Sólo expone .coords (iterable de pares lon, lat), que es lo único que se lee.
+    """
+    __slots__ = ("_xy",)
+
+    def __init__(self, coords):
+        self._xy = np.asarray(coords, dtype=np.float64).tobytes()
+
+    @property
+    def coords(self):
+        return np.frombuffer(self._xy, dtype=np.float64).reshape(-1, 2)
+
+    def __len__(self):
+        return len(self._xy) // 16
+
+    def __getstate__(self):
+        return self._xy
+
+    def __setstate__(self, estado):
+        self._xy = estado
+
+
+def _tipo_principal(highway):
+    # OSM a veces trae una lista de tipos; nos quedamos con el primero (igual que api/main.py)
+    if isinstance(highway, list): return highway[0] if highway else 'residential'
+    return highway or 'residential'
+
+
+def calcular_pesos(longitudes, es_avenida):
+    """
+    travel_time (s) y costo_agrupacion (m ponderados) a partir de arreglos.
+    Las avenidas pesan x10 en el costo de agrupación para no cruzarlas al hacer zonas.
+    """
+    velocidad = np.where(es_avenida, VEL_AVENIDA_KMH / 3.6, VEL_CALLE_KMH / 3.6)
+    travel_time = longitudes / velocidad
+    costo_agrupacion = np.where(es_avenida, longitudes * 10, longitudes)
+    return travel_time, costo_agrupacion
+
+
+def componente_mayor(G):
+    """Nos quedamos con la mayor componente fuertemente conexa (sin pares inalcanzables)."""
+    cc = max(nx.strongly_connected_components(G), key=len)
+    if len(cc) == G.number_of_nodes(): return G
+    return G.subgraph(cc).copy()
+
+
+def preparar_grafo(G, ligero=MODO_LIGERO):
+    """
+    Deja el grafo listo para rutear: poda a la mayor SCC, calcula los pesos
+    de todas las aristas de una vez, las numera (eid) y elimina atributos que no usamos.
+    ligero=True: tipo de vía como entero y geometría como GeometriaCompacta;
+    si no, el tipo queda como texto internado (una sola copia por valor).
+    """
+    n_original = G.number_of_nodes()
+    G = componente_mayor(G)
+
+    aristas = list(G.edges(keys=True, data=True))
+    longitudes = np.array([d.get('length', 10) for _, _, _, d in aristas], dtype=np.float64)
+    tipos = np.array([nombre_via(d.get('highway')) for _, _, _, d in aristas], dtype=object)
+    es_avenida = np.isin(tipos, TIPOS_AVENIDA)
+    travel_time, costo_agrupacion = calcular_pesos(longitudes, es_avenida)
+
+    for eid, ((_, _, _, d), tipo, largo, t, c) in enumerate(zip(aristas, tipos, longitudes, travel_time, costo_agrupacion)):
+        geom = d.get('geometry')
+        d.clear()
+        d['eid'] = eid
+        d['length'] = float(largo)
+        d['highway'] = codigo_via(tipo) if ligero else sys.intern(tipo)
+        d['travel_time'] = float(t)
+        d['costo_agrupacion'] = float(c)
+        if geom is not None: d['geometry'] = GeometriaCompacta(geom.coords) if ligero else geom
+
+    for _, d in G.nodes(data=True):
+        for k in [k for k in d if k not in ATRIBUTOS_NODO]: del d[k]
+
+    firma = f"{G.number_of_nodes()}|{G.number_of_edges()}|{round(float(longitudes.sum()), 1)}|{VEL_CALLE_KMH}|{VEL_AVENIDA_KMH}"
+    G.graph['version_grafo'] = hashlib.sha1(firma.encode()).hexdigest()[:16]
+    G.graph['modo_ligero'] = bool(ligero)
+    G.graph['num_aristas'] = len(aristas)
+    print(f">>> 🛠️ GRAFO PREPARADO: {n_original} -> {G.number_of_nodes()} nodos (SCC) | {len(aristas)} aristas con pesos")
+    return G
+
+
+def guardar_artefacto(G, filepath):
+    with open(filepath, 'wb') as f:
+        pickle.dump(G, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def cargar_artefacto(filepath):
+    with open(filepath, 'rb') as f:
+        return pickle.load(f)
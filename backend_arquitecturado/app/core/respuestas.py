@@ -0,0 +1,32 @@
+# backend_arquitecturado/app/core/respuestas.py
+"""
+Respuesta JSON rápida: orjson (si está instalado) serializa listas anidadas de coordenadas
+y arreglos/escalares numpy directamente. Devolver RespuestaRapida(...) desde un endpoint
+también se salta jsonable_encoder y la validación de response_model.
+"""
+import json
+import numpy as np
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # dependencia opcional: se cae a json estándar
+    orjson = None
+
+
+def _numpy_a_json(obj):
+    if isinstance(obj, np.ndarray): return obj.tolist()
+    if isinstance(obj, np.generic): return obj.item()
+    raise TypeError(f"No serializable: {type(obj).__name__}")
+
+
+def a_json(contenido):
+    """bytes JSON de `contenido` (dicts, listas, numpy)."""
+    if orjson is not None:
+        return orjson.dumps(contenido, default=_numpy_a_json, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(contenido, default=_numpy_a_json, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class RespuestaRapida(JSONResponse):
+    def render(self, content):
+        return a_json(content)
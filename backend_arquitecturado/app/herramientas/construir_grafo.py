@@ -0,0 +1,45 @@
+# backend_arquitecturado/app/herramientas/construir_grafo.py
+"""
+Construye el artefacto de grafo que carga get_grafo().
+
+Uso (desde backend_arquitecturado/):
+    python -m app.herramientas.construir_grafo                      # descarga o usa el GraphML cacheado
+    python -m app.herramientas.construir_grafo --entrada zona.osm   # extracto OSM local
+    python -m app.herramientas.construir_grafo --entrada mapa.graphml --salida cache/otro.pkl
+"""
+import argparse
+import os
+import time
+from app.core.mapa import ruta_graphml, ruta_preparado, descargar_grafo, cargar_graphml
+from app.core.preparacion import preparar_grafo, guardar_artefacto
+
+
+def cargar_entrada(entrada):
+    if entrada is None:
+        if os.path.exists(ruta_graphml()):
+            print(f"📂 Usando GraphML cacheado: {ruta_graphml()}")
+            return cargar_graphml(ruta_graphml())
+        return descargar_grafo()
+    if entrada.lower().endswith(".graphml"):
+        return cargar_graphml(entrada)
+    # .osm / .xml: extracto local de OpenStreetMap
+    import osmnx as ox
+    return ox.graph_from_xml(entrada)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prepara el grafo de calles para el servidor.")
+    parser.add_argument("--entrada", help="GraphML u OSM XML local (por defecto: caché o descarga)")
+    parser.add_argument("--salida", default=ruta_preparado(), help="Ruta del artefacto preparado")
+    args = parser.parse_args()
+
+    t0 = time.time()
+    G = cargar_entrada(args.entrada)
+    G = preparar_grafo(G)
+    guardar_artefacto(G, args.salida)
+    print(f">>> ✅ ARTEFACTO ESCRITO: {args.salida} ({os.path.getsize(args.salida)/1e6:.1f} MB, "
+          f"versión {G.graph['version_grafo']}) en {time.time()-t0:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
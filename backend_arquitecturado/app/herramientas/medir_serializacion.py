@@ -0,0 +1,83 @@
+# backend_arquitecturado/app/herramientas/medir_serializacion.py
+"""
+Mide tiempo de serialización y bytes por plan: antes (jsonable_encoder + json) y después
+(RespuestaRapida / orjson), sin comprimir, con gzip y con brotli (si está instalado).
+
+Uso (desde backend_arquitecturado/):
+    python -m app.herramientas.medir_serializacion planes/*.json
+    python -m app.herramientas.medir_serializacion --sintetico 5       # genera planes con la cuadrícula sintética
+"""
+import argparse
+import gzip
+import json
+import os
+import statistics
+import tempfile
+import time
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def _medir(fn, repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+        t0 = time.perf_counter(); r = fn(); tiempos.append(time.perf_counter() - t0)
+    return r, statistics.median(tiempos) * 1000
+
+
+def planes_sinteticos(cantidad):
+    """Planes reales de /simulacion-leaflet sobre la cuadrícula sintética (en proceso)."""
+    ruta = os.path.join(tempfile.mkdtemp(prefix="serializacion_"), "grafo.pkl")
+    os.environ["FLEET_GRAFO"] = ruta  # antes de importar app.core.config (lo lee al importar)
+    from app.core.grafo_sintetico import generar_grafo
+    from app.core.preparacion import guardar_artefacto
+    guardar_artefacto(generar_grafo(), ruta)
+    from fastapi.testclient import TestClient
+    from app.main import app
+    planes = []
+    with TestClient(app) as c:
+        while c.get("/salud/listo").status_code != 200:
+            if c.get("/salud/vivo").json()["error"]: raise RuntimeError("No se pudo cargar el grafo sintético")
+            time.sleep(0.1)
+        for s in range(cantidad):
+            params = {"accion_tipo": "generar_random", "reset": True, "semilla": s, "sesion": f"medir-{s}"}
+            planes.append((f"sintetico-{s}", c.get("/simulacion-leaflet", params=params).json()))
+    return planes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tiempo de serialización y tamaño de respuesta por plan.")
+    parser.add_argument("planes", nargs="*", help="JSON de planes (respuestas de /simulacion-leaflet)")
+    parser.add_argument("--sintetico", type=int, default=0, help="Generar N planes con la cuadrícula sintética")
+    parser.add_argument("--repeticiones", type=int, default=50)
+    args = parser.parse_args()
+
+    from fastapi.encoders import jsonable_encoder
+    from app.core.respuestas import a_json
+
+    planes = []
+    for r in args.planes:
+        with open(r, encoding="utf-8") as f:
+            planes.append((os.path.splitext(os.path.basename(r))[0], json.load(f)))
+    if args.sintetico: planes += planes_sinteticos(args.sintetico)
+    if not planes:
+        parser.error("Indica archivos de planes o --sintetico N")
+
+    print(f"\n📊 SERIALIZACIÓN ({args.repeticiones} repeticiones, mediana)")
+    print(f"   {'plan':<16}{'antes ms':>10}{'después ms':>12}{'bytes':>10}{'gzip':>9}{'gzip ms':>9}{'br':>9}{'br ms':>8}")
+    for nombre, plan in planes:
+        antes, t_antes = _medir(lambda: json.dumps(jsonable_encoder(plan)).encode("utf-8"), args.repeticiones)
+        despues, t_despues = _medir(lambda: a_json(plan), args.repeticiones)
+        gz, t_gz = _medir(lambda: gzip.compress(despues, 5), args.repeticiones)
+        br, t_br = (_medir(lambda: brotli.compress(despues, quality=4), args.repeticiones) if brotli else (None, None))
+        print(f"   {nombre[:15]:<16}{t_antes:>10.2f}{t_despues:>12.2f}{len(despues):>10}{len(gz):>9}{t_gz:>9.2f}"
+              f"{(len(br) if br else '-'):>9}{(f'{t_br:.2f}' if br else '-'):>8}")
+        if len(antes) != len(despues):
+            print(f"     (json estándar: {len(antes)} bytes)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,331 @@
+# backend_arquitecturado/app/herramientas/oraculo.py
+"""
+Oráculo diferencial: compara los caminos rápidos contra networkx (la referencia) en muchos
+grafos sintéticos al azar y reporta, por motor, fallas, error máximo y aceleración.
+
+Los grafos traen calles de un sentido, regresos más largos que la ida y laterales (aristas
+paralelas): todos los motores deben medir con la paralela más rápida.
+Motores revisados (con travel_time o con un perfil de velocidad al azar por grafo):
+- A* bidireccional + ALT (camino_mas_corto), tramos (obtener_tramo, con su caché):
+  camino válido arista por arista, duración y metros.
+- dijkstra_acotado + metros_por_arbol (/tabla), matriz del escenario (corredor) y la misma
+  matriz leída de la caché en disco; con --tablas-zona también las tablas por zona.
+- calcular_metricas: km y tiempo de una ruta contra la suma de caminos de referencia.
+- optimizar_indices: exacto (Held-Karp) contra fuerza bruta; heurístico contra el óptimo
+  (orden válido y brecha); con ventanas, or-opt / 2-opt O(1) contra los mismos re-simulando.
+
+Todo corre en una carpeta temporal (landmarks y cachés en disco no tocan cache/ real).
+Uso (desde backend_arquitecturado/):
+    python -m app.herramientas.oraculo                       # 20 grafos
+    python -m app.herramientas.oraculo --casos 100 --semilla 7 --paradas 14 --tablas-zona
+Sale con código 1 si algún motor se sale de tolerancia (la semilla del grafo va en el detalle).
+Una corrida corta con semilla fija corre también en pytest (tests/test_oraculo.py).
+"""
+import argparse
+import contextlib
+import io
+import itertools
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import networkx as nx
+import numpy as np
+from app.core.config import PERFILES_VELOCIDAD, TIEMPO_SERVICIO_MIN, UMBRAL_EXACTO, PESO_TARDANZA
+from app.core.grafo_sintetico import generar_grafo
+from app.services.busqueda import dijkstra_acotado, metros_por_arbol
+from app.services.busqueda_dirigida import camino_mas_corto, preparar_landmarks
+from app.services.logica_rutas import calcular_metricas, optimizar_indices, costo_ruta
+from app.services.matrices import construir_matriz_tiempos
+from app.services.perfiles import get_perfil
+from app.services.ruta_exacta import held_karp
+from app.services.tramos import obtener_tramo
+from app.services import tablas_zona, ventanas
+
+
+# =============================================================================
+# REFERENCIA (NETWORKX / FUERZA BRUTA)
+# =============================================================================
+def _peso(perfil):
+    if perfil is None: return 'travel_time'
+    return lambda a, b, aristas, pesos=perfil.tiempos: min(pesos[d['eid']] for d in aristas.values())
+
+
+def _arista(G, a, b, perfil):
+    """La arista paralela más rápida (la que usan todos los motores)."""
+    t = (lambda d: d['travel_time']) if perfil is None else (lambda d: perfil.tiempos[d['eid']])
+    return min(G._succ[a][b].values(), key=t), t
+
+
+def _medir_camino(G, camino, perfil):
+    """(segundos, metros) del camino, o None si algún paso no es una arista."""
+    seg = met = 0.0
+    for a, b in zip(camino, camino[1:]):
+        if b not in G._succ.get(a, {}): return None
+        d, t = _arista(G, a, b, perfil)
+        seg += t(d); met += d['length']
+    return seg, met
+
+
+def _simular(ruta, m, r):
+    """Ventanas por simulación directa (retraso como time warp): manejo + PESO_TARDANZA * retraso."""
+    t, previo, manejo, retraso = 0.0, None, 0.0, 0.0
+    for k in ruta:
+        if previo is not None: manejo += m[previo][k]; t += m[previo][k]
+        t = max(t, r.abre[k])
+        if t > r.cierra[k]: retraso += t - r.cierra[k]; t = r.cierra[k]
+        t += r.servicio[k]; previo = k
+    return manejo + PESO_TARDANZA * retraso
+
+
+def _or_opt_simulando(ruta, m, lim, r):
+    """El mismo recorrido de movimientos que ventanas.or_opt, re-simulando la ruta en cada uno."""
+    n, actual = len(ruta), _simular(ruta, m, r) - 1e-9
+    for largo in (1, 2, 3):
+        for i in range(1, lim - largo + 1):
+            for p in list(range(i - 1, 0, -1)) + list(range(i + largo + 1, lim + 1)):
+                if p < i: cand = ruta[:p] + ruta[i:i + largo] + ruta[p:i] + ruta[i + largo:]
+                else: cand = ruta[:i] + ruta[i + largo:p] + ruta[i:i + largo] + ruta[p:]
+                if _simular(cand, m, r) < actual:
+                    ruta[:] = cand
+                    return True
+    return False
+
+
+def _dos_opt_simulando(ruta, m, lim, r):
+    """El mismo recorrido de movimientos que ventanas.dos_opt, re-simulando la ruta en cada uno."""
+    mejoro = False
+    for i in range(1, lim - 1):
+        actual = _simular(ruta, m, r) - 1e-9
+        for j in range(i + 2, lim + 1):
+            cand = ruta[:i] + ruta[i:j][::-1] + ruta[j:]
+            if _simular(cand, m, r) < actual:
+                ruta[:] = cand; mejoro = True
+                break
+    return mejoro
+
+
+def _optimo(D, inicio, fin):
+    """Orden óptimo por fuerza bruta (pocas paradas)."""
+    resto = [i for i in range(len(D)) if i != inicio and i != fin]
+    mejor, mejor_c = None, float('inf')
+    for perm in itertools.permutations(resto):
+        ruta = [inicio, *perm] + ([fin] if fin is not None else [])
+        c = sum(D[a][b] for a, b in zip(ruta, ruta[1:]))
+        if c < mejor_c: mejor, mejor_c = ruta, c
+    return mejor, mejor_c
+
+
+def _valido(orden, indices, inicio, fin):
+    return sorted(orden) == sorted(indices) and orden[0] == inicio and (fin is None or orden[-1] == fin)
+
+
+# =============================================================================
+# MARCADOR
+# =============================================================================
+class Marcador:
+    """Por motor: casos, fallas, error máximo, segundos de referencia y del motor, ejemplos de falla."""
+
+    def __init__(self):
+        self.motores = {}
+
+    def anotar(self, motor, t_ref, t_motor, error, ok, detalle=""):
+        r = self.motores.setdefault(motor, {"casos": 0, "fallas": 0, "error": 0.0, "t_ref": 0.0, "t_motor": 0.0, "ejemplos": []})
+        r["casos"] += 1; r["t_ref"] += t_ref; r["t_motor"] += t_motor
+        r["error"] = max(r["error"], error)
+        if not ok:
+            r["fallas"] += 1
+            if len(r["ejemplos"]) < 3: r["ejemplos"].append(detalle)
+
+    def imprimir(self):
+        print(f"\n{'motor':<42}{'casos':>7}{'fallas':>8}{'error máx':>12}{'ref ms':>10}{'motor ms':>10}{'acel.':>8}")
+        for motor, r in self.motores.items():
+            acel = r["t_ref"] / r["t_motor"] if r["t_motor"] > 0 else float('inf')
+            print(f"{motor:<42}{r['casos']:>7}{r['fallas']:>8}{r['error']:>12.4g}{r['t_ref']*1000:>10.0f}"
+                  f"{r['t_motor']*1000:>10.0f}{acel:>7.1f}x")
+            for e in r["ejemplos"]: print(f"   ❌ {e}")
+        return sum(r["fallas"] for r in self.motores.values())
+
+
+def _reloj(f, *args, **kwargs):
+    t0 = time.perf_counter()
+    res = f(*args, **kwargs)
+    return res, time.perf_counter() - t0
+
+
+# =============================================================================
+# UN GRAFO
+# =============================================================================
+def probar_grafo(semilla, args, mar):
+    rnd = random.Random(semilla)
+    G = generar_grafo(args.zona, lado=rnd.randint(12, 32), semilla=semilla, prob_sentido_unico=rnd.uniform(0, 0.5),
+                      prob_paralela=rnd.uniform(0, 0.3), asimetria=rnd.uniform(0, 0.5))
+    nombre = rnd.choice([None, *PERFILES_VELOCIDAD])
+    perfil = get_perfil(G, nombre)
+    preparar_landmarks(G, perfil=perfil)
+    peso, tol_s, tol_m = _peso(perfil), args.tol_s, args.tol_m
+    ctx = f"semilla={semilla} perfil={nombre}"
+    paradas = rnd.sample(list(G.nodes), min(args.paradas, G.number_of_nodes()))
+    k = len(paradas)
+
+    # --- Referencia: una búsqueda de networkx por parada (tiempos, caminos, metros) ---
+    T, M = np.zeros((k, k)), np.zeros((k, k))
+    t_ref_matriz = 0.0
+    for i, u in enumerate(paradas):
+        (dist, caminos), t_ref = _reloj(nx.single_source_dijkstra, G, u, weight=peso)
+        t_ref_matriz += t_ref
+        for j, v in enumerate(paradas): T[i, j], M[i, j] = dist[v], _medir_camino(G, caminos[v], perfil)[1]
+
+        # dijkstra_acotado + metros_por_arbol (el motor de /tabla y de las matrices)
+        t0 = time.perf_counter()
+        padres = {}
+        d2 = dijkstra_acotado(G, u, set(paradas), padres=padres, perfil=perfil)
+        m2 = metros_por_arbol(G, d2, padres, u, perfil=perfil)
+        t_mot = time.perf_counter() - t0
+        err = max(max(abs(d2[v] - T[i, j]) for j, v in enumerate(paradas)),
+                  max(abs(m2[v] - M[i, j]) for j, v in enumerate(paradas)) * tol_s / tol_m)
+        mar.anotar("dijkstra_acotado + metros", t_ref, t_mot, err, err <= tol_s, f"{ctx} fuente={u} error={err:.4g}")
+
+    # --- Pares al azar: A* + ALT y tramos ---
+    for _ in range(args.pares):
+        i, j = rnd.sample(range(k), 2)
+        u, v = paradas[i], paradas[j]
+        _, t_ref = _reloj(nx.shortest_path, G, u, v, weight=peso)
+        camino, t_mot = _reloj(camino_mas_corto, G, u, v, perfil=perfil)
+        medida = _medir_camino(G, camino, perfil) if camino[0] == u and camino[-1] == v else None
+        err = float('inf') if medida is None else max(abs(medida[0] - T[i, j]), abs(medida[1] - M[i, j]) * tol_s / tol_m)
+        mar.anotar("A* bidireccional + ALT", t_ref, t_mot, err, err <= tol_s, f"{ctx} {u}->{v} error={err:.4g}")
+        tramo, t_mot = _reloj(obtener_tramo, G, u, v, perfil)
+        medida = _medir_camino(G, tramo["path"], perfil)
+        err = float('inf') if medida is None else max(abs(tramo["tiempo_s"] - T[i, j]), abs(medida[0] - T[i, j]),
+                                                      abs(tramo["dist_m"] - M[i, j]) * tol_s / tol_m)
+        mar.anotar("tramos (caché + A*)", t_ref, t_mot, err, err <= tol_s, f"{ctx} {u}->{v} error={err:.4g}")
+
+    # --- Matriz del escenario (corredor) y la misma leída de la caché en disco ---
+    for motor in ("matriz (corredor)", "matriz (caché en disco)"):
+        ft, t_mot = _reloj(construir_matriz_tiempos, G, paradas, perfil)
+        err = float(np.abs(ft.densa() - T).max())
+        tol = tol_s + (0.5 if ft.formato == "uint16" else 0.0)  # uint16 guarda segundos enteros
+        mar.anotar(motor, t_ref_matriz, t_mot, err, err <= tol, f"{ctx} error={err:.4g}")
+
+    if args.tablas_zona and perfil is None:
+        tablas_zona.construir_tabla(G, args.zona)
+        tablas_zona.cargar_tablas(G)
+        err, t_mot = 0.0, 0.0
+        for i, u in enumerate(paradas):
+            res, t = _reloj(tablas_zona.tiempos_zona, G, None, u, paradas)
+            t_mot += t
+            err = max([err] + [abs(res[v][0] - T[i, j]) for j, v in enumerate(paradas) if v in res and v != u])
+        mar.anotar("tablas por zona (uint16)", t_ref_matriz, t_mot, err, err <= 0.5 + tol_s, f"{ctx} error={err:.4g}")
+        tablas_zona._TABLAS.clear()
+
+    # --- calcular_metricas sobre un orden al azar ---
+    orden = rnd.sample(range(k), k)
+    t0 = time.perf_counter()
+    seg = sum(nx.shortest_path_length(G, paradas[a], paradas[b], weight=peso) for a, b in zip(orden, orden[1:]))
+    t_ref = time.perf_counter() - t0
+    km_ref = round(sum(M[a, b] for a, b in zip(orden, orden[1:])) / 1000.0, 2)
+    minutos = (seg + (k - 1) * TIEMPO_SERVICIO_MIN * 60) / 60.0
+    tiempo_ref = f"{int(minutos)} min" if minutos < 60 else f"{int(minutos//60)}h {int(minutos%60)}m"
+    with contextlib.redirect_stdout(io.StringIO()):
+        (km, tiempo), t_mot = _reloj(calcular_metricas, orden, paradas, G, "Oráculo", perfil)
+    err = abs(km - km_ref)
+    mar.anotar("calcular_metricas", t_ref, t_mot, err, err <= 0.011 and tiempo == tiempo_ref,
+               f"{ctx} km {km} vs {km_ref}, tiempo {tiempo} vs {tiempo_ref}")
+
+    # --- optimizar_indices: exacto contra fuerza bruta ---
+    n = min(k, 8)
+    D = T[:n, :n]
+    fin = n - 1 if rnd.random() < 0.5 else None
+    (ref, c_ref), t_ref = _reloj(_optimo, D, 0, fin)
+    orden, t_mot = _reloj(optimizar_indices, list(range(n)), D, 0, fin, asimetrico=True)
+    ok = _valido(orden, range(n), 0, fin)
+    err = costo_ruta(orden, D) - c_ref if ok else float('inf')
+    mar.anotar("optimizar_indices (Held-Karp)", t_ref, t_mot, err, ok and err <= 1e-6, f"{ctx} n={n} {orden} vs {ref}")
+
+    # --- optimizar_indices heurístico contra el óptimo (Held-Karp como referencia) ---
+    n = min(k, 16)
+    if n > UMBRAL_EXACTO:
+        D = T[:n, :n]
+        ref, t_ref = _reloj(held_karp, D, 0, None)
+        orden, t_mot = _reloj(optimizar_indices, list(range(n)), D, 0, None, asimetrico=True,
+                              presupuesto_s=args.presupuesto, semilla=semilla)
+        ok = _valido(orden, range(n), 0, None)
+        brecha = (costo_ruta(orden, D) / costo_ruta(ref, D) - 1) * 100 if ok else float('inf')
+        # La brecha es informativa (es una heurística); la falla es un orden inválido o peor que el óptimo
+        mar.anotar("optimizar_indices (heurística, % brecha)", t_ref, t_mot, brecha, ok and brecha >= -1e-6,
+                   f"{ctx} n={n} orden inválido o brecha negativa {brecha}")
+
+    # --- Ventanas: resumen O(1) y or-opt O(1) contra re-simular ---
+    n = k
+    D = T.tolist()
+    servicio = [0] + [rnd.randint(2, 5) * 60 for _ in range(n - 1)]
+    horizonte = float(T.max()) * n / 2
+    vent = [None] + [(lambda a: (a, a + rnd.choice([600, 1800])))(rnd.uniform(0, horizonte)) if rnd.random() < 0.5 else None
+                     for _ in range(n - 1)]
+    r = ventanas.Restricciones(servicio, vent)
+    ruta = [0] + rnd.sample(range(1, n), n - 1)
+    c_ref, t_ref = _reloj(_simular, ruta, D, r)
+    c, t_mot = _reloj(costo_ruta, ruta, D, r)
+    err = max(abs(c - c_ref), abs(ventanas.valor(ventanas.resumir(ruta, D, r)) - c_ref))
+    mar.anotar("ventanas: costo (directo y por resúmenes)", t_ref, t_mot, err, err <= 1e-6 * max(1, c_ref),
+               f"{ctx} {c} vs {c_ref}")
+    for motor, rapido, lento in (("ventanas: or-opt O(1)", ventanas.or_opt, _or_opt_simulando),
+                                 ("ventanas: 2-opt O(1)", ventanas.dos_opt, _dos_opt_simulando)):
+        rapida, lenta = ruta[:], ruta[:]
+        t0 = time.perf_counter()
+        while lento(lenta, D, n, r): pass
+        t_ref = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        while rapido(rapida, D, n, r): pass
+        t_mot = time.perf_counter() - t0
+        err = abs(_simular(rapida, D, r) - _simular(lenta, D, r))
+        mar.anotar(motor, t_ref, t_mot, err, rapida == lenta or err <= 1e-6 * max(1, c_ref),
+                   f"{ctx} costo {_simular(rapida, D, r)} vs {_simular(lenta, D, r)}")
+
+
+def crear_parser():
+    parser = argparse.ArgumentParser(description="Compara los motores rápidos contra networkx en grafos sintéticos.")
+    parser.add_argument("--casos", type=int, default=20, help="Grafos al azar")
+    parser.add_argument("--semilla", type=int, default=0, help="Semilla del primer grafo (los demás: +1, +2, ...)")
+    parser.add_argument("--paradas", type=int, default=14, help="Paradas por grafo")
+    parser.add_argument("--pares", type=int, default=30, help="Pares al azar por grafo para A* / tramos")
+    parser.add_argument("--zona", default="neza")
+    parser.add_argument("--tol-s", type=float, default=0.01, help="Tolerancia en segundos")
+    parser.add_argument("--tol-m", type=float, default=0.01, help="Tolerancia en metros")
+    parser.add_argument("--presupuesto", type=float, default=0.05, help="Segundos del solver heurístico")
+    parser.add_argument("--tablas-zona", action="store_true", help="Construir y revisar también la tabla de la zona")
+    return parser
+
+
+def correr(args):
+    """Prueba args.casos grafos en una carpeta temporal y devuelve el Marcador."""
+    mar = Marcador()
+    origen = os.getcwd()
+    carpeta = tempfile.mkdtemp(prefix="oraculo_")
+    os.chdir(carpeta)  # cache/ relativo: landmarks, tiempos.sqlite y zonas quedan aquí
+    os.makedirs("cache", exist_ok=True)
+    t0 = time.time()
+    try:
+        for s in range(args.semilla, args.semilla + args.casos):
+            with contextlib.redirect_stdout(io.StringIO()):
+                probar_grafo(s, args, mar)
+            print(f">>> 🔎 grafo {s - args.semilla + 1}/{args.casos} ({time.time() - t0:.0f}s)", file=sys.stderr)
+    finally:
+        os.chdir(origen)
+        shutil.rmtree(carpeta, ignore_errors=True)
+    return mar
+
+
+def main():
+    args = crear_parser().parse_args()
+    t0 = time.time()
+    fallas = correr(args).imprimir()
+    print(f"\n{'✅ Todo dentro de tolerancia' if fallas == 0 else f'❌ {fallas} fallas'} ({args.casos} grafos, {time.time() - t0:.0f}s)")
+    sys.exit(1 if fallas else 0)
+
+
+if __name__ == "__main__":
+    main()
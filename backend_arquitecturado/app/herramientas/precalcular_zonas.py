@@ -0,0 +1,42 @@
+# backend_arquitecturado/app/herramientas/precalcular_zonas.py
+"""
+Construye (o revisa) las tablas precalculadas por zona que usa services/tablas_zona.py.
+
+Uso (desde backend_arquitecturado/):
+    python -m app.herramientas.precalcular_zonas --estado            # lista / vieja / falta por zona y perfil
+    python -m app.herramientas.precalcular_zonas                     # sólo las que faltan o quedaron viejas
+    python -m app.herramientas.precalcular_zonas --zonas neza ipn --forzar
+    python -m app.herramientas.precalcular_zonas --zonas sur --max-nodos 9000   # zona más grande que MAX_NODOS_ZONA
+El grafo es el mismo que carga el servidor (get_grafo); los perfiles salen de PERFILES_ZONA.
+"""
+import argparse
+import time
+from app.core.config import COORDS_ZONAS, MAX_NODOS_ZONA
+from app.core.mapa import get_grafo
+from app.services.tablas_zona import estado_tablas, precalcular_zonas, nodos_zona, bytes_tabla, CARPETA_ZONAS
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tablas de tiempos todos-contra-todos por zona de generación.")
+    parser.add_argument("--zonas", nargs="+", choices=sorted(COORDS_ZONAS), help="Sólo estas zonas")
+    parser.add_argument("--forzar", action="store_true", help="Reconstruir aunque estén vigentes")
+    parser.add_argument("--estado", action="store_true", help="Sólo mostrar el estado y salir")
+    parser.add_argument("--max-nodos", type=int, default=MAX_NODOS_ZONA,
+                        help=f"Zonas con más nodos no se construyen (default {MAX_NODOS_ZONA}; 0 = sin límite)")
+    args = parser.parse_args()
+
+    G = get_grafo()
+    if G is None: raise SystemExit("❌ No se pudo cargar el grafo")
+    print(f"📂 Tablas en {CARPETA_ZONAS} (grafo {G.graph.get('version_grafo')})")
+    for (zona, firma), e in estado_tablas(G).items():
+        k = len(nodos_zona(G, zona))
+        grande = " ⚠️ sobre el límite" if args.max_nodos and k > args.max_nodos else ""
+        print(f"   - {zona}/{firma}: {e} ({k} nodos, {bytes_tabla(k)/1e6:.0f} MB){grande}")
+    if args.estado: return
+    t0 = time.time()
+    listas = precalcular_zonas(G, zonas=args.zonas, forzar=args.forzar, max_nodos=args.max_nodos)
+    print(f"✅ {listas} tablas vigentes ({time.time() - t0:.0f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+# backend_arquitecturado/app/herramientas/repeticion.py
+"""
+Repite sesiones de despacho contra una instancia local y mide latencia, throughput y memoria.
+
+Las acciones vienen de una grabación JSONL (FLEET_GRABACION=acciones.jsonl al correr el
+servidor) o de un guion sintético sembrado. Cada sesión concurrente usa su propio
+?sesion=..., así que no se pisan el estado entre sí.
+
+Uso (desde backend_arquitecturado/):
+    python -m app.herramientas.repeticion --sesiones 20                        # guion + grafo sintético
+    python -m app.herramientas.repeticion acciones.jsonl --sesiones 50 --grafo cache/mapa_cdmx_preparado_30000.pkl
+    python -m app.herramientas.repeticion acciones.jsonl --url http://127.0.0.1:8000   # servidor ya levantado
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from app.core.grafo_sintetico import generar_grafo
+from app.core.preparacion import guardar_artefacto
+
+
+# =============================================================================
+# GUIONES
+# =============================================================================
+def cargar_grabacion(ruta):
+    """Acciones grabadas agrupadas por sesión original (en orden)."""
+    por_sesion = {}
+    with open(ruta, encoding="utf-8") as f:
+        for linea in f:
+            if not linea.strip(): continue
+            ev = json.loads(linea)
+            por_sesion.setdefault(ev.get("sesion") or "_", []).append(ev)
+    return list(por_sesion.values())
+
+
+def guion_sintetico(semilla, zona="neza", acciones=30):
+    """Genera un escenario sembrado y le aplica acciones de despacho sobre P-1..P-10 (siempre existen)."""
+    rnd = random.Random(semilla)
+    ev = [{"ruta": "/simulacion-leaflet", "params": {"accion_tipo": "generar_random", "zona_generacion": zona,
+                                                     "reset": True, "semilla": semilla}}]
+    tipos = ["visitar", "omitir", "restaurar", "asignar_zona", "toggle_vip", "fijar_fin"]
+    for _ in range(acciones):
+        tipo = rnd.choice(tipos)
+        params = {"accion_tipo": tipo, "accion_id": f"P-{rnd.randint(2, 10)}"}
+        if tipo == "asignar_zona": params["valor_extra"] = rnd.randint(0, 2)
+        ev.append({"ruta": "/simulacion-leaflet", "params": params})
+    return ev
+
+
+# =============================================================================
+# SERVIDOR LOCAL
+# =============================================================================
+def levantar_servidor(ruta_grafo, puerto, carpeta):
+    env = dict(os.environ, FLEET_GRAFO=os.path.abspath(ruta_grafo), PYTHONPATH=os.getcwd())
+    env.pop("FLEET_GRABACION", None)
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(puerto), "--log-level", "warning"],
+        cwd=carpeta, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+
+def esperar_listo(url, limite_s=300):
+    t0 = time.time()
+    while time.time() - t0 < limite_s:
+        try:
+            with urllib.request.urlopen(url + "/salud/listo", timeout=2) as r:
+                if r.status == 200: return time.time() - t0
+        except (urllib.error.URLError, ConnectionError, OSError):
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("El servidor no quedó listo a tiempo")
+
+
+def rss_kb(pid):
+    """RSS actual y pico (VmHWM) del proceso servidor, desde /proc."""
+    datos = {}
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for linea in f:
+                if linea.startswith(("VmRSS:", "VmHWM:")):
+                    clave, valor = linea.split(":")
+                    datos[clave] = int(valor.split()[0])
+    except OSError:
+        pass
+    return datos.get("VmRSS"), datos.get("VmHWM")
+
+
+# =============================================================================
+# REPETICIÓN
+# =============================================================================
+def repetir_sesion(url, nombre, eventos, respetar_tiempos):
+    latencias, errores = [], 0
+    t_prev = None
+    for ev in eventos:
+        if respetar_tiempos and t_prev is not None and "t" in ev:
+            time.sleep(max(0.0, ev["t"] - t_prev))
+        t_prev = ev.get("t")
+        params = {k: (str(v).lower() if isinstance(v, bool) else v) for k, v in ev["params"].items()}
+        params["sesion"] = nombre
+        consulta = url + ev["ruta"] + "?" + urllib.parse.urlencode(params)
+        t0 = time.perf_counter()
+        try:
+            with urllib.request.urlopen(consulta, timeout=60) as r:
+                r.read()
+                if r.status != 200: errores += 1
+        except (urllib.error.URLError, ConnectionError, OSError):
+            errores += 1
+        latencias.append(time.perf_counter() - t0)
+    return latencias, errores
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Repite sesiones grabadas/sintéticas y reporta latencias y memoria.")
+    parser.add_argument("grabacion", nargs="?", help="JSONL de acciones (FLEET_GRABACION); sin él, guion sintético")
+    parser.add_argument("--sesiones", type=int, default=10, help="Sesiones concurrentes")
+    parser.add_argument("--vueltas", type=int, default=1, help="Veces que cada sesión repite su guion")
+    parser.add_argument("--grafo", help="Artefacto .pkl a servir (por defecto: cuadrícula sintética)")
+    parser.add_argument("--zona", default="neza", help="Zona de la cuadrícula sintética / guion")
+    parser.add_argument("--url", help="Usar un servidor ya levantado en lugar de lanzar uno")
+    parser.add_argument("--puerto", type=int, default=8765)
+    parser.add_argument("--respetar-tiempos", action="store_true", help="Esperar entre acciones como en la grabación")
+    args = parser.parse_args()
+
+    guiones = cargar_grabacion(args.grabacion) if args.grabacion else [guion_sintetico(s, args.zona) for s in range(args.sesiones)]
+
+    proceso = None
+    carpeta = tempfile.mkdtemp(prefix="repeticion_")
+    url = args.url
+    try:
+        if url is None:
+            ruta_grafo = args.grafo
+            if ruta_grafo is None:
+                ruta_grafo = os.path.join(carpeta, "grafo_sintetico.pkl")
+                guardar_artefacto(generar_grafo(args.zona), ruta_grafo)
+            proceso = levantar_servidor(ruta_grafo, args.puerto, carpeta)
+            url = f"http://127.0.0.1:{args.puerto}"
+            print(f">>> ⏳ Servidor listo en {esperar_listo(url):.1f}s")
+        else:
+            esperar_listo(url)
+
+        rss_ini = rss_kb(proceso.pid) if proceso else (None, None)
+        trabajos = [(f"rep-{k}", guiones[k % len(guiones)] * args.vueltas) for k in range(args.sesiones)]
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.sesiones) as ex:
+            resultados = list(ex.map(lambda t: repetir_sesion(url, t[0], t[1], args.respetar_tiempos), trabajos))
+        total_s = time.perf_counter() - t0
+        rss_fin, rss_pico = rss_kb(proceso.pid) if proceso else (None, None)
+
+        lat = np.array([l for ls, _ in resultados for l in ls]) * 1000
+        errores = sum(e for _, e in resultados)
+        print(f"\n📊 REPETICIÓN: {args.sesiones} sesiones x {args.vueltas} vuelta(s)")
+        print(f"   - Peticiones: {len(lat)} ({errores} con error) en {total_s:.1f}s -> {len(lat)/total_s:.1f} req/s")
+        if len(lat):
+            p50, p95, p99 = np.percentile(lat, [50, 95, 99])
+            print(f"   - Latencia: p50={p50:.0f} ms | p95={p95:.0f} ms | p99={p99:.0f} ms | máx={lat.max():.0f} ms")
+        if rss_ini[0] is not None and rss_fin is not None:
+            print(f"   - Memoria: {rss_ini[0]/1024:.0f} MB -> {rss_fin/1024:.0f} MB "
+                  f"(+{(rss_fin-rss_ini[0])/1024:.0f} MB, pico {rss_pico/1024:.0f} MB)")
+    finally:
+        if proceso is not None:
+            proceso.terminate(); proceso.wait(timeout=10)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+# backend_arquitecturado/app/herramientas/reporte.py
+"""
+Genera reportes (PNG/PDF) de planes de ruta sin abrir ventanas.
+
+La red de calles se dibuja UNA vez a un raster (cache/base_<versión>_<caja>.png) que
+luego reutilizan todas las figuras; las rutas se sobreponen con las coords que ya
+vienen en el plan (las mismas que devuelve /simulacion-leaflet), sin volver a rutear.
+
+Uso (desde backend_arquitecturado/):
+    python -m app.herramientas.reporte plan1.json plan2.json --salida reportes/
+    python -m app.herramientas.reporte planes/*.json --formato pdf --procesos 4
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import matplotlib
+matplotlib.use("Agg")  # sin GUI: nunca abre ventanas
+import matplotlib.pyplot as plt
+from matplotlib.collections import LineCollection
+from app.core.mapa import CACHE_DIR, ruta_preparado
+from app.core.preparacion import cargar_artefacto, es_avenida
+
+COLOR_AVENIDA, COLOR_CALLE = '#FFD700', '#333333'
+COLORES_TIPO = {"INICIO": '#32CD32', "FIN": '#FF4444', "INICIO_FIN": '#32CD32', "VIP": '#FFD700'}
+PIXELES_BASE = 4000  # lado mayor del raster base
+
+_BASE = None  # (imagen, extent) cargado una vez por proceso
+
+
+# =============================================================================
+# CAPA BASE (UNA SOLA VEZ)
+# =============================================================================
+def _caja_planes(planes, margen=0.005):
+    lats, lons = [], []
+    for plan in planes:
+        for p in plan.get("paradas", []):
+            lats.append(p["lat"]); lons.append(p["lon"])
+    if not lats: return None
+    return min(lons) - margen, max(lons) + margen, min(lats) - margen, max(lats) + margen
+
+
+def _segmentos(G, caja):
+    """Segmentos (lon, lat) de las calles dentro de la caja y su color por tipo de vía."""
+    x0, x1, y0, y1 = caja
+    segs, colores = [], []
+    for u, v, d in G.edges(data=True):
+        nu, nv = G.nodes[u], G.nodes[v]
+        if not (x0 <= nu['x'] <= x1 and y0 <= nu['y'] <= y1) and not (x0 <= nv['x'] <= x1 and y0 <= nv['y'] <= y1):
+            continue
+        geom = d.get('geometry')
+        pts = np.asarray(geom.coords) if geom is not None else np.array([[nu['x'], nu['y']], [nv['x'], nv['y']]])
+        segs.append(pts)
+        colores.append(COLOR_AVENIDA if es_avenida(d.get('highway')) else COLOR_CALLE)
+    return segs, colores
+
+
+def preparar_base(G, caja):
+    """Dibuja la red a un raster reutilizable; si ya existe para esta versión y caja, no hace nada."""
+    clave = hashlib.sha1(repr(tuple(round(c, 5) for c in caja)).encode()).hexdigest()[:10]
+    ruta = os.path.join(CACHE_DIR, f"base_{G.graph.get('version_grafo', 'sinversion')}_{clave}.png")
+    if os.path.exists(ruta): return ruta
+    x0, x1, y0, y1 = caja
+    ancho = (x1 - x0) * np.cos(np.radians((y0 + y1) / 2))
+    alto = y1 - y0
+    escala = PIXELES_BASE / max(ancho, alto)
+    fig = plt.figure(figsize=(ancho * escala / 100, alto * escala / 100), dpi=100, facecolor='black')
+    ax = fig.add_axes([0, 0, 1, 1]); ax.set_axis_off(); ax.set_facecolor('black')
+    segs, colores = _segmentos(G, caja)
+    ax.add_collection(LineCollection(segs, colors=colores, linewidths=0.5))
+    ax.set_xlim(x0, x1); ax.set_ylim(y0, y1)
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    fig.savefig(ruta, dpi=100, facecolor='black')
+    plt.close(fig)
+    print(f">>> 🗺️ CAPA BASE: {len(segs)} calles -> {ruta}")
+    return ruta
+
+
+def _iniciar_trabajador(ruta_base, caja):
+    global _BASE
+    _BASE = (plt.imread(ruta_base), caja)
+
+
+# =============================================================================
+# FIGURA DE UN PLAN
+# =============================================================================
+def _dibujar_ruta(ax, ruta, color, lw, zorder):
+    if not ruta or not ruta.get("coords"): return
+    c = np.asarray(ruta["coords"])
+    ax.plot(c[:, 1], c[:, 0], c=color, lw=lw, alpha=0.9, zorder=zorder)
+
+
+def renderizar_plan(nombre, plan, salida, formato):
+    imagen, (x0, x1, y0, y1) = _BASE
+    fig, ax = plt.subplots(figsize=(8, 8), facecolor='black')
+    ax.set_facecolor('black'); ax.set_axis_off()
+    ax.imshow(imagen, extent=(x0, x1, y0, y1), zorder=0, interpolation='bilinear')
+
+    for r in plan.get("rutas_clusters", []):
+        _dibujar_ruta(ax, r, r.get("color", 'white'), 2, 4)
+    _dibujar_ruta(ax, plan.get("ruta_global"), 'cyan', 3, 5)
+    _dibujar_ruta(ax, plan.get("ruta_vip"), COLOR_AVENIDA, 2, 6)
+
+    paradas = plan.get("paradas", [])
+    if paradas:
+        xs = [p["lon"] for p in paradas]; ys = [p["lat"] for p in paradas]
+        cs = [COLORES_TIPO.get(p.get("tipo"), '#FF4444') for p in paradas]
+        ax.scatter(xs, ys, c=cs, s=60, zorder=10, edgecolors='white')
+        m = 0.003
+        ax.set_xlim(min(xs) - m, max(xs) + m); ax.set_ylim(min(ys) - m, max(ys) + m)
+    ax.set_aspect(1 / np.cos(np.radians((y0 + y1) / 2)))
+
+    g = plan.get("ruta_global") or {}
+    ax.set_title(f"{nombre}: {len(paradas)} paradas | {g.get('km', 0)} km | {g.get('tiempo', '-')}", color='white')
+    ruta = os.path.join(salida, f"{nombre}.{formato}")
+    fig.savefig(ruta, facecolor='black', bbox_inches='tight')
+    plt.close(fig)
+    return ruta
+
+
+def _cargar_plan(ruta):
+    with open(ruta, encoding='utf-8') as f:
+        return os.path.splitext(os.path.basename(ruta))[0], json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reportes PNG/PDF de planes de ruta (sin GUI).")
+    parser.add_argument("planes", nargs="+", help="JSON de planes (respuestas de /simulacion-leaflet)")
+    parser.add_argument("--salida", default="reportes", help="Carpeta de salida")
+    parser.add_argument("--formato", default="png", choices=["png", "pdf"])
+    parser.add_argument("--procesos", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--grafo", default=ruta_preparado(), help="Artefacto preparado del grafo")
+    args = parser.parse_args()
+
+    t0 = time.time()
+    planes = [_cargar_plan(r) for r in args.planes]
+    caja = _caja_planes([p for _, p in planes])
+    if caja is None:
+        print(">>> ⚠️ Ningún plan trae paradas"); return
+    ruta_base = preparar_base(cargar_artefacto(args.grafo), caja)
+    os.makedirs(args.salida, exist_ok=True)
+
+    with ProcessPoolExecutor(max_workers=args.procesos, initializer=_iniciar_trabajador, initargs=(ruta_base, caja)) as ex:
+        tareas = [ex.submit(renderizar_plan, nombre, plan, args.salida, args.formato) for nombre, plan in planes]
+        for t in tareas: print(f"   - {t.result()}")
+    print(f">>> ✅ {len(planes)} REPORTES en {time.time()-t0:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
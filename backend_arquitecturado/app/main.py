@@ -1,9 +1,22 @@
+import threading
+import time
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.routers import endpoints
-from app.core.mapa import get_grafo  # <-- CORRECCIÓN: Antes decía 'cargar_mapa'
+from starlette.concurrency import run_in_threadpool
+from app.routers import endpoints, salud, conductor, tabla, diagnostico, admin, teselas
+from app.core.config import (CALENTAR_CACHES, COMPRESION_MINIMA_BYTES, PERFILES_VELOCIDAD, ZOOMS_SEMBRAR, PRECALCULAR_ZONAS,
+                             REINTENTO_CARGA_S, REINTENTO_CARGA_MAX_S, imprimir_resumen)
+from app.core.mapa import get_grafo, ESTADO_CARGA, marcar_fase  # <-- CORRECCIÓN: Antes decía 'cargar_mapa'
+from app.core.indice_espacial import get_indice
+from app.services.busqueda_dirigida import preparar_landmarks
+from app.services.perfiles import get_perfil
+from app.services.teselas import sembrar_teselas
+from app.services.tablas_zona import cargar_tablas, precalcular_zonas
+from app.services.incidentes import incidentes_al_dia, sincronizar_incidentes
+from app.core.respuestas import RespuestaRapida
+from app.core.compresion import CompresionMiddleware
 
-app = FastAPI(title="Fleet Master Pro API")
+app = FastAPI(title="Fleet Master Pro API", default_response_class=RespuestaRapida)
 
 # --- CONFIGURACIÓN DE CORS ---
 # Permite que tu frontend (HTML) se comunique con el backend
@@ -15,23 +28,104 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# --- COMPRESIÓN NEGOCIADA (br / gzip) ---
+app.add_middleware(CompresionMiddleware, minimo=COMPRESION_MINIMA_BYTES)
+
+# --- INCIDENTES CREADOS O LEVANTADOS EN OTRO WORKER ---
+# Antes de atender se aplican (una consulta al registro si nada cambió; el trabajo, fuera del loop)
+@app.middleware("http")
+async def incidentes_de_otros_workers(request, call_next):
+    G = get_grafo(esperar=False)
+    if G is not None and not incidentes_al_dia(G): await run_in_threadpool(sincronizar_incidentes, G)
+    return await call_next(request)
+
 # --- INCLUIR RUTAS
 app.include_router(endpoints.router)
+app.include_router(salud.router)
+app.include_router(conductor.router)
+app.include_router(tabla.router)
+app.include_router(diagnostico.router)
+app.include_router(admin.router)
+app.include_router(teselas.router)
+
+
+def preparar_grafo():
+    """
+    Carga el mapa y precalienta las cachés (índice espacial, landmarks por perfil de velocidad).
+    Con uvicorn corre en un hilo aparte; con app.servidor lo corre el maestro antes del fork.
+    """
+    marcar_fase("cargando_grafo", 0.1)
+    grafo = get_grafo()
+    if grafo is None:
+        marcar_fase("error", 0.0)
+        print(">>> ⚠️ ADVERTENCIA: El mapa no se pudo cargar al inicio")
+        return None
+
+    if CALENTAR_CACHES:
+        marcar_fase("indice_espacial", 0.6)
+        get_indice(grafo)
+        # Landmarks ALT para la búsqueda dirigida (se leen de cache/ si ya existen)
+        marcar_fase("landmarks", 0.8)
+        preparar_landmarks(grafo)
+        # Cada perfil (pico/valle/noche) tiene sus tiempos y sus landmarks; mientras no estén,
+        # A* con ese perfil usa sólo la cota geométrica
+        marcar_fase("perfiles_velocidad", 0.9)
+        for nombre in PERFILES_VELOCIDAD: preparar_landmarks(grafo, perfil=get_perfil(grafo, nombre))
+        # Tablas por zona ya construidas (sólo se mapean: no cuestan RAM propia)
+        marcar_fase("tablas_zona", 0.95)
+        cargar_tablas(grafo)
+
+    marcar_fase("listo", 1.0)
+    ESTADO_CARGA["listo"] = True
+    ESTADO_CARGA["fin"] = time.time()
+    print(">>> ✅ MAPA CARGADO Y SISTEMA LISTO")
+    return grafo
+
+
+def tareas_de_fondo(grafo):
+    """Lo que no hace falta para atender: se hace con el servidor ya recibiendo tráfico."""
+    # Teselas de las zonas de trabajo: ya con tráfico entrando (lo que falte se genera al pedirse)
+    if CALENTAR_CACHES and ZOOMS_SEMBRAR: sembrar_teselas(grafo)
+    # Tablas por zona que falten o quedaron viejas (nuevo grafo): se arman con el servidor ya atendiendo
+    if PRECALCULAR_ZONAS: precalcular_zonas(grafo)
+
+
+def cargar_y_calentar():
+    """
+    Corre en un hilo aparte: el servidor ya escucha y responde /salud/* mientras tanto.
+    Si la carga falla, /salud/listo reporta el error (503) y se vuelve a intentar con espera
+    creciente, en vez de quedarse en 503 hasta reiniciar el proceso.
+    """
+    espera = REINTENTO_CARGA_S
+    while True:
+        grafo = None
+        try:
+            grafo = preparar_grafo()
+        except Exception as e:
+            print(f"❌ Error preparando el mapa: {e}")
+            marcar_fase("error", 0.0)
+            ESTADO_CARGA["error"] = str(e)
+        if grafo is not None:
+            tareas_de_fondo(grafo)
+            return grafo
+        print(f">>> 🔁 REINTENTANDO CARGA DEL MAPA EN {espera}s")
+        time.sleep(espera)
+        espera = min(espera * 2, REINTENTO_CARGA_MAX_S)
+
 
 # --- EVENTO DE INICIO ---
 @app.on_event("startup")
 async def startup_event():
     """
     Se ejecuta automáticamente al iniciar el servidor.
-    Intenta cargar el mapa en memoria RAM de una vez para que
-    la primera petición del usuario no sea lenta.
+    No bloquea: el mapa se carga en segundo plano y /salud/listo
+    indica cuándo la instancia puede recibir tráfico.
     """
+    imprimir_resumen()
     print(">>> 🚀 INICIANDO SERVIDOR FLEET MASTER PRO...")
-    
-    # Llamamos a la función con el nombre NUEVO
-    grafo = get_grafo()
-    
-    if grafo:
-        print(">>> ✅ MAPA CARGADO Y SISTEMA LISTO")
-    else:
-        print(">>> ⚠️ ADVERTENCIA: El mapa no se pudo cargar al inicio (se intentará de nuevo en la primera petición)")
\ No newline at end of file
+    if ESTADO_CARGA["listo"]:
+        # Worker de app.servidor: el grafo llegó listo del maestro; las tareas de fondo sólo en uno
+        if ESTADO_CARGA["worker"] == 0:
+            threading.Thread(target=tareas_de_fondo, args=(get_grafo(),), name="tareas-fondo", daemon=True).start()
+        return
+    threading.Thread(target=cargar_y_calentar, name="carga-grafo", daemon=True).start()
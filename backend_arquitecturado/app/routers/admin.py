@@ -0,0 +1,67 @@
+import time
+from fastapi import APIRouter, HTTPException, Header
+from pydantic import BaseModel
+from typing import List, Optional
+from app.core.config import TOKEN_ADMIN
+from app.core.mapa import get_grafo
+from app.services.incidentes import (aristas_por_pares, aristas_en_poligono, crear_incidente,
+                                     levantar_incidente, listar_incidentes)
+
+router = APIRouter(prefix="/admin")
+
+
+class IncidenteRequest(BaseModel):
+    aristas: Optional[List[List[int]]] = None      # [[u, v], [u, v, k], ...]
+    poligono: Optional[List[List[float]]] = None   # [[lat, lon], ...]
+    factor: Optional[float] = None                 # multiplicador del tiempo (>= 1)
+    cerrar: bool = False                           # cierre: factor = FACTOR_CIERRE
+    descripcion: str = ""
+
+
+def _grafo(token):
+    if TOKEN_ADMIN and token != TOKEN_ADMIN: raise HTTPException(401, "Token de administración inválido")
+    G = get_grafo(esperar=False)
+    if G is None: raise HTTPException(503, "Cargando grafo (Espere un momento)...")
+    return G
+
+
+def _responder(inc, pares, resumen, t0):
+    return {"id": inc["id"], "num_aristas": len(inc["aristas"]), "factor": inc["factor"],
+            "invalidados": resumen, "segundos": round(time.perf_counter() - t0, 3)}
+
+
+# =============================================================================
+# INCIDENTES EN VIVO (CIERRES / EMBOTELLAMIENTOS)
+# =============================================================================
+@router.post("/incidentes")
+def nuevo_incidente(datos: IncidenteRequest, x_token_admin: str = Header(None)):
+    """
+    Hace más lentas (o cierra) las aristas dadas o las que tocan el polígono, sin reiniciar.
+    Sólo se invalidan los tramos, árboles, isocronas y filas de matriz que podían usarlas;
+    todo se recalcula al volver a pedirse. Los demás workers lo aplican antes de su siguiente petición
+    y cada escenario marca sus filas al usarse (por la generación devuelta en `invalidados`).
+    """
+    G = _grafo(x_token_admin)
+    t0 = time.perf_counter()
+    try:
+        aristas = aristas_por_pares(G, datos.aristas or [])
+        if datos.poligono: aristas += aristas_en_poligono(G, datos.poligono)
+        inc, pares, resumen = crear_incidente(G, aristas, datos.factor, datos.cerrar, datos.descripcion)
+    except ValueError as e:
+        raise HTTPException(422, str(e))
+    return _responder(inc, pares, resumen, t0)
+
+
+@router.get("/incidentes")
+def ver_incidentes(x_token_admin: str = Header(None)):
+    return {"incidentes": listar_incidentes(_grafo(x_token_admin))}
+
+
+@router.delete("/incidentes/{id_incidente}")
+def quitar_incidente(id_incidente: int, x_token_admin: str = Header(None)):
+    """Levanta el incidente: sus aristas vuelven al tiempo normal (o al de otros incidentes activos)."""
+    G = _grafo(x_token_admin)
+    t0 = time.perf_counter()
+    res = levantar_incidente(G, id_incidente)
+    if res is None: raise HTTPException(404, f"No existe el incidente {id_incidente}")
+    return _responder(*res, t0)
@@ -0,0 +1,107 @@
+import json
+import math
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from starlette.concurrency import run_in_threadpool
+from app.core.mapa import get_grafo
+from app.core.indice_espacial import nodo_cercano
+from app.services.arboles import get_arbol, arbol_guardado
+from app.services.perfiles import get_perfil, perfil_por_hora, clave_perfil
+from app.services.tramos import obtener_coords_suaves
+from app.services.incidentes import incidentes_al_dia, sincronizar_incidentes
+
+router = APIRouter()
+
+
+# =============================================================================
+# CONDUCTOR EN VIVO: APROXIMACIÓN POR WEBSOCKET
+# =============================================================================
+def _coordenada(obj):
+    """(lat, lon) si obj trae ambos como números finitos; None si no."""
+    if not isinstance(obj, dict): return None
+    lat, lon = obj.get("lat"), obj.get("lon")
+    if not all(isinstance(c, (int, float)) and not isinstance(c, bool) and math.isfinite(c) for c in (lat, lon)):
+        return None
+    return float(lat), float(lon)
+
+
+@router.websocket("/ws/conductor")
+async def conductor(ws: WebSocket):
+    """
+    Sesión de un conductor. Mensajes del cliente (JSON):
+      {"destino": {"lat": .., "lon": ..}}  -> fija la parada objetivo (un árbol inverso por destino)
+         (+ "hora_salida": "HH:MM" opcional -> perfil de velocidad del árbol)
+      {"lat": .., "lon": ..}               -> posición GPS
+    Cada posición se responde recorriendo el árbol: tiempo y distancia restantes, y la geometría
+    sólo cuando el nodo de calle del conductor (o el árbol) cambió. El árbol se vuelve a pedir a la
+    caché en cada posición: si un incidente lo invalidó, se recalcula con los tiempos nuevos.
+    Un mensaje mal formado se responde con {"tipo": "error"} sin cerrar la sesión.
+    """
+    await ws.accept()
+    arbol = perfil = nodo_destino = None
+    ultimo_nodo = None
+    try:
+        while True:
+            try:
+                msg = json.loads(await ws.receive_text())
+            except ValueError:
+                await ws.send_json({"tipo": "error", "detalle": "Mensaje no es JSON"})
+                continue
+            if not isinstance(msg, dict):
+                await ws.send_json({"tipo": "error", "detalle": "Se espera un objeto JSON"})
+                continue
+            G = get_grafo(esperar=False)
+            if G is None:
+                await ws.send_json({"tipo": "error", "detalle": "Cargando grafo (Espere un momento)..."})
+                continue
+
+            if "destino" in msg:
+                destino = _coordenada(msg["destino"])
+                if destino is None:
+                    await ws.send_json({"tipo": "error", "detalle": "destino requiere lat y lon numéricos"})
+                    continue
+                try:
+                    hora = msg.get("hora_salida")
+                    nuevo_perfil = get_perfil(G, perfil_por_hora(hora)) if hora else None
+                except ValueError as e:
+                    await ws.send_json({"tipo": "error", "detalle": f"hora_salida inválida: {e}"})
+                    continue
+                perfil = nuevo_perfil
+                nodo_destino = int(nodo_cercano(G, destino[1], destino[0]))
+                if arbol is None or arbol.destino != nodo_destino or arbol.perfil != clave_perfil(perfil):
+                    # No bloquea el loop de eventos
+                    arbol = await run_in_threadpool(get_arbol, G, nodo_destino, perfil)
+                    ultimo_nodo = None
+                await ws.send_json({"tipo": "destino", "nodo": nodo_destino, "alcanzables": len(arbol.tiempo)})
+
+            if "lat" not in msg and "lon" not in msg: continue
+            posicion = _coordenada(msg)
+            if posicion is None:
+                await ws.send_json({"tipo": "error", "detalle": "Posición requiere lat y lon numéricos"})
+                continue
+            if nodo_destino is None:
+                await ws.send_json({"tipo": "error", "detalle": "Sin destino"})
+                continue
+
+            # Acierto de la LRU casi siempre; si el árbol fue invalidado (incidentes, también los de
+            # otro worker: se aplican antes de mirar), se recalcula
+            if not incidentes_al_dia(G): await run_in_threadpool(sincronizar_incidentes, G)
+            vigente = arbol_guardado(G, nodo_destino, perfil)
+            if vigente is None: vigente = await run_in_threadpool(get_arbol, G, nodo_destino, perfil)
+            if vigente is not arbol: arbol, ultimo_nodo = vigente, None
+
+            nodo = int(nodo_cercano(G, posicion[1], posicion[0]))
+            if nodo not in arbol:
+                await ws.send_json({"tipo": "posicion", "sin_camino": True})
+                continue
+            t_s = arbol.tiempo[nodo]
+            res = {
+                "tipo": "posicion", "nodo": nodo,
+                "tiempo_s": round(t_s, 1), "tiempo_min": round(t_s / 60),
+                "distancia_km": round(arbol.metros[nodo] / 1000, 2),
+            }
+            if nodo != ultimo_nodo:
+                res["coords"] = obtener_coords_suaves(G, arbol.camino(nodo), perfil)
+                ultimo_nodo = nodo
+            await ws.send_json(res)
+    except WebSocketDisconnect:
+        pass
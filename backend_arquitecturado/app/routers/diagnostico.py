@@ -0,0 +1,75 @@
+from fastapi import APIRouter, HTTPException
+from app.core.mapa import get_grafo
+from app.core import indice_espacial
+from app.core.memoria import tam_profundo, memoria_grafo, rss_proceso
+from app.services import busqueda_dirigida, tramos, arboles, isocronas, perfiles, teselas
+from app.services.tablas_zona import tablas_cargadas
+from app.routers import endpoints
+
+router = APIRouter()
+
+
+def _mb(b):
+    return round(b / 1e6, 2) if b is not None else None
+
+
+# =============================================================================
+# DIAGNÓSTICO: MEMORIA POR COMPONENTE
+# =============================================================================
+@router.get("/diagnostico/memoria")
+def diagnostico_memoria(muestra: int = 2000):
+    """
+    MB estimados por componente: grafo (nodos, adyacencia, aristas, geometría),
+    índices (rejilla, landmarks, perfiles de velocidad, coordenadas de A*) y cachés; más el RSS real del proceso.
+    Las tablas por zona están mapeadas desde disco (compartidas): van aparte y no suman al total.
+    """
+    G = get_grafo(esperar=False)
+    if G is None: raise HTTPException(503, "Cargando grafo (Espere un momento)...")
+
+    grafo = memoria_grafo(G, muestra=max(100, muestra))
+
+    indices = {}
+    if indice_espacial._INDICE_GLOBAL is not None and indice_espacial._INDICE_GLOBAL[0] is G:
+        indices["rejilla"] = tam_profundo(indice_espacial._INDICE_GLOBAL[1])
+    if busqueda_dirigida._LANDMARKS_GRAFO is G and busqueda_dirigida._LANDMARKS:
+        indices["landmarks"] = tam_profundo(busqueda_dirigida._LANDMARKS)
+    if perfiles._PERFILES_GRAFO is G and perfiles._PERFILES:
+        with perfiles._LOCK: copia = dict(perfiles._PERFILES)
+        indices["perfiles_velocidad"] = tam_profundo(copia)
+    if teselas._RED is not None and teselas._RED[0] is G:
+        indices["red_teselas"] = tam_profundo(teselas._RED[1])
+    if busqueda_dirigida._COORDS is not None and busqueda_dirigida._COORDS[0] is G:
+        indices["coords_a_estrella"] = tam_profundo(busqueda_dirigida._COORDS[1])
+
+    # Las cachés se copian bajo su candado (los handlers las cambian a la vez en el threadpool)
+    # y cada escenario se mide con el candado de su sesión
+    copias = {"tramos": tramos.copia_tramos(), "arboles_inversos": arboles.copia_arboles(),
+              "isocronas": isocronas.copia_alcances(), "teselas": teselas.copia_teselas()}
+    sesiones = endpoints.ESCENARIOS.locales_con_candado()
+    vistos = set()
+    tam_sesiones = 0
+    for candado, escenario in sesiones:
+        with candado: tam_sesiones += tam_profundo(escenario, vistos)
+    caches = {
+        "tramos": tam_profundo(copias["tramos"]),
+        "arboles_inversos": tam_profundo(copias["arboles_inversos"]),
+        "isocronas": tam_profundo(copias["isocronas"]),
+        "teselas": sum(len(t) for t in copias["teselas"]),
+        "sesiones": tam_sesiones,
+    }
+
+    total = sum(grafo.values()) + sum(indices.values()) + sum(caches.values())
+    proceso = rss_proceso()
+    return {
+        "grafo": {
+            "nodos": G.number_of_nodes(), "aristas": G.number_of_edges(),
+            "modo_ligero": G.graph.get("modo_ligero", False),
+            "mb": {k: _mb(v) for k, v in grafo.items()},
+        },
+        "indices_mb": {k: _mb(v) for k, v in indices.items()},
+        "caches_mb": {k: _mb(v) for k, v in caches.items()},
+        "mapeado_mb": {"tablas_zona": _mb(sum(t.nbytes for t in tablas_cargadas()))},
+        "conteos": {**{k: len(v) for k, v in copias.items()}, "sesiones": len(sesiones), "tablas_zona": len(tablas_cargadas())},
+        "total_estimado_mb": _mb(total),
+        "proceso_mb": {k: _mb(v) for k, v in proceso.items()},
+    }
@@ -2,90 +2,226 @@ from fastapi import APIRouter, HTTPException, Query
 from pydantic import BaseModel
 from typing import List, Dict, Any, Optional
 import random
+import hashlib
+from collections import OrderedDict
 import numpy as np
-import networkx as nx
-import osmnx as ox
 
 # --- IMPORTAMOS LA CONFIGURACIÓN ---
-from app.core.config import LAT_CENTRO, LON_CENTRO, COORDS_ZONAS, OFFSET_ALEATORIO
+from app.core.config import (LAT_CENTRO, LON_CENTRO, COORDS_ZONAS, PRESUPUESTO_RUTA_S, HISTORIAL_VERSIONES,
+                             MAX_MINUTOS_ISOCRONA, REINTENTOS_ESCENARIO, TIEMPO_SERVICIO_MIN)
 from app.core.mapa import get_grafo
-from app.services.logica_rutas import calcular_metricas, optimizar_indices
+from app.core.grabadora import grabar_accion
+from app.core.respuestas import RespuestaRapida
+from app.core.indice_espacial import nodo_cercano, nodos_cercanos
+from app.services.logica_rutas import calcular_metricas, optimizar_indices, costo_ruta
+from app.services.mejora_continua import programar_mejora, firma_ruta
+from app.services.ventanas import Restricciones, horario
+from app.services.matrices import (construir_matriz_tiempos, extender_matriz_tiempos, refinar_exactos,
+                                   filas_afectadas, recalcular_filas)
+from app.services.busqueda import medir_camino
+from app.services.busqueda_dirigida import camino_mas_corto
+from app.services.tramos import obtener_coords_suaves, coords_ruta
+from app.services.isocronas import isocronas
+from app.services.perfiles import get_perfil, perfil_por_hora
+from app.services.escenarios import crear_almacen, escenario_vacio, ConflictoEscenario
+from app.services.tablas_zona import caja_zona
+from app.services.incidentes import generacion_aplicada, cambios_desde
 
 router = APIRouter()
 
-# --- CACHE EN MEMORIA ---
-CACHE_SIMULACION = {
-    "puntos": [], "full_matrix_time": None, "nodos_totales": [],
-    "id_inicio": None, "id_fin": None     
-}
+# --- ESCENARIOS ---
+# Sesión por defecto (el navegador) + sesiones con nombre (?sesion=..., p. ej. repeticiones de carga).
+# En memoria del proceso, o en SQLite compartido por los workers si FLEET_ESCENARIOS está definido.
+ESCENARIOS = crear_almacen()
+
+
+def _al_dia_con_incidentes(G, cache):
+    """
+    La matriz del escenario se armó con los tiempos de la generación de incidentes cache["incidentes"].
+    Si desde entonces se creó o levantó alguno (en este u otro worker), marca las filas que podían pasar
+    por las aristas cambiadas y deja sin costo los planes que salen de ellas; se recalculan después.
+    """
+    gen, previa = generacion_aplicada(), cache.get("incidentes", 0)
+    cache["incidentes"] = gen
+    nodos = cache.get("nodos_totales") or []
+    if previa == gen or cache.get("full_matrix_time") is None: return
+    pares = cambios_desde(G, previa)
+    filas = set(range(len(nodos))) if pares is None else filas_afectadas(G, cache["full_matrix_time"], nodos, pares)
+    if not filas: return
+    cache.setdefault("filas_sucias", set()).update(filas)
+    for o in cache.get("ordenes", {}).values():
+        if any(i in filas for i in o["orden"][:-1]): o["costo"] = float('inf')
 
 COLORES_ZONAS = ["#00E5FF", "#E040FB", "#C6FF00", "#FF9100", "#FF4081", "#7C4DFF"]
 
+
+def _perfil_de(G, hora_salida):
+    """Perfil de velocidad para `hora_salida` (None sin hora); 422 si la hora no se entiende."""
+    if hora_salida is None: return None
+    try:
+        return get_perfil(G, perfil_por_hora(hora_salida))
+    except ValueError as e:
+        raise HTTPException(422, f"hora_salida inválida: {e}")
+
+
+def _ventana(desde, hasta):
+    """[desde, hasta] en minutos desde la salida (hasta=None: sólo "no antes de"); 422 si no tiene sentido."""
+    if desde is None and hasta is None: raise HTTPException(422, "fijar_ventana requiere ventana_desde y/o ventana_hasta")
+    desde = desde or 0
+    if desde < 0 or (hasta is not None and hasta < desde):
+        raise HTTPException(422, "La ventana debe cumplir 0 <= ventana_desde <= ventana_hasta")
+    return [desde, hasta]
+
+
+def _restricciones(pts, indices, inicio):
+    """Servicio y ventana (en s) de cada parada de la ruta; el arranque no tiene servicio ni ventana."""
+    servicio, ventanas = [], []
+    for g in indices:
+        v = pts[g].get("ventana_min") if g != inicio else None
+        servicio.append(0 if g == inicio else pts[g].get("servicio_min", TIEMPO_SERVICIO_MIN) * 60)
+        ventanas.append((v[0] * 60, None if v[1] is None else v[1] * 60) if v else None)
+    return Restricciones(servicio, ventanas)
+
 # =============================================================================
-# FUNCION AUXILIAR: TRAZADO SUAVE
+# FUNCION AUXILIAR: ORDEN DE UNA RUTA SOBRE LA MATRIZ DEL ESCENARIO
 # =============================================================================
-def obtener_coords_suaves(G, lista_nodos):
-    coords_suaves = []
-    if not lista_nodos: return coords_suaves
-    start_node = G.nodes[lista_nodos[0]]
-    coords_suaves.append([start_node['y'], start_node['x']])
-    for i in range(len(lista_nodos) - 1):
-        try:
-            edge_data = G.get_edge_data(lista_nodos[i], lista_nodos[i+1])[0]
-            if 'geometry' in edge_data:
-                for lon, lat in edge_data['geometry'].coords:
-                    coords_suaves.append([lat, lon])
-            else:
-                node_v = G.nodes[lista_nodos[i+1]]
-                coords_suaves.append([node_v['y'], node_v['x']])
-        except: pass
-    return coords_suaves
+def ordenar_ruta(cache, G, fmt, nt, indices, inicio, fin, clave=None, perfil=None, restricciones=None, sesion=None):
+    """
+    Optimiza sobre una vista de la matriz (sin copiar con np.ix_).
+    Arranca desde el orden guardado de la misma ruta (`clave`), gasta PRESUPUESTO_RUTA_S
+    y deja una mejora programada en segundo plano para el siguiente clic.
+    En modo aproximado refina con tiempos exactos los arcos elegidos y reoptimiza.
+    restricciones: servicio y ventanas de las paradas (ver _restricciones).
+    sesion: dueña del escenario; la mejora de fondo se guarda en ella a través de ESCENARIOS.
+    """
+    ordenes = cache.setdefault("ordenes", {})
+    previo = ordenes.get(clave, {}).get("orden") if clave else None
+    orden = optimizar_indices(indices, fmt.vista(indices), inicio, fin, asimetrico=True,
+                              presupuesto_s=PRESUPUESTO_RUTA_S, orden_previo=previo, restricciones=restricciones)
+    for _ in range(2):
+        if not refinar_exactos(G, fmt, nt, orden, perfil): break
+        orden = optimizar_indices(indices, fmt.vista(indices), inicio, fin, asimetrico=True, orden_previo=orden,
+                                  restricciones=restricciones)
+    if clave:
+        pos = {g: i for i, g in enumerate(indices)}
+        costo = costo_ruta([pos[g] for g in orden], fmt.vista(indices), restricciones)
+        ordenes[clave] = {"orden": orden, "costo": costo, "firma": firma_ruta(indices, inicio, fin, restricciones)}
+        programar_mejora(ESCENARIOS, sesion, clave, fmt, indices, inicio, fin, restricciones)
+    return orden
+
+
+def _metricas(G, fmt, nt, pts, indices, orden, restricciones, nombre, perfil):
+    """km / tiempo con el servicio de cada parada; con ventanas, además el retraso y quién llega tarde."""
+    km, t = calcular_metricas(orden, nt, G, nombre, perfil,
+                              [pts[g].get("servicio_min", TIEMPO_SERVICIO_MIN) for g in orden])
+    obj = {"km": km, "tiempo": t}
+    if restricciones.hay_ventanas:
+        pos = {g: i for i, g in enumerate(indices)}
+        h = horario([pos[g] for g in orden], fmt.vista(indices), restricciones)
+        obj["retraso_min"] = round(sum(x[2] for x in h) / 60, 1)
+        obj["paradas_tarde"] = [pts[g]["id"] for g, x in zip(orden, h) if x[2] > 0]
+    return obj
+
+# =============================================================================
+# FUNCION AUXILIAR: RESPUESTAS EN DELTA
+# =============================================================================
+def _huella(obj):
+    """Huella estable (entre procesos) de una parada o de una ruta sin geometría."""
+    return hashlib.md5(repr(obj).encode()).hexdigest()[:16]
+
+
+def _registrar_version(cache, huellas):
+    """
+    Guarda las huellas del plan y devuelve su número de versión.
+    Si nada cambió respecto a la última versión se reutiliza el mismo número.
+    """
+    historial = cache.setdefault("historial", OrderedDict())
+    v = cache.get("version", 0)
+    if historial and historial.get(v) == huellas: return v
+    v += 1
+    cache["version"] = v
+    historial[v] = huellas
+    while len(historial) > HISTORIAL_VERSIONES: historial.popitem(last=False)
+    return v
 
 # =============================================================================
 # NUEVO ENDPOINT: RUTA PUNTO A -> PUNTO B (Para Aproximación Real)
 # =============================================================================
 @router.get("/ruta-camino")
-def obtener_ruta_camino(lat_origen: float, lon_origen: float, lat_destino: float, lon_destino: float):
+def obtener_ruta_camino(lat_origen: float, lon_origen: float, lat_destino: float, lon_destino: float,
+                        hora_salida: str = None):
     """
     Calcula la ruta real calle por calle entre dos puntos GPS.
-    Usado para la fase de aproximación.
+    Usado para la fase de aproximación. hora_salida ("HH:MM") elige el perfil de velocidad.
     """
-    G = get_grafo()
+    G = get_grafo(esperar=False)
     if G is None: raise HTTPException(503, "Mapa no cargado")
+    perfil = _perfil_de(G, hora_salida)
     
     try:
         # 1. Encontrar los nodos de calle más cercanos al GPS y al Destino
-        nodo_a = ox.distance.nearest_nodes(G, lon_origen, lat_origen)
-        nodo_b = ox.distance.nearest_nodes(G, lon_destino, lat_destino)
+        nodo_a = nodo_cercano(G, lon_origen, lat_origen)
+        nodo_b = nodo_cercano(G, lon_destino, lat_destino)
         
-        # 2. Calcular la ruta más rápida (Dijkstra)
-        ruta_nodos = nx.shortest_path(G, nodo_a, nodo_b, weight='travel_time')
+        # 2. Calcular la ruta más rápida (A* bidireccional)
+        ruta_nodos = camino_mas_corto(G, nodo_a, nodo_b, perfil=perfil)
         
         # 3. Obtener la geometría (curvas de las calles)
-        coords = obtener_coords_suaves(G, ruta_nodos)
+        coords = obtener_coords_suaves(G, ruta_nodos, perfil)
         
         # 4. Calcular distancia y tiempo reales sumando las aristas
-        dist_m = 0
-        tiempo_s = 0
-        for i in range(len(ruta_nodos)-1):
-            u, v = ruta_nodos[i], ruta_nodos[i+1]
-            # Obtenemos datos de la calle (edge)
-            # edge_data puede tener multiples keys si hay varias vias, tomamos la 0
-            edges = G.get_edge_data(u, v)
-            data = edges[0] # Tomamos la primera conexión
-            
-            dist_m += data.get('length', 0)
-            tiempo_s += data.get('travel_time', 0)
+        # (entre calles paralelas, la misma que eligió la búsqueda)
+        dist_m, tiempo_s = medir_camino(G, ruta_nodos, perfil)
             
-        return {
+        return RespuestaRapida({
             "coords": coords,
             "distancia_km": round(dist_m / 1000, 2),
             "tiempo_min": round(tiempo_s / 60)
-        }
+        })
     except Exception as e:
         print(f"⚠️ Error calculando ruta aproximación: {e}")
         # Si falla (ej. no hay camino), devolvemos línea recta básica
-        return {"coords": [[lat_origen, lon_origen], [lat_destino, lon_destino]], "distancia_km": 0, "tiempo_min": 0}
+        return RespuestaRapida({"coords": [[lat_origen, lon_origen], [lat_destino, lon_destino]], "distancia_km": 0, "tiempo_min": 0})
+
+# =============================================================================
+# ISOCRONAS: ¿QUÉ SE ALCANZA EN N MINUTOS?
+# =============================================================================
+@router.get("/isocrona")
+def obtener_isocrona(lat: float, lon: float, minutos: str = "5,10,15", incluir_nodos: bool = False, sesion: str = None,
+                     hora_salida: str = None):
+    """
+    Una búsqueda acotada desde el punto (hasta el mayor de `minutos`) que sirve para todos los cortes.
+    Por corte: polígono (envolvente convexa) y número de nodos; además las paradas
+    pendientes de la simulación que quedan a tiro, con el primer corte que las alcanza.
+    """
+    G = get_grafo(esperar=False)
+    if G is None: raise HTTPException(503, "Cargando grafo (Espere un momento)...")
+    try:
+        cortes = sorted({float(m) for m in minutos.split(",") if m.strip()})
+    except ValueError:
+        raise HTTPException(422, "minutos debe ser una lista separada por comas, ej. 5,10,15")
+    if not cortes or cortes[0] <= 0 or cortes[-1] > MAX_MINUTOS_ISOCRONA:
+        raise HTTPException(422, f"Cada corte debe estar entre 0 y {MAX_MINUTOS_ISOCRONA} minutos")
+
+    perfil = _perfil_de(G, hora_salida)
+    origen = int(nodo_cercano(G, lon, lat))
+    dist, capas = isocronas(G, origen, [m * 60 for m in cortes], perfil)
+
+    paradas = []
+    cache = ESCENARIOS.leer(sesion)
+    nt = cache["nodos_totales"]
+    for p in cache["puntos"]:
+        if p["estado"] != "PENDIENTE" or p["idx"] >= len(nt): continue
+        t = dist.get(nt[p["idx"]])
+        if t is None: continue
+        corte = next(m for m in cortes if t <= m * 60)
+        paradas.append({"id": p["id"], "tiempo_min": round(t / 60, 1), "dentro_de": corte})
+    paradas.sort(key=lambda x: x["tiempo_min"])
+
+    for capa in capas:
+        capa["num_nodos"] = len(capa["nodos"])
+        if not incluir_nodos: del capa["nodos"]
+    return {"origen": origen, "isocronas": capas, "paradas_alcanzables": paradas}
 
 # =============================================================================
 # 1. ENDPOINT SIMULACIÓN
@@ -96,21 +232,74 @@ def simulacion_leaflet(
     accion_id: str = None, accion_tipo: str = None, valor_extra: int = None,
     lat_manual: float = None, lon_manual: float = None,
     zona_generacion: str = "neza", 
-    reset: bool = False
+    reset: bool = False, version_cliente: int = None,
+    semilla: int = None, sesion: str = None, hora_salida: str = None,
+    ventana_desde: float = None, ventana_hasta: float = None
 ):
-    global CACHE_SIMULACION
-    
+    """
+    version_cliente: última versión del plan que tiene el navegador. Si el servidor aún la
+    recuerda, sólo se envían las paradas y rutas que cambiaron (delta=True); si no, el plan completo.
+    semilla: hace reproducible generar_random (sin ella se sortea una y queda grabada).
+    sesion: estado independiente por nombre; sin ella se usa el caché del navegador.
+    hora_salida: "HH:MM" elige el perfil de velocidad (pico/valle/noche) y queda fijo en la sesión
+    hasta que se pida otro; al cambiar se recalcula la matriz con los tiempos del perfil nuevo.
+    Si otro worker guardó la misma sesión mientras tanto, la acción se repite sobre su estado (409 al agotarse).
+    fijar_servicio: valor_extra = minutos de servicio de la parada (si no, TIEMPO_SERVICIO_MIN).
+    fijar_ventana / quitar_ventana: ventana de entrega [ventana_desde, ventana_hasta] en minutos desde
+    la salida; llegar tarde se penaliza al ordenar y la ruta reporta retraso_min y paradas_tarde.
+    """
+    if accion_tipo == "generar_random" and semilla is None: semilla = random.randrange(2**31)
+    for intento in range(REINTENTOS_ESCENARIO):
+        try:
+            with ESCENARIOS.editar(sesion) as cache:
+                respuesta = _simular(cache, id_inicio, id_fin, accion_id, accion_tipo, valor_extra,
+                                     lat_manual, lon_manual, zona_generacion, reset, version_cliente, semilla, hora_salida,
+                                     ventana_desde, ventana_hasta, sesion)
+            break
+        except ConflictoEscenario:
+            print(f">>> 🔄 SESIÓN '{sesion}' GUARDADA POR OTRO WORKER: reintento {intento + 1}")
+    else:
+        raise HTTPException(409, "La sesión cambió en otro proceso varias veces seguidas; vuelve a intentarlo")
+
+    # Grabación (si FLEET_GRABACION está definido): con la semilla efectiva para repetir igual
+    if accion_tipo or reset:
+        grabar_accion("/simulacion-leaflet", sesion, {
+            "id_inicio": id_inicio, "id_fin": id_fin, "accion_id": accion_id, "accion_tipo": accion_tipo,
+            "valor_extra": valor_extra, "lat_manual": lat_manual, "lon_manual": lon_manual,
+            "zona_generacion": zona_generacion if accion_tipo == "generar_random" else None,
+            "reset": reset or None, "semilla": semilla if accion_tipo == "generar_random" else None,
+            "hora_salida": hora_salida, "ventana_desde": ventana_desde, "ventana_hasta": ventana_hasta,
+        })
+    return respuesta
+
+
+def _simular(cache, id_inicio, id_fin, accion_id, accion_tipo, valor_extra, lat_manual, lon_manual,
+             zona_generacion, reset, version_cliente, semilla, hora_salida, ventana_desde=None, ventana_hasta=None,
+             sesion=None):
+    """Aplica la acción sobre `cache` (el escenario ya cargado) y arma la respuesta."""
     if reset: 
-        CACHE_SIMULACION = {
-            "puntos": [], "full_matrix_time": None, "nodos_totales": [],
-            "id_inicio": None, "id_fin": None
-        }
+        cache.update(escenario_vacio(cache.get("version", 0)))
         print(">>> 🧹 CACHÉ REINICIADA")
 
-    G = get_grafo()
+    G = get_grafo(esperar=False)
     if G is None: raise HTTPException(503, "Cargando grafo (Espere un momento)...")
 
-    puntos_totales = CACHE_SIMULACION.get("puntos", [])
+    perfil = _perfil_de(G, hora_salida) if hora_salida is not None else get_perfil(G, cache.get("perfil"))
+    nombre_perfil = perfil.nombre if perfil is not None else None
+    if accion_tipo == "generar_random": cache["incidentes"] = generacion_aplicada()
+    else: _al_dia_con_incidentes(G, cache)
+    if nombre_perfil != cache.get("perfil"):
+        cache["perfil"] = nombre_perfil
+        if cache["nodos_totales"] and accion_tipo != "generar_random":
+            cache["full_matrix_time"] = construir_matriz_tiempos(G, list(cache["nodos_totales"]), perfil)
+            cache["ordenes"] = {}
+            cache["filas_sucias"] = set()
+    # Filas que algún incidente dejó viejas: se recalculan aquí, sólo ellas
+    if cache.get("filas_sucias") and accion_tipo != "generar_random":
+        filas, cache["filas_sucias"] = cache["filas_sucias"], set()
+        recalcular_filas(G, cache["full_matrix_time"], cache["nodos_totales"], filas, perfil)
+
+    puntos_totales = cache.get("puntos", [])
     
     if accion_tipo:
         
@@ -121,73 +310,58 @@ def simulacion_leaflet(
             clave_zona = zona_generacion.lower()
             if clave_zona not in COORDS_ZONAS: clave_zona = "neza"
             
-            centro = COORDS_ZONAS[clave_zona]
-            c_lat, c_lon = centro["lat"], centro["lon"]
-            
-            offset_local = 0.012 if clave_zona == "polanco" else OFFSET_ALEATORIO
-            mn_lat, mx_lat = c_lat - offset_local, c_lat + offset_local
-            mn_lon, mx_lon = c_lon - offset_local, c_lon + offset_local
+            # Misma caja que cubren las tablas precalculadas de la zona (services/tablas_zona.py)
+            mn_lat, mx_lat, mn_lon, mx_lon = caja_zona(clave_zona)
             
-            cantidad_puntos = random.randint(10, 40)
+            rnd = random.Random(semilla)
+            cantidad_puntos = rnd.randint(10, 40)
             
             lats_t, lons_t = [], []
             for _ in range(cantidad_puntos):
-                lats_t.append(random.uniform(mn_lat, mx_lat))
-                lons_t.append(random.uniform(mn_lon, mx_lon))
+                lats_t.append(rnd.uniform(mn_lat, mx_lat))
+                lons_t.append(rnd.uniform(mn_lon, mx_lon))
             
             try:
-                nodos_raw = ox.distance.nearest_nodes(G, lons_t, lats_t)
+                nodos_raw = nodos_cercanos(G, lons_t, lats_t)
                 nodos = [int(n) for n in nodos_raw]
                 
-                num = len(nodos); ft = np.zeros((num, num))
-                for i in range(num):
-                    for j in range(i+1, num):
-                        try:
-                            t = nx.shortest_path_length(G, nodos[i], nodos[j], weight='travel_time')
-                            ft[i][j]=t; ft[j][i]=t
-                        except: ft[i][j]=9e9; ft[j][i]=9e9
+                ft = construir_matriz_tiempos(G, nodos, perfil)
                 
                 puntos_totales = []
                 for i, nid in enumerate(nodos):
                     nd = G.nodes[nid]
-                    rol = "VIP" if random.random() < 0.20 else "NORMAL"
+                    rol = "VIP" if rnd.random() < 0.20 else "NORMAL"
                     puntos_totales.append({
                         "id": f"P-{i+1}", "lat": nd['y'], "lon": nd['x'], 
-                        "estado": "PENDIENTE", "idx": i, "rol_base": rol, "cluster_manual": None
+                        "estado": "PENDIENTE", "idx": i, "rol_base": rol, "cluster_manual": None,
+                        "servicio_min": TIEMPO_SERVICIO_MIN, "ventana_min": None
                     })
-                CACHE_SIMULACION.update({"puntos": puntos_totales, "full_matrix_time": ft, "nodos_totales": nodos})
+                cache.update({"puntos": puntos_totales, "full_matrix_time": ft, "nodos_totales": nodos, "ordenes": {}, "filas_sucias": set()})
                 if puntos_totales:
-                    CACHE_SIMULACION["id_inicio"] = puntos_totales[0]["id"]
-                    CACHE_SIMULACION["id_fin"] = puntos_totales[-1]["id"]
+                    cache["id_inicio"] = puntos_totales[0]["id"]
+                    cache["id_fin"] = puntos_totales[-1]["id"]
             except Exception as e: print(f"!!! ERROR: {e}")
 
         # --- CREAR MANUAL ---
         elif accion_tipo == "crear_manual" and lat_manual and lon_manual:
             try:
-                nuevo_nodo = int(ox.distance.nearest_nodes(G, lon_manual, lat_manual))
+                nuevo_nodo = int(nodo_cercano(G, lon_manual, lat_manual))
                 nd = G.nodes[nuevo_nodo]
-                if isinstance(CACHE_SIMULACION["nodos_totales"], np.ndarray):
-                    CACHE_SIMULACION["nodos_totales"] = CACHE_SIMULACION["nodos_totales"].tolist()
-                CACHE_SIMULACION["nodos_totales"].append(nuevo_nodo)
+                if isinstance(cache["nodos_totales"], np.ndarray):
+                    cache["nodos_totales"] = cache["nodos_totales"].tolist()
+                cache["nodos_totales"].append(nuevo_nodo)
                 
-                old_m = CACHE_SIMULACION["full_matrix_time"]
-                nodos = CACHE_SIMULACION["nodos_totales"]
+                old_m = cache["full_matrix_time"]
+                nodos = cache["nodos_totales"]
                 s = len(nodos)
-                new_m = np.zeros((s, s))
-                if old_m is not None: new_m[:s-1, :s-1] = old_m
-                target = nuevo_nodo
-                for i in range(s-1):
-                    try:
-                        d = nx.shortest_path_length(G, nodos[i], target, weight='travel_time')
-                        new_m[i][s-1] = d; new_m[s-1][i] = d
-                    except: new_m[i][s-1]=9e9; new_m[s-1][i]=9e9
-                CACHE_SIMULACION["full_matrix_time"] = new_m
+                cache["full_matrix_time"] = extender_matriz_tiempos(G, old_m, nodos, perfil)
                 puntos_totales.append({
                     "id": f"P-{len(puntos_totales)+1}", 
                     "lat": lat_manual, "lon": lon_manual, "lat_nodo": nd['y'], "lon_nodo": nd['x'],
-                    "estado": "PENDIENTE", "idx": s-1, "rol_base": "NORMAL", "cluster_manual": None
+                    "estado": "PENDIENTE", "idx": s-1, "rol_base": "NORMAL", "cluster_manual": None,
+                    "servicio_min": TIEMPO_SERVICIO_MIN, "ventana_min": None
                 })
-                CACHE_SIMULACION["puntos"] = puntos_totales
+                cache["puntos"] = puntos_totales
             except: pass
 
         # --- ACCIONES SOBRE PUNTOS ---
@@ -196,34 +370,39 @@ def simulacion_leaflet(
                 if p["id"] == accion_id:
                     if accion_tipo == "visitar": 
                         p["estado"] = "VISITADO"
-                        CACHE_SIMULACION["id_inicio"] = accion_id 
+                        cache["id_inicio"] = accion_id 
 
                     elif accion_tipo == "omitir": p["estado"] = "OMITIDO"
                     elif accion_tipo == "restaurar": p["estado"] = "PENDIENTE"
                     elif accion_tipo == "asignar_zona": p["cluster_manual"] = None if valor_extra == -1 else valor_extra
-                    elif accion_tipo == "fijar_inicio": CACHE_SIMULACION["id_inicio"] = accion_id
-                    elif accion_tipo == "fijar_fin": CACHE_SIMULACION["id_fin"] = accion_id
+                    elif accion_tipo == "fijar_inicio": cache["id_inicio"] = accion_id
+                    elif accion_tipo == "fijar_fin": cache["id_fin"] = accion_id
                     elif accion_tipo == "desfijar_inicio": 
-                        if CACHE_SIMULACION["id_inicio"] == accion_id: CACHE_SIMULACION["id_inicio"] = None
+                        if cache["id_inicio"] == accion_id: cache["id_inicio"] = None
                     elif accion_tipo == "desfijar_fin": 
-                        if CACHE_SIMULACION["id_fin"] == accion_id: CACHE_SIMULACION["id_fin"] = None
+                        if cache["id_fin"] == accion_id: cache["id_fin"] = None
                     elif accion_tipo == "eliminar_punto":
-                        if CACHE_SIMULACION["id_inicio"] == accion_id: CACHE_SIMULACION["id_inicio"] = None
-                        if CACHE_SIMULACION["id_fin"] == accion_id: CACHE_SIMULACION["id_fin"] = None
+                        if cache["id_inicio"] == accion_id: cache["id_inicio"] = None
+                        if cache["id_fin"] == accion_id: cache["id_fin"] = None
                         p["estado"] = "ELIMINADO"
                     elif accion_tipo == "toggle_vip":
                         p["rol_base"] = "NORMAL" if p.get("rol_base") == "VIP" else "VIP"
                     elif accion_tipo == "avanzar_inicio":
                         p["estado"] = "VISITADO"
+                    elif accion_tipo == "fijar_servicio": p["servicio_min"] = max(0, valor_extra or 0)
+                    elif accion_tipo == "fijar_ventana": p["ventana_min"] = _ventana(ventana_desde, ventana_hasta)
+                    elif accion_tipo == "quitar_ventana": p["ventana_min"] = None
                     break
 
     # --- RESPUESTA ---
-    pts = CACHE_SIMULACION["puntos"]
-    if not pts: return {"paradas": [], "rutas_clusters": [], "ruta_global": None, "ruta_vip": None}
+    pts = cache["puntos"]
+    if not pts:
+        v = _registrar_version(cache, {"paradas": {}, "rutas": {}})
+        return RespuestaRapida({"version": v, "delta": False, "perfil": nombre_perfil, "paradas": [], "rutas_clusters": [], "ruta_global": None, "ruta_vip": None})
 
-    nt = CACHE_SIMULACION["nodos_totales"]
-    fmt = CACHE_SIMULACION["full_matrix_time"]
-    id_ini, id_fin = CACHE_SIMULACION["id_inicio"], CACHE_SIMULACION["id_fin"]
+    nt = cache["nodos_totales"]
+    fmt = cache["full_matrix_time"]
+    id_ini, id_fin = cache["id_inicio"], cache["id_fin"]
     
     res_paradas = []
     puntos_activos = [p for p in pts if p["estado"] != "ELIMINADO"]
@@ -239,45 +418,30 @@ def simulacion_leaflet(
     idx_ini_n = next((i for i, p in enumerate(pts) if p["id"] == id_ini), None)
     idx_fin_n = next((i for i, p in enumerate(pts) if p["id"] == id_fin), None)
 
+    # Las rutas se arman sin geometría: las coords sólo se generan para las que se envían
+    rutas = {}  # clave -> (objeto sin coords, nodos de parada en orden)
+
     # RUTA GLOBAL
-    ruta_global_obj = None
     indices = [i for i, p in enumerate(pts) if (p["estado"] == "PENDIENTE" or i == idx_ini_n or i == idx_fin_n) and p["estado"] != "ELIMINADO"]
     if idx_ini_n is not None and len(indices) > 1:
         try:
-            sub = fmt[np.ix_(indices, indices)]
-            orden = optimizar_indices(indices, sub, idx_ini_n, idx_fin_n if idx_fin_n in indices else None)
-            km, t = calcular_metricas(orden, nt, G, "Global")
-            coords = []
-            ruta_n = [nt[i] for i in orden]
-            for i in range(len(ruta_n)-1):
-                try:
-                    path = nx.shortest_path(G, ruta_n[i], ruta_n[i+1], weight='travel_time')
-                    coords.extend(obtener_coords_suaves(G, path))
-                except: pass
-            ruta_global_obj = {"coords": coords, "km": km, "tiempo": t}
+            r = _restricciones(pts, indices, idx_ini_n)
+            orden = ordenar_ruta(cache, G, fmt, nt, indices, idx_ini_n, idx_fin_n if idx_fin_n in indices else None, "global", perfil, r, sesion)
+            rutas["global"] = (_metricas(G, fmt, nt, pts, indices, orden, r, "Global", perfil), [nt[i] for i in orden])
         except: pass
 
     # RUTA VIP
-    ruta_vip_obj = None
     idx_vip = [i for i, p in enumerate(pts) if p.get("rol_base")=="VIP" and p["estado"]=="PENDIENTE" and p["estado"] != "ELIMINADO"]
     if idx_ini_n is not None and idx_ini_n not in idx_vip: idx_vip.insert(0, idx_ini_n)
     if len(idx_vip) > 1:
         try:
-            sub = fmt[np.ix_(idx_vip, idx_vip)]
-            orden = optimizar_indices(idx_vip, sub, idx_ini_n if idx_ini_n in idx_vip else None, None)
-            km, t = calcular_metricas(orden, nt, G, "VIP")
-            coords = []
-            ruta_n = [nt[i] for i in orden]
-            for i in range(len(ruta_n)-1):
-                try:
-                    path = nx.shortest_path(G, ruta_n[i], ruta_n[i+1], weight='travel_time')
-                    coords.extend(obtener_coords_suaves(G, path))
-                except: pass
-            ruta_vip_obj = {"coords": coords, "km": km, "tiempo": t}
+            start = idx_ini_n if idx_ini_n in idx_vip else None
+            r = _restricciones(pts, idx_vip, start)
+            orden = ordenar_ruta(cache, G, fmt, nt, idx_vip, start, None, "vip", perfil, r, sesion)
+            rutas["vip"] = (_metricas(G, fmt, nt, pts, idx_vip, orden, r, "VIP", perfil), [nt[i] for i in orden])
         except: pass
 
     # ZONAS
-    rutas_clusters = []
     clusters = {}
     for i, p in enumerate(pts):
         if p["estado"] != "ELIMINADO" and p.get("cluster_manual") is not None:
@@ -289,39 +453,62 @@ def simulacion_leaflet(
             if idx_ini_n not in grupo: grupo.insert(0, idx_ini_n)
         if len(grupo) > 1:
             try:
-                sub = fmt[np.ix_(grupo, grupo)]
                 start = idx_ini_n if idx_ini_n in grupo else None
-                orden = optimizar_indices(grupo, sub, start, None)
-                km, t = calcular_metricas(orden, nt, G, f"Cluster {cid}")
-                coords = []
-                ruta_n = [nt[i] for i in orden]
-                for i in range(len(ruta_n)-1):
-                    try:
-                        path = nx.shortest_path(G, ruta_n[i], ruta_n[i+1], weight='travel_time')
-                        coords.extend(obtener_coords_suaves(G, path))
-                    except: pass
-                rutas_clusters.append({"cluster_id": cid, "coords": coords, "color": COLORES_ZONAS[cid%len(COLORES_ZONAS)], "km": km, "tiempo": t})
+                r = _restricciones(pts, grupo, start)
+                orden = ordenar_ruta(cache, G, fmt, nt, grupo, start, None, f"cluster_{cid}", perfil, r, sesion)
+                obj = {"cluster_id": cid, "color": COLORES_ZONAS[cid%len(COLORES_ZONAS)],
+                       **_metricas(G, fmt, nt, pts, grupo, orden, r, f"Cluster {cid}", perfil)}
+                rutas[f"cluster_{cid}"] = (obj, [nt[i] for i in orden])
             except: pass
 
-    return {"paradas": res_paradas, "rutas_clusters": rutas_clusters, "ruta_global": ruta_global_obj, "ruta_vip": ruta_vip_obj}
+    # --- VERSIONADO / DELTA ---
+    huellas = {
+        "paradas": {p["id"]: _huella(p) for p in res_paradas},
+        "rutas": {clave: _huella((obj, ruta_n)) for clave, (obj, ruta_n) in rutas.items()},
+    }
+    base = cache["historial"].get(version_cliente) if version_cliente is not None else None
+    v = _registrar_version(cache, huellas)
+
+    def con_coords(clave):
+        obj, ruta_n = rutas[clave]
+        return {**obj, "coords": coords_ruta(G, ruta_n, perfil)}
+
+    if base is None:
+        return RespuestaRapida({
+            "version": v, "delta": False, "perfil": nombre_perfil, "paradas": res_paradas,
+            "rutas_clusters": [con_coords(c) for c in rutas if c.startswith("cluster_")],
+            "ruta_global": con_coords("global") if "global" in rutas else None,
+            "ruta_vip": con_coords("vip") if "vip" in rutas else None,
+        })
+
+    cambio = {c for c, h in huellas["rutas"].items() if base["rutas"].get(c) != h}
+    res = {
+        "version": v, "delta": True, "base": version_cliente, "perfil": nombre_perfil,
+        "paradas": [p for p in res_paradas if base["paradas"].get(p["id"]) != huellas["paradas"][p["id"]]],
+        "paradas_eliminadas": [pid for pid in base["paradas"] if pid not in huellas["paradas"]],
+        "rutas_clusters": [con_coords(c) for c in rutas if c.startswith("cluster_") and c in cambio],
+        "clusters_eliminados": [int(c[len("cluster_"):]) for c in base["rutas"] if c.startswith("cluster_") and c not in rutas],
+    }
+    # ruta_global / ruta_vip sólo viajan si cambiaron (None = la ruta desapareció)
+    for clave in ("global", "vip"):
+        if clave in cambio: res[f"ruta_{clave}"] = con_coords(clave)
+        elif clave in base["rutas"] and clave not in rutas: res[f"ruta_{clave}"] = None
+    return RespuestaRapida(res)
 
 # CLUSTER MANUAL
 class ClusterManualRequest(BaseModel):
-    nombre: str; nodos_ids: List[int]
+    nombre: str; nodos_ids: List[int]; hora_salida: Optional[str] = None
 class ClusterResponse(BaseModel):
     nombre: str; distancia_km: float; tiempo_min: str; path_coords: List[List[float]]; nodos_secuencia: List[int]
+# response_model queda para la documentación; RespuestaRapida se salta la validación campo por campo
 @router.post("/cluster-manual", response_model=ClusterResponse)
 def crear_cluster_manual(datos: ClusterManualRequest):
-    G = get_grafo()
+    G = get_grafo(esperar=False)
     if G is None: raise HTTPException(503, "Grafo no cargado")
+    perfil = _perfil_de(G, datos.hora_salida)
     nodos = datos.nodos_ids
-    if len(nodos) < 2: return {"nombre": datos.nombre, "distancia_km": 0, "tiempo_min": "0m", "path_coords": [], "nodos_secuencia": nodos}
+    if len(nodos) < 2: return RespuestaRapida({"nombre": datos.nombre, "distancia_km": 0, "tiempo_min": "0m", "path_coords": [], "nodos_secuencia": nodos})
     indices = list(range(len(nodos)))
-    km, tiempo_str = calcular_metricas(indices, nodos, G, f"Manual {datos.nombre}")
-    path_coords = []
-    for i in range(len(nodos)-1):
-        try:
-            path = nx.shortest_path(G, nodos[i], nodos[i+1], weight='travel_time')
-            path_coords.extend(obtener_coords_suaves(G, path))
-        except: pass
-    return {"nombre": datos.nombre, "distancia_km": km, "tiempo_min": tiempo_str, "path_coords": path_coords, "nodos_secuencia": nodos}
\ No newline at end of file
+    km, tiempo_str = calcular_metricas(indices, nodos, G, f"Manual {datos.nombre}", perfil)
+    path_coords = coords_ruta(G, nodos, perfil)
+    return RespuestaRapida({"nombre": datos.nombre, "distancia_km": km, "tiempo_min": tiempo_str, "path_coords": path_coords, "nodos_secuencia": nodos})
\ No newline at end of file
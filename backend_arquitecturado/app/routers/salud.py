@@ -0,0 +1,62 @@
+import os
+import time
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from app.core.mapa import ESTADO_CARGA
+from app.core.memoria import memoria_compartida, procesos_hijos
+
+router = APIRouter()
+
+
+def _estado():
+    inicio, fin = ESTADO_CARGA["inicio"], ESTADO_CARGA["fin"]
+    transcurrido = ((fin or time.time()) - inicio) if inicio else 0
+    return {
+        "fase": ESTADO_CARGA["fase"],
+        "progreso": round(ESTADO_CARGA["progreso"], 2),
+        "listo": ESTADO_CARGA["listo"],
+        "error": ESTADO_CARGA["error"],
+        "segundos": round(transcurrido, 1),
+    }
+
+
+# =============================================================================
+# LIVENESS: el proceso responde (aunque el mapa siga cargando)
+# =============================================================================
+@router.get("/salud/vivo")
+def vivo():
+    return {"vivo": True, **_estado()}
+
+
+# =============================================================================
+# READINESS: 503 hasta que el grafo y las cachés calientes estén listos
+# =============================================================================
+@router.get("/salud/listo")
+def listo():
+    estado = _estado()
+    return JSONResponse(estado, status_code=200 if estado["listo"] else 503)
+
+
+# =============================================================================
+# MEMORIA: COMPARTIDA (COPY-ON-WRITE) VS PRIVADA POR WORKER
+# =============================================================================
+def _mb(datos):
+    return {k: round(v / 1e6, 1) for k, v in datos.items()}
+
+
+@router.get("/salud/memoria")
+def memoria():
+    """
+    MB compartidos / privados / pss de cada worker (y del maestro) según smaps_rollup.
+    Con app.servidor los workers nacen de un maestro que ya cargó el grafo: lo que siga
+    "compartido" es el grafo sin copiar. total_pss_mb es lo que el conjunto ocupa de verdad.
+    Sin maestro (uvicorn normal) sólo se reporta este proceso.
+    """
+    maestro = ESTADO_CARGA.get("maestro")
+    pids = procesos_hijos(maestro) if maestro else [os.getpid()]
+    workers = [{"pid": pid, "este": pid == os.getpid(), **_mb(memoria_compartida(pid))} for pid in pids]
+    res = {"pid": os.getpid(), "maestro": maestro, "workers": workers}
+    if maestro: res["maestro_mb"] = _mb(memoria_compartida(maestro))
+    pss = [w.get("pss", 0) for w in workers] + [res.get("maestro_mb", {}).get("pss", 0)]
+    res["total_pss_mb"] = round(sum(pss), 1)
+    return res
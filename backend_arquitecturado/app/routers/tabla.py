@@ -0,0 +1,105 @@
+import json
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from typing import List, Optional
+from app.core.config import MAX_CELDAS_TABLA, UMBRAL_STREAM_TABLA
+from app.core.mapa import get_grafo
+from app.core.indice_espacial import nodos_cercanos
+from app.services.busqueda import dijkstra_acotado, metros_por_arbol
+from app.services.perfiles import get_perfil, perfil_por_hora
+from app.services.cache_tiempos import tiempos_desde, tiempos_hacia, guardar_tiempos
+from app.services.tablas_zona import tiempos_zona
+
+router = APIRouter()
+
+
+class TablaRequest(BaseModel):
+    origenes: List[List[float]]   # [[lat, lon], ...]
+    destinos: List[List[float]]
+    hora_salida: Optional[str] = None   # "HH:MM": perfil de velocidad (sin ella, travel_time)
+
+
+def _ajustar(G, puntos):
+    """Ajuste en lote (vectorizado sobre la rejilla del índice)."""
+    return nodos_cercanos(G, [p[1] for p in puntos], [p[0] for p in puntos])
+
+
+def _filas(G, desde, hacia, inverso, perfil=None):
+    """
+    Una búsqueda por nodo distinto de `desde` con parada temprana al asentar todos los `hacia`.
+    inverso=True busca sobre aristas invertidas (las filas quedan como columnas de la tabla).
+    Genera (duraciones, distancias) por cada elemento de `desde`; None = sin camino.
+    Lo que ya está en la tabla de la zona o en la caché en disco con metros no se busca;
+    lo calculado se guarda como exacto.
+    """
+    objetivos = set(hacia)
+    memo = {}
+    for fuente in desde:
+        if fuente not in memo:
+            otros = objetivos - {fuente}
+            conocidos = {n: tm for n, tm in tiempos_zona(G, perfil, fuente, otros, not inverso).items() if tm[1] is not None}
+            resto = otros - conocidos.keys()
+            if resto and inverso: conocidos.update(tiempos_hacia(G, perfil, fuente, resto, con_metros=True))
+            elif resto: conocidos.update(tiempos_desde(G, perfil, fuente, resto, con_metros=True))
+            dist = {fuente: 0.0, **{n: t for n, (t, _) in conocidos.items()}}
+            metros = {fuente: 0.0, **{n: m for n, (_, m) in conocidos.items()}}
+            faltan = objetivos - dist.keys()
+            if faltan:
+                padres = {}
+                nuevo = dijkstra_acotado(G, fuente, faltan, padres=padres, inverso=inverso, perfil=perfil)
+                nuevo_m = metros_por_arbol(G, nuevo, padres, fuente, inverso=inverso, perfil=perfil)
+                encontrados = [n for n in faltan if n in nuevo]
+                for n in encontrados: dist[n], metros[n] = nuevo[n], nuevo_m[n]
+                guardar_tiempos(G, perfil, [(n, fuente, dist[n], metros[n]) if inverso else (fuente, n, dist[n], metros[n])
+                                            for n in encontrados], exactos=True)
+            memo[fuente] = (
+                [round(dist[n], 1) if n in dist else None for n in hacia],
+                [round(metros[n], 1) if n in metros else None for n in hacia],
+            )
+        yield memo[fuente]
+
+
+# =============================================================================
+# TABLA MUCHOS A MUCHOS (DURACIÓN / DISTANCIA)
+# =============================================================================
+@router.post("/tabla")
+def tabla(datos: TablaRequest):
+    """
+    duraciones y distancias como arreglos planos por filas (n = origenes, m = destinos):
+    duraciones[i * m + j] son los segundos de origenes[i] a destinos[j] (null = sin camino).
+    Se busca desde el lado más chico: una búsqueda por origen o una inversa por destino.
+    Tablas grandes salen como NDJSON: una línea de encabezado y una por fila/columna.
+    """
+    G = get_grafo(esperar=False)
+    if G is None: raise HTTPException(503, "Cargando grafo (Espere un momento)...")
+    celdas = len(datos.origenes) * len(datos.destinos)
+    if celdas == 0: raise HTTPException(422, "Se necesita al menos un origen y un destino")
+    if celdas > MAX_CELDAS_TABLA:
+        raise HTTPException(413, f"Tabla de {celdas} celdas (máximo {MAX_CELDAS_TABLA})")
+    perfil = None
+    if datos.hora_salida is not None:
+        try: perfil = get_perfil(G, perfil_por_hora(datos.hora_salida))
+        except ValueError as e: raise HTTPException(422, f"hora_salida inválida: {e}")
+
+    nodos_o = _ajustar(G, datos.origenes)
+    nodos_d = _ajustar(G, datos.destinos)
+    por_destino = len(set(nodos_d)) < len(set(nodos_o))
+    if por_destino: filas = _filas(G, nodos_d, nodos_o, inverso=True, perfil=perfil)
+    else: filas = _filas(G, nodos_o, nodos_d, inverso=False, perfil=perfil)
+    encabezado = {"origenes_nodo": nodos_o, "destinos_nodo": nodos_d, "n": len(nodos_o), "m": len(nodos_d),
+                  "orientacion": "columnas" if por_destino else "filas", "perfil": perfil.nombre if perfil is not None else None}
+
+    if celdas > UMBRAL_STREAM_TABLA:
+        def generar():
+            yield json.dumps(encabezado) + "\n"
+            clave = "columna" if por_destino else "fila"
+            for k, (dur, dis) in enumerate(filas):
+                yield json.dumps({clave: k, "duraciones": dur, "distancias": dis}) + "\n"
+        return StreamingResponse(generar(), media_type="application/x-ndjson")
+
+    duraciones, distancias = map(list, zip(*filas))
+    if por_destino:  # trasponer: las búsquedas inversas dan columnas
+        duraciones, distancias = zip(*duraciones), zip(*distancias)
+    return {**encabezado, "orientacion": "filas",
+            "duraciones": [x for f in duraciones for x in f], "distancias": [x for f in distancias for x in f]}
@@ -0,0 +1,24 @@
+from fastapi import APIRouter, HTTPException, Header
+from fastapi.responses import Response
+from app.core.mapa import get_grafo
+from app.services.teselas import obtener_tesela, tesela_valida, version_teselas, TIPO_MVT
+
+router = APIRouter()
+
+
+# =============================================================================
+# TESELAS VECTORIALES DE LA RED (LA MISMA QUE VE EL RUTEO)
+# =============================================================================
+@router.get("/tiles/{z}/{x}/{y}")
+def tesela(z: int, x: int, y: int, if_none_match: str = Header(None)):
+    """
+    Mapbox Vector Tile con las capas "avenidas" y "calles" del grafo cargado.
+    La tesela sólo cambia con la versión del grafo: ETag + caché del navegador de un día.
+    """
+    if not tesela_valida(z, x, y): raise HTTPException(404, f"Tesela fuera de rango: {z}/{x}/{y}")
+    G = get_grafo(esperar=False)
+    if G is None: raise HTTPException(503, "Cargando grafo (Espere un momento)...")
+    etag = f'"{version_teselas(G)}-{z}-{x}-{y}"'
+    cabeceras = {"ETag": etag, "Cache-Control": "public, max-age=86400"}
+    if if_none_match == etag: return Response(status_code=304, headers=cabeceras)
+    return Response(obtener_tesela(G, z, x, y), media_type=TIPO_MVT, headers=cabeceras)
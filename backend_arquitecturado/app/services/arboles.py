@@ -0,0 +1,95 @@
+import threading
+from collections import OrderedDict
+from app.core.config import TAM_CACHE_ARBOLES
+from app.services.busqueda import dijkstra_acotado, metros_por_arbol
+from app.services.perfiles import clave_perfil
+
+_ARBOLES = OrderedDict()   # (perfil, destino) -> ArbolInverso
+_ARBOLES_GRAFO = None
+_LOCK = threading.Lock()
+_CONSTRUYENDO = {}         # (perfil, destino) -> Event (evita calcular el mismo árbol dos veces a la vez)
+
+
+# =============================================================================
+# ÁRBOL INVERSO DE CAMINOS MÁS CORTOS
+# =============================================================================
+class ArbolInverso:
+    """
+    Todos los caminos más rápidos HACIA `destino` (un Dijkstra sobre aristas invertidas).
+    siguiente[u] es el próximo nodo desde u; tiempo[u] y metros[u] lo que falta hasta el destino.
+    Responder una posición es O(1); la geometría es O(largo del camino).
+    """
+
+    def __init__(self, G, destino, perfil=None):
+        self.destino = destino
+        self.perfil = clave_perfil(perfil)
+        self.siguiente = {}
+        self.tiempo = dijkstra_acotado(G, destino, inverso=True, padres=self.siguiente, perfil=perfil)
+        self.metros = metros_por_arbol(G, self.tiempo, self.siguiente, destino, inverso=True, perfil=perfil)
+
+    def __contains__(self, nodo):
+        return nodo in self.tiempo
+
+    def camino(self, nodo):
+        """Nodos desde `nodo` hasta el destino siguiendo el árbol."""
+        camino = [nodo]
+        while nodo != self.destino:
+            nodo = self.siguiente[nodo]
+            camino.append(nodo)
+        return camino
+
+
+def invalidar_arboles(G, subidas, bajadas):
+    """
+    Descarta los árboles que cambian con los nuevos tiempos (se recalculan al pedirlos).
+    subidas: el árbol usa la arista a -> b (siguiente[a] == b).
+    bajadas: la arista podría acortar a `a` aunque costara 0 (tiempo[b] < tiempo[a]).
+    """
+    if _ARBOLES_GRAFO is not G: return 0
+    with _LOCK:
+        caen = [clave for clave, arbol in _ARBOLES.items()
+                if any(arbol.siguiente.get(a) == b for a, b in subidas)
+                or any(b in arbol.tiempo and arbol.tiempo[b] < arbol.tiempo.get(a, -1) for a, b in bajadas)]
+        for clave in caen: del _ARBOLES[clave]
+    return len(caen)
+
+
+def copia_arboles():
+    with _LOCK: return list(_ARBOLES.items())
+
+
+def arbol_guardado(G, destino, perfil=None):
+    """El árbol si ya está en la caché (sin calcular ni esperar); None si no, o si fue invalidado."""
+    with _LOCK:
+        if _ARBOLES_GRAFO is not G: return None
+        return _ARBOLES.get((clave_perfil(perfil), destino))
+
+
+def get_arbol(G, destino, perfil=None):
+    """Árbol inverso hacia `destino` con el perfil dado, recordado (LRU) y compartido entre sesiones."""
+    global _ARBOLES_GRAFO
+    clave = (clave_perfil(perfil), destino)
+    while True:
+        with _LOCK:
+            if _ARBOLES_GRAFO is not G:
+                _ARBOLES.clear(); _ARBOLES_GRAFO = G
+            arbol = _ARBOLES.get(clave)
+            if arbol is not None:
+                _ARBOLES.move_to_end(clave)
+                return arbol
+            evento = _CONSTRUYENDO.get(clave)
+            if evento is None:
+                evento = _CONSTRUYENDO[clave] = threading.Event()
+                break
+        evento.wait()  # otra sesión ya lo está calculando
+
+    try:
+        arbol = ArbolInverso(G, destino, perfil)
+        with _LOCK:
+            _ARBOLES[clave] = arbol
+            while len(_ARBOLES) > TAM_CACHE_ARBOLES: _ARBOLES.popitem(last=False)
+        print(f">>> 🌳 ÁRBOL INVERSO hacia {destino}: {len(arbol.tiempo)} nodos")
+        return arbol
+    finally:
+        with _LOCK: _CONSTRUYENDO.pop(clave, None)
+        evento.set()
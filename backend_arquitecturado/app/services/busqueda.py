@@ -0,0 +1,102 @@
+import heapq
+from itertools import count
+from app.core.config import MARGEN_CORREDOR_M
+from app.core.indice_espacial import get_indice, caja_con_margen
+
+
+def caja_corredor(G, nodos, margen_m=MARGEN_CORREDOR_M):
+    """(min_lat, max_lat, min_lon, max_lon) del corredor: la caja de las paradas + margen."""
+    return caja_con_margen([G.nodes[n]['y'] for n in nodos], [G.nodes[n]['x'] for n in nodos], margen_m)
+
+
+def corredor_para(G, nodos, margen_m=MARGEN_CORREDOR_M):
+    """
+    Conjunto de nodos del grafo dentro de la caja de las paradas + margen.
+    Usa el índice espacial, así que el costo depende del tamaño del barrio,
+    no del mapa completo.
+    """
+    if not nodos: return set()
+    caja = caja_corredor(G, nodos, margen_m)
+    corredor = set(int(n) for n in get_indice(G).nodos_en_caja(*caja))
+    corredor.update(nodos)
+    return corredor
+
+
+def arista_elegida(G, u, v, perfil=None):
+    """
+    Datos de la arista u -> v que recorren las búsquedas: entre aristas paralelas, la de menor
+    tiempo con el mismo perfil. Métricas y geometría de un camino deben salir de ésta, no de la clave 0.
+    """
+    aristas = G._succ[u][v]
+    if len(aristas) == 1: return next(iter(aristas.values()))
+    if perfil is None: return min(aristas.values(), key=lambda a: a.get('travel_time', 1))
+    pesos = perfil.tiempos
+    return min(aristas.values(), key=lambda a: pesos[a['eid']])
+
+
+def medir_camino(G, path, perfil=None):
+    """(metros, segundos) de un camino de nodos, arista por arista como lo eligió la búsqueda."""
+    d_m = t_s = 0
+    for u, v in zip(path[:-1], path[1:]):
+        a = arista_elegida(G, u, v, perfil)
+        d_m += a.get('length', 0)
+        t_s += a.get('travel_time', 0) if perfil is None else perfil.tiempos[a['eid']]
+    return d_m, t_s
+
+
+def dijkstra_acotado(G, fuente, objetivos=None, permitidos=None, corte=None, peso='travel_time', inverso=False,
+                     padres=None, perfil=None):
+    """
+    Dijkstra desde `fuente` que:
+      - sólo expande nodos en `permitidos` (si se da),
+      - se detiene al asentar todos los `objetivos` (si se dan),
+      - no pasa de `corte` segundos (si se da).
+    Con inverso=True recorre las aristas al revés (distancias HACIA la fuente).
+    Si se da el dict `padres`, se llena con el árbol de caminos: padres[v] = u.
+    Con `perfil` (services/perfiles.py) los tiempos salen de su arreglo por eid en lugar de `peso`.
+    Devuelve {nodo: distancia} de los nodos asentados (en orden de asentamiento).
+    """
+    adj = G._pred if inverso else G._succ
+    pesos = perfil.tiempos if perfil is not None else None
+    faltan = set(objetivos) if objetivos is not None else None
+    dist = {}
+    vistos = {fuente: 0}
+    c = count()
+    heap = [(0, next(c), fuente)]
+    while heap:
+        d, _, u = heapq.heappop(heap)
+        if u in dist: continue
+        dist[u] = d
+        if faltan is not None:
+            faltan.discard(u)
+            if not faltan: break
+        for v, aristas in adj[u].items():
+            if permitidos is not None and v not in permitidos: continue
+            if v in dist: continue
+            if pesos is None: w = min(a.get(peso, 1) for a in aristas.values())
+            else: w = min(pesos[a['eid']] for a in aristas.values())
+            nd = d + w
+            if corte is not None and nd > corte: continue
+            if v not in vistos or nd < vistos[v]:
+                vistos[v] = nd
+                if padres is not None: padres[v] = u
+                heapq.heappush(heap, (nd, next(c), v))
+    return dist
+
+
+def metros_por_arbol(G, dist, padres, fuente, inverso=False, perfil=None):
+    """
+    Distancia en metros de cada nodo asentado siguiendo el árbol `padres` de dijkstra_acotado
+    (la arista elegida es la de menor tiempo con el mismo perfil, igual que en la búsqueda).
+    `dist` viene en orden de asentamiento, así que el padre siempre se calcula antes.
+    """
+    metros = {fuente: 0.0}
+    if perfil is None: tiempo = lambda a: a.get('travel_time', 1)
+    else: tiempo = lambda a, pesos=perfil.tiempos: pesos[a['eid']]
+    for v in dist:
+        if v == fuente: continue
+        u = padres[v]
+        aristas = G._succ[v][u] if inverso else G._succ[u][v]
+        arista = min(aristas.values(), key=tiempo)
+        metros[v] = metros[u] + arista.get('length', 0)
+    return metros
@@ -0,0 +1,250 @@
+import hashlib
+import os
+import math
+import heapq
+from itertools import count
+import networkx as nx
+import numpy as np
+from app.core.config import VEL_AVENIDA_KMH, USAR_LANDMARKS_ALT, NUM_LANDMARKS
+from app.core.mapa import CACHE_DIR
+from app.services.busqueda import dijkstra_acotado
+from app.services.perfiles import clave_perfil, firma_perfil
+
+RADIO_TIERRA_M = 6371000.0
+
+_LANDMARKS = {}  # perfil (None = travel_time) -> Landmarks
+_LANDMARKS_GRAFO = None
+
+
+# =============================================================================
+# LANDMARKS (ALT)
+# =============================================================================
+class Landmarks:
+    """
+    Distancias desde/hacia unos pocos nodos "faro".
+    Por desigualdad triangular dan cotas inferiores del tiempo entre dos nodos.
+    """
+
+    def __init__(self, nodos, faros, desde, hacia):
+        self.nodos = nodos            # ids de nodo (orden de las columnas)
+        self.faros = faros            # ids de los landmarks
+        self.desde = desde            # (k, N): tiempo faro -> nodo
+        self.hacia = hacia            # (k, N): tiempo nodo -> faro
+        self.pos = {int(n): i for i, n in enumerate(nodos)}
+        # Filas firmadas: cota(v -> t) = max(firmas[:, t] - firmas[:, v]); inf -> NaN
+        firmas = np.vstack([desde, -hacia]).astype(np.float64)
+        firmas[~np.isfinite(firmas)] = np.nan
+        self.firmas = np.ascontiguousarray(firmas.T)  # (N, 2k): una fila por nodo
+
+    def columna(self, nodo):
+        i = self.pos.get(nodo)
+        return None if i is None else self.firmas[i]
+
+
+def _archivo_landmarks(G, perfil=None):
+    """
+    Un archivo por versión del grafo (topología + VEL_*) y firma del perfil: con otras velocidades
+    unas distancias viejas dejan de ser cota inferior y A* devolvería caminos que no son los más cortos.
+    """
+    version = G.graph.get('version_grafo')
+    if version is None:  # artefacto sin versión: huella de los tiempos base
+        firma = f"{G.number_of_nodes()}|{G.number_of_edges()}|{round(sum(t for _, _, t in G.edges(data='travel_time', default=0)), 1)}"
+        version = hashlib.sha1(firma.encode()).hexdigest()[:16]
+    return os.path.join(CACHE_DIR, f"landmarks_{version}_{firma_perfil(perfil)}.npz")
+
+
+def _calcular_landmarks(G, k, perfil=None):
+    nodos = np.array(list(G.nodes()), dtype=np.int64)
+    pos = {int(n): i for i, n in enumerate(nodos)}
+
+    def fila(fuente, inverso):
+        arr = np.full(len(nodos), np.inf, dtype=np.float32)
+        for n, d in dijkstra_acotado(G, fuente, inverso=inverso, perfil=perfil).items():
+            arr[pos[n]] = d
+        return arr
+
+    # Selección "el más lejano": cada faro nuevo maximiza la distancia a los ya elegidos
+    faros, desde, hacia = [], [], []
+    actual = int(nodos[0])
+    for _ in range(min(k, len(nodos))):
+        faros.append(actual)
+        desde.append(fila(actual, False))
+        hacia.append(fila(actual, True))
+        cercania = np.min(np.where(np.isfinite(desde), desde, -1), axis=0)
+        cercania[[pos[f] for f in faros]] = -1
+        actual = int(nodos[int(np.argmax(cercania))])
+    return Landmarks(nodos, np.array(faros, dtype=np.int64), np.vstack(desde), np.vstack(hacia))
+
+
+def preparar_landmarks(G, k=NUM_LANDMARKS, perfil=None):
+    """
+    Se llama al cargar el grafo: lee los landmarks de cache/ o los calcula y los guarda.
+    Son cotas de UN juego de tiempos: cada perfil de velocidad tiene los suyos.
+    """
+    global _LANDMARKS_GRAFO
+    if G is None or not USAR_LANDMARKS_ALT: return None
+    if _LANDMARKS_GRAFO is not G:
+        _LANDMARKS.clear(); _LANDMARKS_GRAFO = G
+    clave = clave_perfil(perfil)
+    if clave in _LANDMARKS: return _LANDMARKS[clave]
+
+    filepath = _archivo_landmarks(G, perfil)
+    lm = None
+    if os.path.exists(filepath):
+        datos = np.load(filepath)
+        lm = Landmarks(datos["nodos"], datos["faros"], datos["desde"], datos["hacia"])
+        if lm.desde.shape[0] != k or any(int(f) not in G for f in lm.faros):
+            lm = None
+        else:
+            print(f"✅ Landmarks ALT cargados desde: {os.path.basename(filepath)}")
+    if lm is None:
+        print(f"🗼 Calculando {k} landmarks ALT{f' [{clave}]' if clave else ''} (una sola vez)...")
+        lm = _calcular_landmarks(G, k, perfil)
+        np.savez(filepath, nodos=lm.nodos, faros=lm.faros, desde=lm.desde, hacia=lm.hacia)
+    _LANDMARKS[clave] = lm
+    return lm
+
+
+def get_landmarks(G, perfil=None):
+    if _LANDMARKS_GRAFO is G: return _LANDMARKS.get(clave_perfil(perfil))
+    return None
+
+
+# =============================================================================
+# HEURÍSTICA (gran círculo / velocidad máxima + ALT)
+# =============================================================================
+_COORDS = None  # (grafo, {nodo: (y_m, x_m)}) proyección equirectangular en metros
+
+
+def _coords_metricas(G):
+    """
+    Coordenadas planas (metros) de cada nodo, calculadas una vez por grafo.
+    Se escala por un factor < 1 para que la distancia plana nunca supere la de gran círculo.
+    """
+    global _COORDS
+    if _COORDS is None or _COORDS[0] is not G:
+        lats = [d['y'] for _, d in G.nodes(data=True)]
+        lat_min, lat_max = (min(lats), max(lats)) if lats else (0.0, 0.0)
+        # cos() de la latitud más alejada del ecuador: el eje x queda por debajo del real
+        k_lon = math.cos(math.radians(max(abs(lat_min), abs(lat_max))))
+        m = math.radians(1) * RADIO_TIERRA_M * 0.995
+        _COORDS = (G, {n: (d['y'] * m, d['x'] * m * k_lon) for n, d in G.nodes(data=True)})
+    return _COORDS[1]
+
+
+class _Potencial:
+    """
+    Potencial promedio p(v) = (h_destino(v) - h_origen(v)) / 2.
+    Con él ambos lados de la búsqueda ven los mismos costos reducidos.
+    """
+
+    def __init__(self, G, origen, destino, landmarks=None, vel_max=VEL_AVENIDA_KMH / 3.6):
+        self.xy = _coords_metricas(G)
+        self.vel = vel_max
+        self.o, self.d = self.xy[origen], self.xy[destino]
+        self.lm = None
+        if landmarks is not None:
+            col_o, col_d = landmarks.columna(origen), landmarks.columna(destino)
+            if col_o is not None and col_d is not None:
+                self.lm, self.col_o, self.col_d = landmarks, col_o, col_d
+        self.memo = {}
+
+    def __call__(self, v):
+        p = self.memo.get(v)
+        if p is not None: return p
+        y, x = self.xy[v]
+        h_d = math.hypot(y - self.d[0], x - self.d[1]) / self.vel
+        h_o = math.hypot(y - self.o[0], x - self.o[1]) / self.vel
+        if self.lm is not None:
+            col = self.lm.columna(v)
+            if col is not None:
+                h_d = max(h_d, _cota_alt(self.col_d - col))
+                h_o = max(h_o, _cota_alt(col - self.col_o))
+        p = (h_d - h_o) / 2.0
+        self.memo[v] = p
+        return p
+
+
+def _cota_alt(diferencias):
+    """Mayor cota ALT; los faros sin camino (NaN) se ignoran."""
+    v = np.fmax.reduce(diferencias)
+    return v if v > 0 else 0.0
+
+
+def _tiene_tiempos(G):
+    # Sin 'travel_time' la búsqueda cuenta saltos y la heurística en segundos no aplica
+    for _, _, d in G.edges(data=True):
+        return 'travel_time' in d
+    return False
+
+
+# =============================================================================
+# A* BIDIRECCIONAL
+# =============================================================================
+def ruta_mas_corta(G, origen, destino, peso='travel_time', perfil=None):
+    """
+    A* bidireccional con potencial promedio (heurística gran círculo + ALT).
+    Con `perfil` los tiempos salen de su arreglo por eid (heurística con su velocidad máxima
+    y sus propios landmarks, si ya están preparados).
+    Devuelve (lista_de_nodos, tiempo, nodos_explorados).
+    Lanza nx.NetworkXNoPath si no hay camino.
+    """
+    if origen not in G or destino not in G:
+        raise nx.NodeNotFound(f"Nodo {origen} o {destino} no está en el grafo")
+    if origen == destino: return [origen], 0.0, 0
+
+    pesos = perfil.tiempos if perfil is not None else None
+    if pesos is not None:
+        pot = _Potencial(G, origen, destino, get_landmarks(G, perfil), perfil.vel_max)
+    elif peso == 'travel_time' and _tiene_tiempos(G):
+        pot = _Potencial(G, origen, destino, get_landmarks(G))
+    else:
+        pot = lambda v: 0.0
+
+    adj = (G._succ, G._pred)
+    signo = (1, -1)  # adelante usa p(v), atrás usa -p(v)
+    g = ({origen: 0.0}, {destino: 0.0})
+    padre = ({origen: None}, {destino: None})
+    cerrados = (set(), set())
+    c = count()
+    heaps = ([(pot(origen), next(c), origen)], [(-pot(destino), next(c), destino)])
+    mu, encuentro = float('inf'), None
+
+    while heaps[0] and heaps[1]:
+        for h, cerr in zip(heaps, cerrados):
+            while h and h[0][2] in cerr: heapq.heappop(h)
+        if not heaps[0] or not heaps[1]: break
+        if heaps[0][0][0] + heaps[1][0][0] >= mu: break
+
+        lado = 0 if heaps[0][0][0] <= heaps[1][0][0] else 1
+        otro = 1 - lado
+        _, _, u = heapq.heappop(heaps[lado])
+        cerrados[lado].add(u)
+        gu = g[lado][u]
+        for v, aristas in adj[lado][u].items():
+            if v in cerrados[lado]: continue
+            if pesos is not None: nd = gu + min(pesos[a['eid']] for a in aristas.values())
+            else: nd = gu + (aristas[0].get(peso, 1) if len(aristas) == 1 and 0 in aristas else min(a.get(peso, 1) for a in aristas.values()))
+            if nd < g[lado].get(v, float('inf')):
+                g[lado][v] = nd
+                padre[lado][v] = u
+                heapq.heappush(heaps[lado], (nd + signo[lado] * pot(v), next(c), v))
+            if v in g[otro]:
+                total = g[lado][v] + g[otro][v]
+                if total < mu: mu, encuentro = total, v
+
+    if encuentro is None:
+        raise nx.NetworkXNoPath(f"No hay camino entre {origen} y {destino}")
+
+    camino = []
+    n = encuentro
+    while n is not None: camino.append(n); n = padre[0][n]
+    camino.reverse()
+    n = padre[1][encuentro]
+    while n is not None: camino.append(n); n = padre[1][n]
+    return camino, mu, len(cerrados[0]) + len(cerrados[1])
+
+
+def camino_mas_corto(G, origen, destino, peso='travel_time', perfil=None):
+    """Reemplazo directo de nx.shortest_path(G, u, v, weight=...)."""
+    return ruta_mas_corta(G, origen, destino, peso, perfil)[0]
@@ -0,0 +1,246 @@
+# backend_arquitecturado/app/services/cache_tiempos.py
+"""
+Caché en disco de tiempos entre nodos, direccionada por contenido:
+(versión del grafo, perfil, origen, destino) -> segundos, metros (si se conocen) y camino (opcional).
+
+Las mismas direcciones de clientes vuelven cada día: con la caché, armar la matriz de un plan
+repetido (o tras reset / reinicio) es casi sólo leer. SQLite en modo WAL (varios workers a la vez).
+
+- Cada par dice si es exacto (mapa completo: /tabla, tramos, refinado) o si salió del corredor de un
+  escenario (caja de las paradas + margen), que puede ser más largo que el camino real. Los del corredor
+  guardan su caja y sólo se leen desde un corredor igual o más chico: ahí valen lo mismo o menos que
+  buscar. Quien pide sin caja (refinado, /tabla) recibe sólo exactos.
+- La matriz (services/matrices.py) lee primero; sólo busca en el grafo los pares que faltan y los
+  agrega sin pisar un exacto (un par del corredor sólo se reemplaza por el de una caja que lo contenga).
+- /tabla y los tramos guardan tiempos exactos del mapa completo, con metros (y camino, los tramos).
+- Con incidentes activos los tiempos no son los del grafo: no se lee ni se escribe.
+- Tamaño acotado: al pasar de MAX_PARES_CACHE se borran primero otras versiones del grafo
+  y luego los pares usados hace más tiempo (el uso se marca por día).
+"""
+import os
+import sqlite3
+import threading
+import time
+import zlib
+import numpy as np
+from app.core.config import USAR_CACHE_TIEMPOS, ARCHIVO_CACHE_TIEMPOS, MAX_PARES_CACHE
+from app.core.mapa import CACHE_DIR
+from app.services.perfiles import firma_perfil, tiempos_alterados
+
+LOTE_SQL = 900           # parámetros por IN (...)
+REVISAR_CADA = 20000     # pares escritos entre revisiones del tamaño
+
+_ALMACEN = None
+_LOCK = threading.Lock()
+
+
+def _hoy():
+    return int(time.time() // 86400)
+
+
+def _empacar_camino(path):
+    return zlib.compress(np.diff(np.asarray(path, dtype=np.int64), prepend=0).tobytes())
+
+
+def _desempacar_camino(datos):
+    return np.cumsum(np.frombuffer(zlib.decompress(datos), dtype=np.int64)).tolist()
+
+
+class _Almacen:
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self._local = threading.local()
+        self._escritos = 0
+        # Tras un fork (app.servidor) las conexiones del padre no se pueden usar: cada hijo abre las suyas
+        if hasattr(os, "register_at_fork"): os.register_at_fork(after_in_child=self._olvidar_conexiones)
+        os.makedirs(os.path.dirname(os.path.abspath(ruta)), exist_ok=True)
+        con = self._con()
+        con.execute("""CREATE TABLE IF NOT EXISTS pares (
+            version TEXT NOT NULL, perfil TEXT NOT NULL, u INTEGER NOT NULL, v INTEGER NOT NULL,
+            tiempo REAL NOT NULL, metros REAL, camino BLOB, usado INTEGER NOT NULL,
+            exacto INTEGER NOT NULL DEFAULT 0, lat_min REAL, lat_max REAL, lon_min REAL, lon_max REAL,
+            PRIMARY KEY (version, perfil, u, v)) WITHOUT ROWID""")
+        self._migrar(con)
+
+    def _con(self):
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = self._local.con = sqlite3.connect(self.ruta, timeout=30, isolation_level=None,
+                                                    check_same_thread=False)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+        return con
+
+    def _olvidar_conexiones(self):
+        self._local = threading.local()
+
+    def _migrar(self, con):
+        """Tablas anteriores a la columna `exacto`: sólo los pares con metros (/tabla, tramos) se sabe que lo son."""
+        if "exacto" in {f[1] for f in con.execute("PRAGMA table_info(pares)")}: return
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            if "exacto" not in {f[1] for f in con.execute("PRAGMA table_info(pares)")}:  # otro worker pudo ganar
+                con.execute("ALTER TABLE pares ADD COLUMN exacto INTEGER NOT NULL DEFAULT 0")
+                for col in ("lat_min", "lat_max", "lon_min", "lon_max"): con.execute(f"ALTER TABLE pares ADD COLUMN {col} REAL")
+                n = con.execute("UPDATE pares SET exacto = 1 WHERE metros IS NOT NULL").rowcount
+                print(f">>> 🗄️ CACHÉ DE TIEMPOS MIGRADA: {n} pares exactos; los del corredor sin caja ya no se leen")
+            con.execute("COMMIT")
+        except BaseException:
+            con.execute("ROLLBACK")
+            raise
+
+    def consultar(self, version, perfil, fijo, otros, por_origen, con_metros, caja=None):
+        """
+        {otro: (tiempo, metros)} de fijo -> otros (por_origen) u otros -> fijo; marca el uso del día.
+        Sin `caja` sólo pares exactos; con la caja del corredor que pregunta, también los de corredores que la contienen.
+        """
+        con = self._con()
+        hoy = _hoy()
+        res, viejos = {}, []
+        extra = " AND metros IS NOT NULL" if con_metros else ""
+        if caja is None:
+            extra, params = extra + " AND exacto = 1", ()
+        else:
+            extra += " AND (exacto = 1 OR (lat_min <= ? AND lat_max >= ? AND lon_min <= ? AND lon_max >= ?))"
+            params = tuple(float(c) for c in caja)
+        if por_origen:
+            # Todo lo guardado desde u sale de un solo rango de la llave primaria; se filtra aquí
+            buscados = set(otros)
+            filas = con.execute(f"SELECT v, tiempo, metros, usado FROM pares WHERE version = ? AND perfil = ? "
+                                f"AND u = ?{extra}", (version, perfil, fijo, *params)).fetchall()
+            filas = [f for f in filas if f[0] in buscados]
+        else:
+            otros, filas = list(otros), []
+            for k in range(0, len(otros), LOTE_SQL):
+                lote = otros[k:k + LOTE_SQL]
+                filas += con.execute(f"SELECT u, tiempo, metros, usado FROM pares WHERE version = ? AND perfil = ? "
+                                     f"AND v = ? AND u IN ({','.join('?' * len(lote))}){extra}",
+                                     (version, perfil, fijo, *lote, *params)).fetchall()
+        for otro, t, m, usado in filas:
+            res[otro] = (t, m)
+            if usado < hoy: viejos.append((fijo, otro) if por_origen else (otro, fijo))
+        if viejos:
+            self._transaccion("UPDATE pares SET usado = ? WHERE version = ? AND perfil = ? AND u = ? AND v = ?",
+                              [(hoy, version, perfil, u, v) for u, v in viejos])
+        return res
+
+    def _transaccion(self, sql, filas):
+        con = self._con()
+        con.execute("BEGIN")
+        try:
+            con.executemany(sql, filas)
+            con.execute("COMMIT")
+        except BaseException:
+            con.execute("ROLLBACK")
+            raise
+
+    def escribir(self, version, perfil, filas, exactos, caja=None):
+        """
+        filas: [(u, v, tiempo, metros, camino)]. exactos=True reemplaza (y deja el par como exacto);
+        exactos=False son tiempos del corredor `caja`: nunca pisan un exacto ni un corredor que no contengan.
+        """
+        if not filas: return
+        hoy = _hoy()
+        if exactos:
+            sql = ("INSERT INTO pares (version, perfil, u, v, tiempo, metros, camino, usado, exacto) "
+                   "VALUES (?, ?, ?, ?, ?, ?, ?, ?, 1) ON CONFLICT (version, perfil, u, v) DO UPDATE SET "
+                   "tiempo = excluded.tiempo, metros = COALESCE(excluded.metros, pares.metros), "
+                   "camino = COALESCE(excluded.camino, pares.camino), usado = excluded.usado, exacto = 1, "
+                   "lat_min = NULL, lat_max = NULL, lon_min = NULL, lon_max = NULL")
+            valores = [(version, perfil, int(u), int(v), float(t), m, c, hoy) for u, v, t, m, c in filas]
+        else:
+            sql = ("INSERT INTO pares (version, perfil, u, v, tiempo, usado, exacto, lat_min, lat_max, lon_min, lon_max) "
+                   "VALUES (?, ?, ?, ?, ?, ?, 0, ?, ?, ?, ?) ON CONFLICT (version, perfil, u, v) DO UPDATE SET "
+                   "tiempo = excluded.tiempo, usado = excluded.usado, lat_min = excluded.lat_min, "
+                   "lat_max = excluded.lat_max, lon_min = excluded.lon_min, lon_max = excluded.lon_max "
+                   "WHERE pares.exacto = 0 AND (pares.lat_min IS NULL OR (excluded.lat_min <= pares.lat_min AND "
+                   "excluded.lat_max >= pares.lat_max AND excluded.lon_min <= pares.lon_min AND "
+                   "excluded.lon_max >= pares.lon_max))")
+            caja = tuple(float(c) for c in caja)
+            valores = [(version, perfil, int(u), int(v), float(t), hoy, *caja) for u, v, t, _, _ in filas]
+        self._transaccion(sql, valores)
+        self._escritos += len(filas)
+        if self._escritos >= REVISAR_CADA:
+            self._escritos = 0
+            self.podar(version)
+
+    def camino(self, version, perfil, u, v):
+        fila = self._con().execute(
+            "SELECT tiempo, metros, camino FROM pares WHERE version = ? AND perfil = ? AND u = ? AND v = ? "
+            "AND camino IS NOT NULL", (version, perfil, u, v)).fetchone()
+        if fila is None: return None
+        return _desempacar_camino(fila[2]), fila[0], fila[1]
+
+    def podar(self, version_actual, maximo=MAX_PARES_CACHE):
+        """Deja la tabla en `maximo` pares: primero se van otras versiones del grafo, luego los menos usados."""
+        con = self._con()
+        total = con.execute("SELECT COUNT(*) FROM pares").fetchone()[0]
+        if total <= maximo: return 0
+        borrados = con.execute("DELETE FROM pares WHERE version != ?", (version_actual,)).rowcount
+        sobran = total - borrados - int(maximo * 0.9)  # margen: no podar en cada escritura
+        if sobran > 0:
+            borrados += con.execute("DELETE FROM pares WHERE (version, perfil, u, v) IN "
+                                    "(SELECT version, perfil, u, v FROM pares ORDER BY usado LIMIT ?)", (sobran,)).rowcount
+        print(f">>> 🗄️ CACHÉ DE TIEMPOS PODADA: {borrados} pares fuera ({total - borrados} quedan)")
+        return borrados
+
+
+def _almacen():
+    global _ALMACEN
+    if _ALMACEN is None:
+        with _LOCK:
+            if _ALMACEN is None:
+                _ALMACEN = _Almacen(ARCHIVO_CACHE_TIEMPOS or os.path.join(CACHE_DIR, "tiempos.sqlite"))
+    return _ALMACEN
+
+
+def _clave(G, perfil):
+    """(versión, perfil) para leer/escribir, o None si la caché no aplica ahora."""
+    if not USAR_CACHE_TIEMPOS or tiempos_alterados(G): return None
+    version = G.graph.get('version_grafo')
+    if version is None: return None  # artefacto sin versión: no hay forma de saber si sigue valiendo
+    return version, firma_perfil(perfil)
+
+
+# =============================================================================
+# API
+# =============================================================================
+def tiempos_desde(G, perfil, u, destinos, con_metros=False, caja=None):
+    """
+    {v: (tiempo, metros)} conocidos de u hacia `destinos` (metros puede ser None si no con_metros).
+    Sin `caja`, sólo exactos; con la caja del corredor que arma la matriz, también los de corredores que la contienen.
+    """
+    clave = _clave(G, perfil)
+    if clave is None: return {}
+    return _almacen().consultar(*clave, u, destinos, True, con_metros, caja)
+
+
+def tiempos_hacia(G, perfil, v, origenes, con_metros=False, caja=None):
+    """{u: (tiempo, metros)} conocidos de `origenes` hacia v (misma regla que tiempos_desde)."""
+    clave = _clave(G, perfil)
+    if clave is None: return {}
+    return _almacen().consultar(*clave, v, origenes, False, con_metros, caja)
+
+
+def guardar_tiempos(G, perfil, filas, exactos=False, caja=None):
+    """
+    filas: [(u, v, tiempo)] o [(u, v, tiempo, metros)]; exactos=True (mapa completo) reemplaza.
+    exactos=False: tiempos del corredor `caja` (min_lat, max_lat, min_lon, max_lon), obligatoria.
+    """
+    if not exactos and caja is None: raise ValueError("Un tiempo del corredor se guarda con la caja del corredor")
+    clave = _clave(G, perfil)
+    if clave is None: return
+    _almacen().escribir(*clave, [(f[0], f[1], f[2], f[3] if len(f) > 3 else None, None) for f in filas], exactos, caja)
+
+
+def camino_guardado(G, perfil, u, v):
+    """(camino, tiempo, metros) guardado de u -> v, o None."""
+    clave = _clave(G, perfil)
+    if clave is None: return None
+    return _almacen().camino(*clave, u, v)
+
+
+def guardar_camino(G, perfil, u, v, path, tiempo, metros):
+    clave = _clave(G, perfil)
+    if clave is None: return
+    _almacen().escribir(*clave, [(u, v, tiempo, metros, _empacar_camino(path))], exactos=True)
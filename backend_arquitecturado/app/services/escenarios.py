@@ -0,0 +1,221 @@
+# backend_arquitecturado/app/services/escenarios.py
+"""
+Almacén de escenarios de /simulacion-leaflet (paradas, estados, inicio/fin, zonas, órdenes y matriz).
+
+- AlmacenMemoria: el comportamiento de siempre, un dict por sesión en la memoria del proceso.
+- AlmacenSQLite (FLEET_ESCENARIOS=ruta): un archivo que comparten todos los workers y que
+  sobrevive reinicios. El estado va en JSON y la matriz en binario (npz de matriz_compacta),
+  así cualquier worker atiende cualquier sesión sin volver a correr Dijkstra.
+
+Versionado optimista: cada fila lleva `rev`; se guarda con UPDATE ... WHERE rev = la leída.
+Si otro worker guardó antes, se lanza ConflictoEscenario y la acción se repite con el estado fresco.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+import numpy as np
+from app.core.config import ARCHIVO_ESCENARIOS, DIAS_ESCENARIOS, MAX_SESIONES
+from app.services.matriz_compacta import matriz_a_bytes, matriz_desde_bytes
+
+_NAVEGADOR = ""  # sesión sin nombre (el navegador)
+_LOCKS = [threading.Lock() for _ in range(64)]  # por sesión (rayado): serializa las acciones dentro del proceso
+
+
+class ConflictoEscenario(Exception):
+    """Otro worker guardó el escenario entre la lectura y la escritura."""
+
+
+def escenario_vacio(version=0):
+    return {
+        "puntos": [], "full_matrix_time": None, "nodos_totales": [],
+        "id_inicio": None, "id_fin": None, "ordenes": {}, "perfil": None, "filas_sucias": set(), "incidentes": 0,
+        "version": version, "historial": OrderedDict()
+    }
+
+
+def _lock(sesion):
+    return _LOCKS[hash(sesion) % len(_LOCKS)]
+
+
+# =============================================================================
+# EN MEMORIA (UN SOLO PROCESO)
+# =============================================================================
+class AlmacenMemoria:
+    nombre = "memoria"
+
+    def __init__(self):
+        self.navegador = escenario_vacio()
+        self.sesiones = OrderedDict()
+
+    def _obtener(self, sesion, crear=True):
+        if sesion is None: return self.navegador
+        cache = self.sesiones.get(sesion)
+        if cache is None:
+            if not crear: return escenario_vacio()
+            cache = self.sesiones[sesion] = escenario_vacio()
+            while len(self.sesiones) > MAX_SESIONES: self.sesiones.popitem(last=False)
+        else:
+            self.sesiones.move_to_end(sesion)
+        return cache
+
+    @contextmanager
+    def editar(self, sesion=None):
+        with _lock(sesion):
+            yield self._obtener(sesion)
+
+    def leer(self, sesion=None):
+        return self._obtener(sesion, crear=False)
+
+    def locales(self):
+        """Escenarios vivos en este proceso (para invalidar tras un incidente / diagnóstico)."""
+        return [self.navegador, *list(self.sesiones.values())]
+
+    def locales_con_candado(self):
+        """[(candado de la sesión, escenario)]: para recorrerlos sin que una acción los cambie a la vez."""
+        return [(_lock(None), self.navegador), *((_lock(s), c) for s, c in list(self.sesiones.items()))]
+
+
+# =============================================================================
+# SQLITE (COMPARTIDO ENTRE WORKERS Y REINICIOS)
+# =============================================================================
+def _json_default(x):
+    if isinstance(x, np.generic): return x.item()
+    if isinstance(x, set): return sorted(x)
+    raise TypeError(f"No serializable: {type(x).__name__}")
+
+
+def _estado_a_json(cache):
+    estado = {k: v for k, v in cache.items() if k not in ("full_matrix_time", "nodos_totales")}
+    return json.dumps(estado, default=_json_default, separators=(",", ":"))
+
+
+def _estado_desde_json(texto):
+    estado = json.loads(texto)
+    estado["historial"] = OrderedDict((int(v), h) for v, h in estado.get("historial", {}).items())
+    estado["filas_sucias"] = set(estado.get("filas_sucias", []))
+    # firma_ruta es una tupla (se compara con ==): JSON la devuelve como lista
+    for o in estado.get("ordenes", {}).values():
+        o["firma"] = (tuple(o["firma"][0]), *o["firma"][1:])
+    return {**escenario_vacio(), **estado}
+
+
+class AlmacenSQLite:
+    """
+    Una fila por sesión: estado (JSON), nodos (int64), matriz (npz) y su huella.
+    Cada worker recuerda el último escenario que leyó/guardó con su rev: si la rev en disco
+    sigue igual lo reutiliza tal cual (incluidas las mejoras de fondo que le cayeron encima).
+    La matriz sólo se reescribe cuando su huella cambió.
+    """
+    nombre = "sqlite"
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self._local = threading.local()
+        self._memo = OrderedDict()  # sesion -> [rev, cache, json del estado, huella de la matriz]
+        self._memo_lock = threading.Lock()
+        # Tras un fork (app.servidor) las conexiones del padre no se pueden usar: cada hijo abre las suyas
+        if hasattr(os, "register_at_fork"): os.register_at_fork(after_in_child=self._olvidar_conexiones)
+        os.makedirs(os.path.dirname(os.path.abspath(ruta)), exist_ok=True)
+        con = self._con()
+        con.execute("""CREATE TABLE IF NOT EXISTS escenarios (
+            sesion TEXT PRIMARY KEY, rev INTEGER NOT NULL, estado TEXT NOT NULL,
+            nodos BLOB, matriz BLOB, huella_matriz TEXT, actualizado REAL NOT NULL)""")
+        borrados = con.execute("DELETE FROM escenarios WHERE actualizado < ?",
+                               (time.time() - DIAS_ESCENARIOS * 86400,)).rowcount
+        print(f">>> 💾 ESCENARIOS EN SQLITE: {ruta} ({borrados} viejos borrados)")
+
+    def _con(self):
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = self._local.con = sqlite3.connect(self.ruta, timeout=30, isolation_level=None,
+                                                    check_same_thread=False)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+        return con
+
+    def _olvidar_conexiones(self):
+        self._local = threading.local()
+
+    def _recordar(self, sesion, memo):
+        with self._memo_lock:
+            self._memo[sesion] = memo
+            self._memo.move_to_end(sesion)
+            while len(self._memo) > MAX_SESIONES: self._memo.popitem(last=False)
+
+    def _olvidar(self, sesion):
+        with self._memo_lock: self._memo.pop(sesion, None)
+
+    def _cargar(self, sesion):
+        """[rev, cache, json, huella] con lo último en disco (rev 0 = aún no existe)."""
+        con = self._con()
+        fila = con.execute("SELECT rev FROM escenarios WHERE sesion = ?", (sesion,)).fetchone()
+        memo = self._memo.get(sesion)
+        if fila is None: return [0, escenario_vacio(), None, None]
+        if memo is not None and memo[0] == fila[0]: return memo
+        rev, estado, nodos, matriz, huella = con.execute(
+            "SELECT rev, estado, nodos, matriz, huella_matriz FROM escenarios WHERE sesion = ?", (sesion,)).fetchone()
+        cache = _estado_desde_json(estado)
+        cache["nodos_totales"] = np.frombuffer(nodos, dtype=np.int64).tolist() if nodos else []
+        cache["full_matrix_time"] = matriz_desde_bytes(matriz) if matriz else None
+        memo = [rev, cache, estado, huella]
+        self._recordar(sesion, memo)
+        return memo
+
+    def _guardar(self, sesion, memo):
+        rev, cache, estado_previo, huella_previa = memo
+        estado = _estado_a_json(cache)
+        m = cache.get("full_matrix_time")
+        matriz = matriz_a_bytes(m) if m is not None else None
+        huella = hashlib.blake2b(matriz, digest_size=16).hexdigest() if matriz is not None else None
+        if rev and estado == estado_previo and huella == huella_previa: return
+        nodos = np.asarray(cache.get("nodos_totales", []), dtype=np.int64).tobytes()
+        con = self._con()
+        if rev == 0:
+            try:
+                con.execute("INSERT INTO escenarios VALUES (?, 1, ?, ?, ?, ?, ?)",
+                            (sesion, estado, nodos, matriz, huella, time.time()))
+            except sqlite3.IntegrityError:
+                self._olvidar(sesion)
+                raise ConflictoEscenario(sesion)
+        else:
+            if huella == huella_previa:
+                n = con.execute("UPDATE escenarios SET rev = rev + 1, estado = ?, nodos = ?, actualizado = ? "
+                                "WHERE sesion = ? AND rev = ?", (estado, nodos, time.time(), sesion, rev)).rowcount
+            else:
+                n = con.execute("UPDATE escenarios SET rev = rev + 1, estado = ?, nodos = ?, matriz = ?, "
+                                "huella_matriz = ?, actualizado = ? WHERE sesion = ? AND rev = ?",
+                                (estado, nodos, matriz, huella, time.time(), sesion, rev)).rowcount
+            if n == 0:
+                self._olvidar(sesion)
+                raise ConflictoEscenario(sesion)
+        self._recordar(sesion, [rev + 1, cache, estado, huella])
+
+    @contextmanager
+    def editar(self, sesion=None):
+        sesion = _NAVEGADOR if sesion is None else sesion
+        with _lock(sesion):
+            memo = self._cargar(sesion)
+            try:
+                yield memo[1]
+            except BaseException:
+                self._olvidar(sesion)  # pudo quedar a medias: la próxima vez se lee de disco
+                raise
+            self._guardar(sesion, memo)
+
+    def leer(self, sesion=None):
+        return self._cargar(_NAVEGADOR if sesion is None else sesion)[1]
+
+    def locales(self):
+        with self._memo_lock: return [memo[1] for memo in self._memo.values()]
+
+    def locales_con_candado(self):
+        with self._memo_lock: return [(_lock(s), memo[1]) for s, memo in self._memo.items()]
+
+
+def crear_almacen(ruta=ARCHIVO_ESCENARIOS):
+    return AlmacenSQLite(ruta) if ruta else AlmacenMemoria()
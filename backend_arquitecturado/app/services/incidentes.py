@@ -0,0 +1,339 @@
+# backend_arquitecturado/app/services/incidentes.py
+"""
+Incidentes en vivo (cierres, embotellamientos) sin reiniciar con otro mapa.
+
+Un incidente multiplica el tiempo de un conjunto de aristas (factor >= 1; cerrar = FACTOR_CIERRE).
+Los tiempos se reescriben en su lugar (travel_time y cada perfil, ver services/perfiles.py) y sólo
+se descartan las entradas de caché que podían depender de esas aristas; se recalculan al pedirlas.
+Nunca se baja un tiempo por debajo del mapa original: así las cotas ALT (landmarks) siguen valiendo.
+
+Con varios workers cada uno tiene su copia del grafo: los incidentes activos y una generación
+(un número por cada alta o baja, con los pares u -> v que cambió) viven en el SQLite de
+FLEET_ESCENARIOS. Antes de atender, cada worker compara la generación con la que ya aplicó
+(una consulta) y, si cambió, reaplica la diferencia e invalida sus propias cachés.
+Los escenarios guardan la generación de su matriz y se ponen al día con el historial al usarse.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
+from itertools import count
+import numpy as np
+from app.core.config import FACTOR_CIERRE, MAX_ARISTAS_INCIDENTE, MAX_CAMBIOS_INCIDENTES, ARCHIVO_ESCENARIOS
+from app.core.indice_espacial import get_indice
+from app.services.perfiles import poner_factores, numerar_aristas
+from app.services.tramos import invalidar_tramos
+from app.services.arboles import invalidar_arboles
+from app.services.isocronas import invalidar_alcances
+
+_INCIDENTES = OrderedDict()   # id -> {"id", "descripcion", "factor", "aristas": [(u, v, k)], "creado"}
+_INCIDENTES_GRAFO = None
+_GENERACION = None            # generación del registro que este proceso ya aplicó (None: ninguna)
+_LOCK = threading.Lock()
+
+
+# =============================================================================
+# SELECCIÓN DE ARISTAS
+# =============================================================================
+def aristas_por_pares(G, pares):
+    """[[u, v], [u, v, k], ...] -> [(u, v, k)]; [u, v] toma todas las aristas paralelas."""
+    aristas = []
+    for par in pares:
+        if len(par) not in (2, 3): raise ValueError(f"Arista inválida: {par} (se espera [u, v] o [u, v, k])")
+        u, v = int(par[0]), int(par[1])
+        paralelas = G._succ.get(u, {}).get(v)
+        if not paralelas: raise ValueError(f"No existe la arista {u} -> {v}")
+        if len(par) == 3:
+            if int(par[2]) not in paralelas: raise ValueError(f"No existe la arista {u} -> {v} (clave {par[2]})")
+            aristas.append((u, v, int(par[2])))
+        else:
+            aristas.extend((u, v, k) for k in paralelas)
+    return aristas
+
+
+def _dentro(xs, ys, poli_x, poli_y):
+    """Punto en polígono (par-impar) vectorizado sobre los puntos."""
+    dentro = np.zeros(len(xs), dtype=bool)
+    j = len(poli_x) - 1
+    for i in range(len(poli_x)):
+        xi, yi, xj, yj = poli_x[i], poli_y[i], poli_x[j], poli_y[j]
+        if yi != yj:
+            cruza = ((yi > ys) != (yj > ys)) & (xs < (xj - xi) * (ys - yi) / (yj - yi) + xi)
+            dentro ^= cruza
+        j = i
+    return dentro
+
+
+def aristas_en_poligono(G, poligono):
+    """Aristas con al menos un extremo dentro del polígono [[lat, lon], ...] (entran, salen o lo cruzan)."""
+    if len(poligono) < 3: raise ValueError("El polígono necesita al menos 3 vértices")
+    lats = [p[0] for p in poligono]; lons = [p[1] for p in poligono]
+    indice = get_indice(G)
+    pos = indice.posiciones_en_caja(min(lats), max(lats), min(lons), max(lons))
+    dentro = pos[_dentro(indice.xs[pos], indice.ys[pos], lons, lats)]
+    aristas = set()
+    for n in indice.ids[dentro].tolist():
+        for v, paralelas in G._succ[n].items(): aristas.update((n, v, k) for k in paralelas)
+        for u, paralelas in G._pred[n].items(): aristas.update((u, n, k) for k in paralelas)
+    return sorted(aristas)
+
+
+# =============================================================================
+# REGISTRO (EN MEMORIA O COMPARTIDO ENTRE WORKERS)
+# =============================================================================
+class _RegistroMemoria:
+    """Un solo proceso: quien crea el incidente es el único que lo tiene que aplicar."""
+
+    def __init__(self):
+        self.incidentes = OrderedDict()   # id -> (version_grafo, incidente)
+        self.cambios = OrderedDict()      # generación -> (version_grafo, pares)
+        self._ids, self._gens = count(1), count(1)
+
+    def transaccion(self):
+        return nullcontext()  # todo pasa bajo _LOCK
+
+    def generacion(self):
+        return next(reversed(self.cambios), 0)
+
+    def activos(self, version):
+        return OrderedDict((i, inc) for i, (v, inc) in self.incidentes.items() if v == version)
+
+    def agregar(self, version, inc):
+        i = next(self._ids)
+        self.incidentes[i] = (version, {"id": i, **inc})
+        return i
+
+    def quitar(self, version, id_incidente):
+        v, inc = self.incidentes.get(id_incidente, (None, None))
+        if v != version: return None
+        return self.incidentes.pop(id_incidente)[1]
+
+    def anotar(self, version, pares):
+        gen = next(self._gens)
+        self.cambios[gen] = (version, set(pares))
+        while len(self.cambios) > MAX_CAMBIOS_INCIDENTES: self.cambios.popitem(last=False)
+        return gen
+
+    def cambios_entre(self, version, desde, hasta):
+        if self.cambios and desde + 1 < next(iter(self.cambios)): return None
+        pares = set()
+        for gen, (v, p) in self.cambios.items():
+            if v == version and desde < gen <= hasta: pares |= p
+        return pares
+
+
+def _inc_a_json(inc):
+    return json.dumps({k: v for k, v in inc.items() if k != "id"}, separators=(",", ":"))
+
+
+def _inc_desde_json(id_incidente, texto):
+    inc = json.loads(texto)
+    return {"id": id_incidente, **inc, "aristas": [tuple(a) for a in inc["aristas"]]}
+
+
+class _RegistroSQLite:
+    """Las mismas operaciones sobre dos tablas del SQLite de escenarios (una conexión por hilo)."""
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self._local = threading.local()
+        if hasattr(os, "register_at_fork"): os.register_at_fork(after_in_child=self._olvidar_conexiones)
+        os.makedirs(os.path.dirname(os.path.abspath(ruta)), exist_ok=True)
+        con = self._con()
+        con.execute("""CREATE TABLE IF NOT EXISTS incidentes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, version_grafo TEXT NOT NULL, datos TEXT NOT NULL)""")
+        con.execute("""CREATE TABLE IF NOT EXISTS cambios_incidentes (
+            gen INTEGER PRIMARY KEY AUTOINCREMENT, version_grafo TEXT NOT NULL, pares TEXT NOT NULL)""")
+
+    def _con(self):
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = self._local.con = sqlite3.connect(self.ruta, timeout=30, isolation_level=None,
+                                                    check_same_thread=False)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+        return con
+
+    def _olvidar_conexiones(self):
+        self._local = threading.local()
+
+    @contextmanager
+    def transaccion(self):
+        """Escritura exclusiva entre procesos: se lee lo último y se escribe sin que otro worker se cuele."""
+        con = self._con()
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            con.execute("ROLLBACK")
+            raise
+        con.execute("COMMIT")
+
+    def generacion(self):
+        return self._con().execute("SELECT coalesce(max(gen), 0) FROM cambios_incidentes").fetchone()[0]
+
+    def activos(self, version):
+        filas = self._con().execute("SELECT id, datos FROM incidentes WHERE version_grafo = ? ORDER BY id", (version,))
+        return OrderedDict((i, _inc_desde_json(i, datos)) for i, datos in filas)
+
+    def agregar(self, version, inc):
+        return self._con().execute("INSERT INTO incidentes (version_grafo, datos) VALUES (?, ?)",
+                                   (version, _inc_a_json(inc))).lastrowid
+
+    def quitar(self, version, id_incidente):
+        con = self._con()
+        fila = con.execute("SELECT datos FROM incidentes WHERE id = ? AND version_grafo = ?",
+                           (id_incidente, version)).fetchone()
+        if fila is None: return None
+        con.execute("DELETE FROM incidentes WHERE id = ?", (id_incidente,))
+        return _inc_desde_json(id_incidente, fila[0])
+
+    def anotar(self, version, pares):
+        con = self._con()
+        gen = con.execute("INSERT INTO cambios_incidentes (version_grafo, pares) VALUES (?, ?)",
+                          (version, json.dumps(sorted(pares), separators=(",", ":")))).lastrowid
+        con.execute("DELETE FROM cambios_incidentes WHERE gen <= ?", (gen - MAX_CAMBIOS_INCIDENTES,))
+        return gen
+
+    def cambios_entre(self, version, desde, hasta):
+        con = self._con()
+        minimo = con.execute("SELECT min(gen) FROM cambios_incidentes").fetchone()[0]
+        if minimo is not None and desde + 1 < minimo: return None
+        pares = set()
+        for (texto,) in con.execute("SELECT pares FROM cambios_incidentes WHERE version_grafo = ? AND gen > ? "
+                                    "AND gen <= ?", (version, desde, hasta)):
+            pares.update(tuple(p) for p in json.loads(texto))
+        return pares
+
+
+_REGISTRO = _RegistroSQLite(ARCHIVO_ESCENARIOS) if ARCHIVO_ESCENARIOS else _RegistroMemoria()
+
+
+# =============================================================================
+# APLICAR / LEVANTAR
+# =============================================================================
+def _version(G):
+    return G.graph.get('version_grafo', 'sinversion')
+
+
+def _reiniciar_si_cambio(G):
+    global _INCIDENTES_GRAFO, _GENERACION
+    if _INCIDENTES_GRAFO is not G:
+        _INCIDENTES.clear(); _INCIDENTES_GRAFO = G; _GENERACION = None
+
+
+def _reaplicar(G, tocadas):
+    """
+    Recalcula el factor vivo de las aristas `tocadas` (producto de los incidentes activos),
+    reescribe sus tiempos e invalida lo que dependía de ellas.
+    Devuelve (subidas, bajadas, resumen): pares u -> v que se hicieron más lentos / más rápidos.
+    """
+    factores = {}
+    for inc in _INCIDENTES.values():
+        for arista in inc["aristas"]:
+            if arista in tocadas:
+                eid = G._succ[arista[0]][arista[1]][arista[2]]['eid']
+                factores[eid] = factores.get(eid, 1.0) * inc["factor"]
+    datos = {G._succ[u][v][k]['eid']: G._succ[u][v][k] for u, v, k in tocadas}
+    cambios = poner_factores(G, datos, factores)
+    par_de = {G._succ[u][v][k]['eid']: (u, v) for u, v, k in tocadas}
+    subidas = {par_de[eid] for eid, (antes, ahora) in cambios.items() if ahora > antes}
+    bajadas = {par_de[eid] for eid, (antes, ahora) in cambios.items() if ahora < antes}
+    resumen = {
+        "aristas_cambiadas": len(cambios),
+        "tramos": invalidar_tramos(G, subidas, bajadas),
+        "arboles_inversos": invalidar_arboles(G, subidas, bajadas),
+        "isocronas": invalidar_alcances(G, subidas | bajadas),
+    }
+    return subidas, bajadas, resumen
+
+
+def _sincronizar(G):
+    """Deja _INCIDENTES igual al registro: reaplica sólo las aristas de los que aparecieron o se fueron."""
+    global _GENERACION
+    _reiniciar_si_cambio(G)
+    gen = _REGISTRO.generacion()
+    if gen == _GENERACION: return
+    activos = _REGISTRO.activos(_version(G))
+    tocadas = set()
+    for i in set(_INCIDENTES) ^ set(activos): tocadas.update((_INCIDENTES.get(i) or activos[i])["aristas"])
+    _INCIDENTES.clear(); _INCIDENTES.update(activos)
+    if tocadas:
+        numerar_aristas(G)
+        _, _, resumen = _reaplicar(G, tocadas)
+        print(f">>> 🔄 INCIDENTES AL DÍA (generación {_GENERACION} -> {gen}): {len(activos)} activos | {resumen}")
+    _GENERACION = gen
+
+
+def incidentes_al_dia(G):
+    """True si este proceso ya aplicó la última generación del registro (una consulta)."""
+    return _INCIDENTES_GRAFO is G and _REGISTRO.generacion() == _GENERACION
+
+
+def sincronizar_incidentes(G):
+    """Aplica lo que otro worker creó o levantó desde la última vez."""
+    with _LOCK: _sincronizar(G)
+
+
+def generacion_aplicada():
+    """Generación de incidentes con la que están los tiempos del grafo de este proceso."""
+    return _GENERACION or 0
+
+
+def cambios_desde(G, desde):
+    """
+    Pares u -> v que cambiaron de tiempo entre la generación `desde` y la aplicada aquí.
+    None si el historial ya no llega tan atrás (hay que dar todo por cambiado).
+    """
+    hasta = generacion_aplicada()
+    if desde >= hasta: return set()
+    return _REGISTRO.cambios_entre(_version(G), desde, hasta)
+
+
+def crear_incidente(G, aristas, factor=None, cerrar=False, descripcion=""):
+    """
+    Registra un incidente sobre `aristas` [(u, v, k)] y lo aplica.
+    Devuelve (incidente, pares cambiados, resumen de invalidación).
+    """
+    global _GENERACION
+    if not aristas: raise ValueError("El incidente no toca ninguna arista")
+    if len(aristas) > MAX_ARISTAS_INCIDENTE:
+        raise ValueError(f"{len(aristas)} aristas (máximo {MAX_ARISTAS_INCIDENTE} por incidente)")
+    if cerrar: factor = FACTOR_CIERRE
+    if factor is None or factor < 1:
+        raise ValueError("factor debe ser >= 1 (sólo se puede hacer más lento; para volver, levantar el incidente)")
+    numerar_aristas(G)
+    with _LOCK, _REGISTRO.transaccion():
+        _sincronizar(G)  # lo que otros workers hicieron antes, para no pisarlo
+        inc = {"descripcion": descripcion, "factor": float(factor), "cerrado": bool(cerrar),
+               "aristas": list(dict.fromkeys(aristas)), "creado": time.time()}
+        inc = {"id": _REGISTRO.agregar(_version(G), inc), **inc}
+        _INCIDENTES[inc["id"]] = inc
+        subidas, bajadas, resumen = _reaplicar(G, set(inc["aristas"]))
+        _GENERACION = resumen["generacion"] = _REGISTRO.anotar(_version(G), subidas | bajadas)
+    print(f">>> 🚧 INCIDENTE {inc['id']}: {len(inc['aristas'])} aristas x{inc['factor']:g} | {resumen}")
+    return inc, subidas | bajadas, resumen
+
+
+def levantar_incidente(G, id_incidente):
+    """Quita el incidente y devuelve sus aristas al tiempo que les toque. None si no existe."""
+    global _GENERACION
+    numerar_aristas(G)
+    with _LOCK, _REGISTRO.transaccion():
+        _sincronizar(G)
+        inc = _REGISTRO.quitar(_version(G), id_incidente)
+        if inc is None: return None
+        _INCIDENTES.pop(id_incidente, None)
+        subidas, bajadas, resumen = _reaplicar(G, set(inc["aristas"]))
+        _GENERACION = resumen["generacion"] = _REGISTRO.anotar(_version(G), subidas | bajadas)
+    print(f">>> ✅ INCIDENTE {id_incidente} LEVANTADO | {resumen}")
+    return inc, subidas | bajadas, resumen
+
+
+def listar_incidentes(G):
+    if _INCIDENTES_GRAFO is not G: return []
+    return [{**{k: v for k, v in inc.items() if k != "aristas"}, "num_aristas": len(inc["aristas"])}
+            for inc in _INCIDENTES.values()]
@@ -0,0 +1,74 @@
+import threading
+from bisect import bisect_right
+from collections import OrderedDict
+import numpy as np
+from app.core.config import TAM_CACHE_ISOCRONAS
+from app.services.busqueda import dijkstra_acotado
+from app.services.perfiles import clave_perfil
+
+_ALCANCES = OrderedDict()   # (perfil, nodo) -> (corte_s, {nodo: segundos})
+_ALCANCES_GRAFO = None
+_LOCK = threading.Lock()
+
+
+def alcance(G, origen, corte_s, perfil=None):
+    """
+    Nodos alcanzables desde `origen` en <= corte_s segundos (una búsqueda acotada).
+    Se recuerda por nodo y perfil: un corte menor o igual al ya calculado no vuelve a buscar.
+    """
+    global _ALCANCES_GRAFO
+    clave = (clave_perfil(perfil), origen)
+    with _LOCK:
+        if _ALCANCES_GRAFO is not G:
+            _ALCANCES.clear(); _ALCANCES_GRAFO = G
+        guardado = _ALCANCES.get(clave)
+        if guardado is not None and guardado[0] >= corte_s:
+            _ALCANCES.move_to_end(clave)
+            return guardado[1]
+    dist = dijkstra_acotado(G, origen, corte=corte_s, perfil=perfil)
+    with _LOCK:
+        _ALCANCES[clave] = (corte_s, dist)
+        while len(_ALCANCES) > TAM_CACHE_ISOCRONAS: _ALCANCES.popitem(last=False)
+    return dist
+
+
+def copia_alcances():
+    with _LOCK: return list(_ALCANCES.items())
+
+
+def invalidar_alcances(G, pares):
+    """Descarta los alcances que llegan al inicio de alguna arista a -> b cuyo tiempo cambió."""
+    if _ALCANCES_GRAFO is not G: return 0
+    with _LOCK:
+        caen = [clave for clave, (_, dist) in _ALCANCES.items() if any(a in dist for a, _ in pares)]
+        for clave in caen: del _ALCANCES[clave]
+    return len(caen)
+
+
+def poligono(G, nodos):
+    """Envolvente convexa [[lat, lon], ...] de los nodos (como en prueba.py)."""
+    if len(nodos) < 3: return [[G.nodes[n]['y'], G.nodes[n]['x']] for n in nodos]
+    from scipy.spatial import ConvexHull  # sólo se importa si alguien pide isocronas
+    xy = np.array([(G.nodes[n]['x'], G.nodes[n]['y']) for n in nodos])
+    try:
+        hull = ConvexHull(xy)
+    except Exception:  # todos los puntos alineados
+        return [[y, x] for x, y in xy[[xy[:, 0].argmin(), xy[:, 0].argmax()]]]
+    return [[float(y), float(x)] for x, y in xy[hull.vertices]]
+
+
+def isocronas(G, origen, cortes_s, perfil=None):
+    """
+    Una sola búsqueda hasta el corte mayor; cada corte filtra el mismo resultado.
+    El `dist` devuelto nunca pasa del corte mayor (el guardado puede venir de un corte más grande).
+    """
+    dist = alcance(G, origen, max(cortes_s), perfil)
+    # dist viene en orden de asentamiento (tiempos crecientes): cada corte es un prefijo
+    nodos, tiempos = list(dist), list(dist.values())
+    tope = bisect_right(tiempos, max(cortes_s))
+    if tope < len(nodos): dist = dict(zip(nodos[:tope], tiempos[:tope]))
+    res = []
+    for corte in sorted(cortes_s):
+        dentro = nodos[:bisect_right(tiempos, corte)]
+        res.append({"minutos": round(corte / 60, 2), "nodos": dentro, "poligono": poligono(G, dentro)})
+    return dist, res
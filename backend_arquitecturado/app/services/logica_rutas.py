@@ -1,11 +1,16 @@
-import networkx as nx
+import random
+import time
 import numpy as np
-from app.core.config import TIEMPO_SERVICIO_MIN # <--- Importamos desde config
+from app.core.config import TIEMPO_SERVICIO_MIN, UMBRAL_EXACTO # <--- Importamos desde config
+from app.services.tramos import obtener_tramo
+from app.services.ruta_exacta import orden_exacto
+from app.services import ventanas
 
 
-def calcular_metricas(ruta_indices, lista_nodos_global, G, nombre_ruta="Ruta"):
+def calcular_metricas(ruta_indices, lista_nodos_global, G, nombre_ruta="Ruta", perfil=None, servicio_min=None):
     """
     Calcula métricas con REPORTES EN CONSOLA para verificar la lógica V-Plata.
+    servicio_min: minutos de servicio por posición de `ruta_indices` (sin ella, TIEMPO_SERVICIO_MIN fijo).
     """
     if not ruta_indices or G is None: return 0, "0m"
     
@@ -22,23 +27,20 @@ def calcular_metricas(ruta_indices, lista_nodos_global, G, nombre_ruta="Ruta"):
     for i in range(len(ruta_nodos) - 1):
         u, v = ruta_nodos[i], ruta_nodos[i+1]
         try:
-            # Buscamos camino usando el tiempo calculado en mapa.py
-            path = nx.shortest_path(G, u, v, weight='travel_time')
+            # Tramo recordado entre peticiones (camino + distancia + tiempo)
+            tramo = obtener_tramo(G, u, v, perfil)
             tramos_exitosos += 1
-            
-            for n1, n2 in zip(path[:-1], path[1:]):
-                edge_data = G.get_edge_data(n1, n2)[0]
-                d_m += edge_data.get('length', 0)
-                t_conduccion_sec += edge_data.get('travel_time', 0)
+            d_m += tramo["dist_m"]
+            t_conduccion_sec += tramo["tiempo_s"]
         except:
             # AQUI ESTABA EL PROBLEMA SILENCIOSO
             print(f">>> ⚠️ ALERTA: No hay camino entre nodo {u} y {v}. Tramo saltado.")
 
-    # 2. Agregar Tiempo de Servicio (5 min por parada)
+    # 2. Agregar Tiempo de Servicio (el de cada parada, o 5 min por parada)
     # Excluimos el nodo de inicio, solo destinos.
-    # Usamos tramos_exitosos para asegurarnos de no cobrar servicio si no llegamos.
     num_paradas = max(0, len(ruta_nodos) - 1) 
-    t_servicio_sec = num_paradas * (TIEMPO_SERVICIO_MIN * 60)
+    if servicio_min is None: servicio_min = [TIEMPO_SERVICIO_MIN] * len(ruta_nodos)
+    t_servicio_sec = sum(servicio_min[1:]) * 60
     
     t_total_sec = t_conduccion_sec + t_servicio_sec
     
@@ -50,7 +52,7 @@ def calcular_metricas(ruta_indices, lista_nodos_global, G, nombre_ruta="Ruta"):
     print(f"\n📊 REPORTE {nombre_ruta.upper()}:")
     print(f"   - Distancia: {km} km")
     print(f"   - Tiempo Manejo: {round(t_conduccion_sec/60, 1)} min")
-    print(f"   - Tiempo Servicio: {round(t_servicio_sec/60, 1)} min ({num_paradas} paradas x {TIEMPO_SERVICIO_MIN}m)")
+    print(f"   - Tiempo Servicio: {round(t_servicio_sec/60, 1)} min ({num_paradas} paradas)")
     print(f"   - TOTAL: {round(mins_totales, 1)} min")
     # ----------------------------------
 
@@ -61,42 +63,158 @@ def calcular_metricas(ruta_indices, lista_nodos_global, G, nombre_ruta="Ruta"):
         
     return km, tiempo_str
 
-# --- MANTÉN TU FUNCIÓN optimizar_indices IGUAL ---
-def optimizar_indices(indices_activos, sub_matriz, idx_arranque=None, idx_destino=None):
-    # (Pega aquí el código de optimización que ya tenías, ese está bien)
-    # ... código de optimizar_indices ...
+def _or_opt(ruta_local, sub_matriz, lim):
+    """
+    Or-opt dirigido: mueve tramos de 1-3 paradas a otra posición SIN invertirlos.
+    Como ningún arco cambia de sentido, el delta es exacto con matrices asimétricas.
+    Sólo mueve posiciones [1, lim): el arranque y el destino fijo no se tocan.
+    """
+    m = sub_matriz
+    n = len(ruta_local)
+    for largo in (1, 2, 3):
+        for i in range(1, lim - largo + 1):
+            a, s0, sl = ruta_local[i-1], ruta_local[i], ruta_local[i+largo-1]
+            b = ruta_local[i+largo] if i + largo < n else None
+            quitar = m[a][s0] + (m[sl][b] - m[a][b] if b is not None else 0)
+            for p in range(1, lim + 1):
+                if i <= p <= i + largo: continue
+                x = ruta_local[p-1]
+                y = ruta_local[p] if p < n else None
+                poner = m[x][s0] + (m[sl][y] - m[x][y] if y is not None else 0)
+                if poner < quitar - 1e-9:
+                    tramo = ruta_local[i:i+largo]
+                    resto = ruta_local[:i] + ruta_local[i+largo:]
+                    q = p if p < i else p - largo
+                    ruta_local[:] = resto[:q] + tramo + resto[q:]
+                    return True
+    return False
+
+
+def _dos_opt(ruta_local, sub_matriz, lim):
+    """2-opt clásico (una pasada completa). Sólo válido si ida = vuelta."""
+    mejoro = False
+    for i in range(1, lim - 1):
+        for j in range(i + 1, lim):
+            if j - i == 1: continue
+            ia, ib = ruta_local[i-1], ruta_local[i]
+            ic, id_ = ruta_local[j-1], ruta_local[j]
+            if sub_matriz[ia][ic] + sub_matriz[ib][id_] < sub_matriz[ia][ib] + sub_matriz[ic][id_]:
+                ruta_local[i:j] = ruta_local[i:j][::-1]; mejoro = True
+    return mejoro
+
+
+def _mejora_local(ruta_local, sub_matriz, lim, asimetrico, max_iter=50, hasta=None, restricciones=None):
+    """
+    Aplica or-opt / 2-opt hasta un óptimo local, `max_iter` pasadas o el reloj `hasta`.
+    Con ventanas, los movimientos se evalúan con resúmenes de tramo (services/ventanas.py).
+    """
+    if restricciones is not None and restricciones.hay_ventanas:
+        mov = ventanas.or_opt if asimetrico else ventanas.dos_opt
+        paso = lambda ruta, m, l: mov(ruta, m, l, restricciones)
+    else:
+        paso = _or_opt if asimetrico else _dos_opt
+    iteraciones = 0
+    while iteraciones < max_iter and paso(ruta_local, sub_matriz, lim):
+        iteraciones += 1
+        if hasta is not None and time.perf_counter() >= hasta: break
+
+
+def costo_ruta(ruta_local, sub_matriz, restricciones=None):
+    """Segundos de manejo; con ventanas, más PESO_TARDANZA por segundo de retraso."""
+    if restricciones is not None and restricciones.hay_ventanas:
+        return ventanas.costo(ruta_local, sub_matriz, restricciones)
+    return sum(sub_matriz[a][b] for a, b in zip(ruta_local, ruta_local[1:]))
+
+
+def _vecino_mas_cercano(sub_matriz, curr, pendientes):
+    ruta_local = [curr]
+    while pendientes:
+        best_next = None; min_dist = float('inf')
+        for cand in pendientes:
+            d = sub_matriz[curr][cand]
+            if d < min_dist: min_dist = d; best_next = cand
+        if best_next is not None:
+            ruta_local.append(best_next); pendientes.remove(best_next); curr = best_next
+        else:
+            nxt = list(pendientes)[0]; ruta_local.append(nxt); pendientes.remove(nxt); curr = nxt
+    return ruta_local
+
+
+def _sembrar(indices_activos, sub_matriz, orden_previo, curr, pendientes):
+    """
+    Arranque en caliente: conserva el orden previo de las paradas que siguen activas
+    (las visitadas/omitidas simplemente desaparecen) e inserta las nuevas donde cuesten menos.
+    """
+    pos = {g: i for i, g in enumerate(indices_activos)}
+    ruta_local = [curr]
+    for g in orden_previo:
+        i = pos.get(g)
+        if i is not None and i in pendientes:
+            ruta_local.append(i); pendientes.discard(i)
+    m = sub_matriz
+    for k in sorted(pendientes):
+        mejor_p, mejor_delta = len(ruta_local), float('inf')
+        for p in range(1, len(ruta_local) + 1):
+            x = ruta_local[p-1]
+            y = ruta_local[p] if p < len(ruta_local) else None
+            delta = m[x][k] + (m[k][y] - m[x][y] if y is not None else 0)
+            if delta < mejor_delta: mejor_delta, mejor_p = delta, p
+        ruta_local.insert(mejor_p, k)
+    pendientes.clear()
+    return ruta_local
+
+
+def _perturbar(ruta_local, lim, rnd):
+    """Intercambia dos tramos consecutivos (double-bridge sin inversión)."""
+    a, b, c = sorted(rnd.sample(range(1, lim + 1), 3))
+    return ruta_local[:a] + ruta_local[b:c] + ruta_local[a:b] + ruta_local[c:]
+
+
+def optimizar_indices(indices_activos, sub_matriz, idx_arranque=None, idx_destino=None, asimetrico=False,
+                      presupuesto_s=None, orden_previo=None, semilla=None, restricciones=None):
+    """
+    Vecino más cercano (o el orden previo) + mejora local.
+    asimetrico=False: 2-opt clásico (supone ida = vuelta).
+    asimetrico=True: or-opt sin inversión de tramos, seguro con calles de un sentido.
+    presupuesto_s: solver "anytime"; tras el óptimo local sigue perturbando y mejorando
+    hasta agotar el tiempo y devuelve el mejor orden encontrado.
+    orden_previo: orden anterior (índices globales) para arrancar en caliente.
+    Con UMBRAL_EXACTO paradas o menos se resuelve exacto (Held-Karp) y se ignoran presupuesto/orden previo.
+    restricciones: ventanas.Restricciones (servicio y ventanas por posición local). Con ventanas el
+    costo incluye el retraso y no se usa Held-Karp (su DP es sólo de manejo).
+    """
     n = len(indices_activos)
     if n == 0: return []
     if n == 1: return indices_activos
-    pendientes = set(range(n)); ruta_local = []
+    hasta = time.perf_counter() + presupuesto_s if presupuesto_s else None
+    pendientes = set(range(n))
     curr = 0
     if idx_arranque is not None and idx_arranque in indices_activos:
         curr = indices_activos.index(idx_arranque)
-    ruta_local.append(curr)
     if curr in pendientes: pendientes.remove(curr)
     dest = None
     if idx_destino is not None and idx_destino in indices_activos:
         dest = indices_activos.index(idx_destino)
         if dest in pendientes: pendientes.remove(dest)
-    while pendientes:
-        best_next = None; min_dist = float('inf')
-        for cand in pendientes:
-            d = sub_matriz[curr][cand]
-            if d < min_dist: min_dist = d; best_next = cand
-        if best_next is not None:
-            ruta_local.append(best_next); pendientes.remove(best_next); curr = best_next
-        else:
-            nxt = list(pendientes)[0]; ruta_local.append(nxt); pendientes.remove(nxt); curr = nxt
+    con_ventanas = restricciones is not None and restricciones.hay_ventanas
+    if n <= UMBRAL_EXACTO and not con_ventanas:
+        return [indices_activos[i] for i in orden_exacto(indices_activos, sub_matriz, curr, dest)]
+    if orden_previo:
+        ruta_local = _sembrar(indices_activos, sub_matriz, orden_previo, curr, pendientes)
+    else:
+        ruta_local = _vecino_mas_cercano(sub_matriz, curr, pendientes)
     if dest is not None: ruta_local.append(dest)
-    mejoro = True; iteraciones = 0
     lim = len(ruta_local) - 1 if dest is not None else len(ruta_local)
-    while mejoro and iteraciones < 50:
-        mejoro = False; iteraciones += 1
-        for i in range(1, lim - 1):
-            for j in range(i + 1, lim):
-                if j - i == 1: continue
-                ia, ib = ruta_local[i-1], ruta_local[i]
-                ic, id_ = ruta_local[j-1], ruta_local[j]
-                if sub_matriz[ia][ib] + sub_matriz[ic][id_] < sub_matriz[ia][ib] + sub_matriz[ic][id_]:
-                    ruta_local[i:j] = ruta_local[i:j][::-1]; mejoro = True
+    _mejora_local(ruta_local, sub_matriz, lim, asimetrico, max_iter=1000 if hasta else 50, hasta=hasta,
+                  restricciones=restricciones)
+
+    if hasta is not None and lim >= 4:
+        rnd = random.Random(semilla)
+        mejor, mejor_costo = ruta_local[:], costo_ruta(ruta_local, sub_matriz, restricciones)
+        while time.perf_counter() < hasta:
+            candidata = _perturbar(mejor, lim, rnd)
+            _mejora_local(candidata, sub_matriz, lim, asimetrico, max_iter=1000, hasta=hasta, restricciones=restricciones)
+            c = costo_ruta(candidata, sub_matriz, restricciones)
+            if c < mejor_costo - 1e-9: mejor, mejor_costo = candidata, c
+        ruta_local = mejor
     return [indices_activos[i] for i in ruta_local]
@@ -0,0 +1,204 @@
+import networkx as nx
+import numpy as np
+from app.core.config import CORTE_CORREDOR_S, UMBRAL_MATRIZ_APROX
+from app.services.busqueda import caja_corredor, corredor_para, dijkstra_acotado
+from app.services.busqueda_dirigida import _coords_metricas
+from app.services.matriz_compacta import MatrizTiempos, MatrizPerezosa, SIN_CAMINO
+from app.services.perfiles import vel_max_global
+from app.services.cache_tiempos import tiempos_desde, tiempos_hacia, guardar_tiempos
+from app.services.tablas_zona import tiempos_zona
+
+PENALIZACION_SIN_CAMINO = SIN_CAMINO
+
+
+def _conocidos(G, perfil, u, otros, caja, por_origen=True):
+    """
+    Tiempos ya sabidos de u -> otros (u <- otros): primero la tabla de la zona, luego la caché en disco
+    (exactos, o de un corredor que contiene `caja`, la del escenario: nunca peores que buscar aquí).
+    """
+    res = tiempos_zona(G, perfil, u, otros, por_origen)
+    resto = [n for n in otros if n not in res]
+    if resto: res.update((tiempos_desde if por_origen else tiempos_hacia)(G, perfil, u, resto, caja=caja))
+    return res
+
+
+def _tiempo_completo(G, u, v, perfil=None):
+    """Respaldo: búsqueda sobre el mapa completo para pares fuera del corredor."""
+    peso = 'travel_time'
+    if perfil is not None:
+        peso = lambda a, b, aristas, pesos=perfil.tiempos: min(pesos[d['eid']] for d in aristas.values())
+    try:
+        return nx.shortest_path_length(G, u, v, weight=peso)
+    except Exception:
+        return PENALIZACION_SIN_CAMINO
+
+
+def construir_matriz_tiempos(G, nodos, perfil=None):
+    """
+    Matriz ASIMÉTRICA de tiempos (segundos): ft[i][j] = i -> j respetando sentidos,
+    con los tiempos del `perfil` de velocidad (None = travel_time).
+    Cada origen hace UNA búsqueda hacia adelante dentro del corredor del escenario
+    (que ya asienta todos los j); sólo los pares que no se asientan ahí caen al mapa completo.
+    Se guarda compacta (MatrizTiempos); arriba de UMBRAL_MATRIZ_APROX paradas se arranca
+    con la estimación geométrica y los tiempos exactos se calculan al refinar.
+    Antes de buscar se lee la tabla de la zona y la caché en disco: una fila completa no busca nada
+    y una parcial sólo busca (con parada temprana) los destinos que faltan; lo nuevo se guarda al final.
+    Con todas las paradas dentro de una zona precalculada la matriz sale sólo de leer.
+    """
+    num = len(nodos)
+    if num > UMBRAL_MATRIZ_APROX:
+        print(f">>> 📐 MATRIZ {num}x{num}: modo aproximado (exactos bajo demanda)")
+        return MatrizPerezosa([G.nodes[n]['y'] for n in nodos], [G.nodes[n]['x'] for n in nodos])
+
+    ft = MatrizTiempos(num)
+    caja = caja_corredor(G, nodos)
+    corredor = None
+    distintos = list(dict.fromkeys(nodos))
+    respaldos = buscadas = 0
+    nuevos = []
+    fila = np.zeros(num)
+    for i in range(num):
+        conocidos = _conocidos(G, perfil, nodos[i], [n for n in distintos if n != nodos[i]], caja)
+        faltan = {n for n in distintos if n != nodos[i] and n not in conocidos}
+        if faltan:
+            if corredor is None: corredor = corredor_para(G, nodos)
+            respaldos += _llenar_fila(G, nodos, i, faltan, corredor, perfil, fila, conocidos)
+            nuevos.extend((nodos[i], nodos[j], fila[j]) for j in range(num) if nodos[j] in faltan)
+            buscadas += 1
+        else:
+            for j in range(num): fila[j] = 0 if nodos[j] == nodos[i] else conocidos[nodos[j]][0]
+        ft.poner_fila(i, fila)
+    guardar_tiempos(G, perfil, list({(u, v): (u, v, t) for u, v, t in nuevos}.values()), caja=caja)
+    corredor_txt = f"corredor de {len(corredor)} nodos" if corredor is not None else "sin búsquedas"
+    print(f">>> 🧭 MATRIZ {num}x{num}: {corredor_txt} | {num - buscadas}/{num} filas desde tabla/caché | "
+          f"{respaldos} pares con respaldo | {ft.nbytes/1024:.0f} KB")
+    return ft
+
+
+def _llenar_fila(G, nodos, i, objetivos, corredor, perfil, fila, conocidos=None):
+    """
+    fila[j] = tiempo nodos[i] -> nodos[j]; devuelve cuántos pares cayeron al mapa completo.
+    Sólo se buscan `objetivos`; el resto sale de `conocidos` ({nodo: (tiempo, metros)} de la caché).
+    """
+    dist = dijkstra_acotado(G, nodos[i], objetivos, permitidos=corredor, corte=CORTE_CORREDOR_S, perfil=perfil)
+    respaldos = 0
+    for j in range(len(nodos)):
+        if i == j or nodos[j] == nodos[i]: fila[j] = 0; continue
+        if conocidos and nodos[j] not in objetivos: fila[j] = conocidos[nodos[j]][0]; continue
+        t = dist.get(nodos[j])
+        if t is None:
+            t = _tiempo_completo(G, nodos[i], nodos[j], perfil); respaldos += 1
+        fila[j] = t
+    return respaldos
+
+
+def extender_matriz_tiempos(G, matriz, nodos, perfil=None):
+    """
+    Agrega a `matriz` la fila y la columna del último nodo de `nodos`.
+    Dos búsquedas en total: hacia adelante (fila: nuevo -> i) e inversa (columna: i -> nuevo).
+    """
+    s = len(nodos)
+    target = nodos[-1]
+    if isinstance(matriz, MatrizPerezosa):
+        matriz.agregar(G.nodes[target]['y'], G.nodes[target]['x'])
+        return matriz
+    if matriz is None: matriz = MatrizTiempos(0)
+
+    otros = {n for n in nodos[:-1] if n != target}
+    caja = caja_corredor(G, nodos)
+    ya_desde = _conocidos(G, perfil, target, otros, caja)
+    ya_hacia = _conocidos(G, perfil, target, otros, caja, por_origen=False)
+    faltan_desde = otros - set(ya_desde)
+    faltan_hacia = otros - set(ya_hacia)
+    corredor = corredor_para(G, nodos) if faltan_desde or faltan_hacia else None
+    desde = dijkstra_acotado(G, target, faltan_desde, permitidos=corredor, corte=CORTE_CORREDOR_S, perfil=perfil) if faltan_desde else {}
+    hacia = dijkstra_acotado(G, target, faltan_hacia, permitidos=corredor, corte=CORTE_CORREDOR_S, inverso=True, perfil=perfil) if faltan_hacia else {}
+    fila, columna = np.zeros(s-1), np.zeros(s-1)
+    nuevos = {}
+    for i in range(s-1):
+        n = nodos[i]
+        if n == target: continue
+        if n in ya_desde: d = ya_desde[n][0]
+        else:
+            d = desde.get(n)
+            if d is None: d = _tiempo_completo(G, target, n, perfil)
+            nuevos[(target, n)] = d
+        if n in ya_hacia: h = ya_hacia[n][0]
+        else:
+            h = hacia.get(n)
+            if h is None: h = _tiempo_completo(G, n, target, perfil)
+            nuevos[(n, target)] = h
+        fila[i] = d; columna[i] = h
+    matriz.agregar(fila, columna)
+    guardar_tiempos(G, perfil, [(u, v, t) for (u, v), t in nuevos.items()], caja=caja)
+    return matriz
+
+
+def refinar_exactos(G, matriz, nodos, orden, perfil=None):
+    """
+    Modo aproximado: calcula el tiempo real de los arcos consecutivos de `orden`.
+    Agrupa por origen: una búsqueda (con parada temprana) por cada origen distinto.
+    Devuelve cuántos pares nuevos quedaron exactos.
+    """
+    if not isinstance(matriz, MatrizPerezosa): return 0
+    por_origen = {}
+    for a, b in matriz.pares_pendientes(orden):
+        por_origen.setdefault(a, set()).add(b)
+    nuevos = []
+    for a, destinos in por_origen.items():
+        # Sólo exactos: un tiempo del corredor de algún escenario puede ser más largo que el real
+        conocidos = tiempos_desde(G, perfil, nodos[a], {nodos[b] for b in destinos})
+        faltan = {nodos[b] for b in destinos if nodos[b] not in conocidos}
+        dist = dijkstra_acotado(G, nodos[a], faltan, perfil=perfil) if faltan else {}
+        for b in destinos:
+            if nodos[b] in conocidos: t = conocidos[nodos[b]][0]
+            else:
+                t = dist.get(nodos[b])
+                if t is None: t = PENALIZACION_SIN_CAMINO
+                else: nuevos.append((nodos[a], nodos[b], t))
+            matriz.registrar_exacto(a, b, t)
+    guardar_tiempos(G, perfil, nuevos, exactos=True)
+    return sum(len(d) for d in por_origen.values())
+
+
+# =============================================================================
+# INVALIDACIÓN (INCIDENTES)
+# =============================================================================
+def filas_afectadas(G, matriz, nodos, pares, max_operaciones=5e7):
+    """
+    Filas (orígenes) cuyo tiempo hacia algún destino j podría pasar por alguna arista a -> b de `pares`:
+    d(i, a) + d(b, j) a la velocidad máxima (cota inferior, aunque la arista costara 0) contra el
+    tiempo guardado. Nunca deja fuera una fila que cambió; puede marcar de más.
+    """
+    if matriz is None or not pares or not len(nodos): return set()
+    xy = _coords_metricas(G)
+    vel = vel_max_global()
+    P = np.array([xy[n] for n in nodos])
+    A = np.array([xy[a] for a, _ in pares])
+    B = np.array([xy[b] for _, b in pares])
+    da = np.hypot(P[:, None, 0] - A[None, :, 0], P[:, None, 1] - A[None, :, 1]) / vel   # (n, m): i -> a
+    db = np.hypot(B[:, None, 0] - P[None, :, 0], B[:, None, 1] - P[None, :, 1]) / vel   # (m, n): b -> j
+
+    if isinstance(matriz, MatrizPerezosa):  # las estimaciones no dependen del grafo: sólo los exactos
+        return {i for (i, j), t in matriz.exactos.items() if t < SIN_CAMINO and (da[i] + db[:, j]).min() <= t}
+
+    T = matriz.densa()
+    # Filtro barato: contra el mayor tiempo de la fila y el destino más cercano a b
+    candidatas = np.flatnonzero((da + db.min(axis=1)[None, :] <= T.max(axis=1)[:, None]).any(axis=1))
+    if len(candidatas) * da.shape[1] * len(nodos) > max_operaciones: return set(candidatas.tolist())
+    return {int(i) for i in candidatas if ((da[i][:, None] + db) <= T[i][None, :]).any()}
+
+
+def recalcular_filas(G, matriz, nodos, filas, perfil=None):
+    """Vuelve a calcular las `filas` de la matriz con los tiempos actuales (una búsqueda por fila)."""
+    if not filas or matriz is None: return
+    if isinstance(matriz, MatrizPerezosa):
+        matriz.olvidar_filas(filas); return
+    corredor = corredor_para(G, nodos)
+    objetivos = set(nodos)
+    fila = np.zeros(len(nodos))
+    for i in sorted(filas):
+        if i >= len(nodos): continue
+        _llenar_fila(G, nodos, i, objetivos, corredor, perfil, fila)
+        matriz.poner_fila(i, fila)
+    print(f">>> 🩹 MATRIZ: {len(filas)} filas recalculadas tras incidentes")
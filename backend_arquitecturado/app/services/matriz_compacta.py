@@ -0,0 +1,230 @@
+import io
+import math
+import numpy as np
+from app.core.config import FORMATO_MATRIZ, FACTOR_DESVIO_INICIAL, VEL_CALLE_KMH
+
+SIN_CAMINO = 9e9          # misma penalización que usa el resto del ruteo
+CENTINELA_U16 = 65535     # "sin camino" en formato uint16 (máx. representable: 18 h)
+
+
+# =============================================================================
+# VISTAS (sin copias con np.ix_)
+# =============================================================================
+class _FilaVista:
+    __slots__ = ("fila", "idx", "dec")
+
+    def __init__(self, fila, idx, dec):
+        self.fila, self.idx, self.dec = fila, idx, dec
+
+    def __getitem__(self, b):
+        return self.dec(self.fila[self.idx[b]])
+
+
+class VistaMatriz:
+    """
+    Submatriz "virtual" sobre `indices`: vista[a][b] == matriz[indices[a]][indices[b]].
+    Reemplaza a fmt[np.ix_(indices, indices)] sin copiar datos.
+    """
+
+    def __init__(self, matriz, indices):
+        self.matriz = matriz
+        self.idx = list(indices)
+
+    def __len__(self):
+        return len(self.idx)
+
+    def __getitem__(self, a):
+        return self.matriz.fila_vista(self.idx[a], self.idx)
+
+
+# =============================================================================
+# MATRIZ DENSA COMPACTA
+# =============================================================================
+def _dec_float(x):
+    return float(x)
+
+
+def _dec_u16(x):
+    return SIN_CAMINO if x == CENTINELA_U16 else float(x)
+
+
+class MatrizTiempos:
+    """
+    Matriz i -> j (segundos) en float32 o uint16.
+    Crece con capacidad de reserva para que agregar paradas manuales no copie todo cada vez.
+    """
+
+    def __init__(self, num, formato=FORMATO_MATRIZ):
+        self.formato = formato
+        self.dtype = np.uint16 if formato == "uint16" else np.float32
+        self.dec = _dec_u16 if formato == "uint16" else _dec_float
+        self.n = num
+        self._datos = np.zeros((num, num), dtype=self.dtype)
+
+    @property
+    def datos(self):
+        return self._datos[:self.n, :self.n]
+
+    @property
+    def nbytes(self):
+        return self._datos.nbytes
+
+    def __len__(self):
+        return self.n
+
+    def _codificar(self, valores):
+        valores = np.asarray(valores, dtype=np.float64)
+        if self.formato != "uint16": return valores.astype(np.float32)
+        cod = np.rint(np.clip(valores, 0, CENTINELA_U16 - 1))
+        cod[valores >= CENTINELA_U16] = CENTINELA_U16
+        return cod.astype(np.uint16)
+
+    @classmethod
+    def desde_densa(cls, ft, formato=FORMATO_MATRIZ):
+        m = cls(len(ft), formato)
+        m._datos[:] = m._codificar(ft)
+        return m
+
+    def poner_fila(self, i, valores):
+        self._datos[i, :self.n] = self._codificar(valores)
+
+    def poner_columna(self, j, valores):
+        self._datos[:self.n, j] = self._codificar(valores)
+
+    def valor(self, i, j):
+        return self.dec(self._datos[i, j])
+
+    def __getitem__(self, i):
+        return self.fila_vista(i, range(self.n))
+
+    def fila_vista(self, i, idx):
+        return _FilaVista(self._datos[i], idx, self.dec)
+
+    def vista(self, indices):
+        return VistaMatriz(self, indices)
+
+    def densa(self):
+        """Copia float64 con SIN_CAMINO decodificado (para clustering / depuración)."""
+        d = self.datos.astype(np.float64)
+        if self.formato == "uint16": d[self.datos == CENTINELA_U16] = SIN_CAMINO
+        return d
+
+    def agregar(self, fila, columna):
+        """Agrega un nodo: fila = nuevo -> i, columna = i -> nuevo (ambas de largo n)."""
+        cap = self._datos.shape[0]
+        if self.n + 1 > cap:
+            nueva = np.zeros((max(4, int(cap * 1.5) + 1),) * 2, dtype=self.dtype)
+            nueva[:self.n, :self.n] = self.datos
+            self._datos = nueva
+        k = self.n
+        self.n += 1
+        self._datos[k, :k] = self._codificar(fila)
+        self._datos[:k, k] = self._codificar(columna)
+        self._datos[k, k] = 0
+
+
+# =============================================================================
+# MATRIZ APROXIMADA (ESCENARIOS MUY GRANDES)
+# =============================================================================
+class MatrizPerezosa:
+    """
+    Arranca con una estimación geométrica (haversine x factor de desvío calibrado)
+    y guarda tiempos exactos sólo para los pares que el solver termina usando.
+    Memoria O(n + pares exactos) en lugar de O(n^2).
+    """
+
+    def __init__(self, lats, lons, factor=FACTOR_DESVIO_INICIAL):
+        self.lats = np.asarray(lats, dtype=np.float64)
+        self.lons = np.asarray(lons, dtype=np.float64)
+        self.factor = factor
+        self.exactos = {}
+        self._muestras = []  # razones exacto / recta para recalibrar el factor
+        self.vel = VEL_CALLE_KMH / 3.6
+
+    @property
+    def n(self):
+        return len(self.lats)
+
+    @property
+    def nbytes(self):
+        return self.lats.nbytes + self.lons.nbytes + 80 * len(self.exactos)
+
+    def __len__(self):
+        return self.n
+
+    def _recta_s(self, i, j):
+        p1, p2 = math.radians(self.lats[i]), math.radians(self.lats[j])
+        dl = math.radians(self.lons[j] - self.lons[i])
+        a = math.sin((p2 - p1) / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+        return 2 * 6371000.0 * math.asin(math.sqrt(a)) / self.vel
+
+    def valor(self, i, j):
+        if i == j: return 0.0
+        t = self.exactos.get((i, j))
+        if t is not None: return t
+        return self._recta_s(i, j) * self.factor
+
+    def __getitem__(self, i):
+        return self.fila_vista(i, range(self.n))
+
+    def fila_vista(self, i, idx):
+        return _FilaPerezosa(self, i, idx)
+
+    def vista(self, indices):
+        return VistaMatriz(self, indices)
+
+    def registrar_exacto(self, i, j, t):
+        self.exactos[(i, j)] = t
+        recta = self._recta_s(i, j)
+        if recta > 1 and t < SIN_CAMINO:
+            self._muestras.append(t / recta)
+            if len(self._muestras) % 8 == 0:
+                self.factor = float(np.median(self._muestras[-512:]))
+
+    def olvidar_filas(self, filas):
+        """Descarta los tiempos exactos que salen de `filas` (se vuelven a refinar al usarse)."""
+        self.exactos = {k: t for k, t in self.exactos.items() if k[0] not in filas}
+
+    def pares_pendientes(self, orden):
+        return [(a, b) for a, b in zip(orden, orden[1:]) if a != b and (a, b) not in self.exactos]
+
+    def agregar(self, lat, lon):
+        self.lats = np.append(self.lats, lat)
+        self.lons = np.append(self.lons, lon)
+
+
+class _FilaPerezosa:
+    __slots__ = ("m", "i", "idx")
+
+    def __init__(self, m, i, idx):
+        self.m, self.i, self.idx = m, i, idx
+
+    def __getitem__(self, b):
+        return self.m.valor(self.i, self.idx[b])
+
+
+# =============================================================================
+# SERIALIZACIÓN (ALMACÉN DE ESCENARIOS)
+# =============================================================================
+def matriz_a_bytes(m):
+    """npz sin pickle: la densa en su propio formato (float32/uint16) o la perezosa con sus exactos."""
+    buf = io.BytesIO()
+    if isinstance(m, MatrizPerezosa):
+        claves = list(m.exactos)
+        np.savez(buf, tipo=np.array("perezosa"), lats=m.lats, lons=m.lons, factor=np.array(m.factor),
+                 exactos_ij=np.array(claves, dtype=np.int64).reshape(-1, 2),
+                 exactos_t=np.array([m.exactos[k] for k in claves], dtype=np.float64),
+                 muestras=np.array(m._muestras, dtype=np.float64))
+    else:
+        np.savez(buf, tipo=np.array("densa"), formato=np.array(m.formato), datos=m.datos)
+    return buf.getvalue()
+
+
+def matriz_desde_bytes(datos):
+    with np.load(io.BytesIO(datos), allow_pickle=False) as z:
+        if str(z["tipo"]) == "perezosa":
+            m = MatrizPerezosa(z["lats"], z["lons"], float(z["factor"]))
+            m.exactos = {(int(i), int(j)): float(t) for (i, j), t in zip(z["exactos_ij"], z["exactos_t"])}
+            m._muestras = z["muestras"].tolist()
+            return m
+        return MatrizTiempos.desde_densa(z["datos"], str(z["formato"]))
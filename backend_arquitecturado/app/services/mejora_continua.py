@@ -0,0 +1,66 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from app.core.config import PRESUPUESTO_FONDO_S, REINTENTOS_ESCENARIO
+from app.services.logica_rutas import optimizar_indices, costo_ruta
+from app.services.escenarios import ConflictoEscenario
+
+# Un solo hilo: la mejora de fondo nunca compite consigo misma por la CPU
+_EJECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="mejora-rutas")
+# (sesion, clave) -> argumentos de la última petición; una sola tarea en cola por ruta
+_PENDIENTES = {}
+_PENDIENTES_LOCK = threading.Lock()
+
+
+def firma_ruta(indices, inicio, fin, restricciones=None):
+    """Identifica el problema de una ruta; las ventanas sólo entran si las hay (cambian el óptimo)."""
+    huella = restricciones.huella if restricciones is not None else None
+    return (tuple(sorted(indices)), inicio, fin) if huella is None else (tuple(sorted(indices)), inicio, fin, huella)
+
+
+def _vigente(cache, clave, matriz, firma):
+    """El plan guardado de `clave` si sigue siendo el mismo problema sobre la misma matriz limpia."""
+    actual = cache.get("ordenes", {}).get(clave)
+    if not actual or actual["firma"] != firma: return None
+    if cache.get("full_matrix_time") is not matriz or cache.get("filas_sucias"): return None
+    return actual
+
+
+def _mejorar(almacen, sesion, clave):
+    with _PENDIENTES_LOCK: matriz, indices, inicio, fin, restricciones = _PENDIENTES.pop((sesion, clave))
+    try:
+        firma = firma_ruta(indices, inicio, fin, restricciones)
+        # Con el candado: espera a que la petición que la programó termine y guarde
+        with almacen.editar(sesion) as cache: actual = _vigente(cache, clave, matriz, firma)
+        if actual is None: return
+        vista = matriz.vista(indices)
+        orden = optimizar_indices(indices, vista, inicio, fin, asimetrico=True, presupuesto_s=PRESUPUESTO_FONDO_S,
+                                  orden_previo=actual["orden"], restricciones=restricciones)
+        pos = {g: i for i, g in enumerate(indices)}
+        costo = costo_ruta([pos[g] for g in orden], vista, restricciones)
+        # Se aplica como cualquier acción: con el candado de la sesión y guardando con control de rev.
+        # Sólo si la ruta sigue siendo la misma y el orden nuevo es mejor que lo que haya ahora.
+        for _ in range(REINTENTOS_ESCENARIO):
+            try:
+                with almacen.editar(sesion) as cache:
+                    actual = _vigente(cache, clave, matriz, firma)
+                    if actual is None or costo >= actual["costo"] - 1e-6: return
+                    cache["ordenes"][clave] = {"orden": orden, "costo": costo, "firma": actual["firma"]}
+                print(f">>> 🔁 MEJORA EN FONDO [{sesion or 'navegador'}/{clave}]: "
+                      f"{actual['costo']/60:.1f} -> {costo/60:.1f} min de costo")
+                return
+            except ConflictoEscenario:
+                continue  # otro worker guardó la sesión: se revisa otra vez sobre su estado
+    except Exception as e:
+        print(f"⚠️ Error en mejora de fondo [{clave}]: {e}")
+
+
+def programar_mejora(almacen, sesion, clave, matriz, indices, inicio, fin, restricciones=None):
+    """
+    Sigue puliendo la ruta `clave` de la sesión en segundo plano; la próxima petición arranca desde el resultado.
+    Varios clics seguidos sobre la misma ruta se juntan en una sola tarea con los datos del último.
+    """
+    marca = (sesion, clave)
+    with _PENDIENTES_LOCK:
+        en_cola = marca in _PENDIENTES
+        _PENDIENTES[marca] = (matriz, list(indices), inicio, fin, restricciones)
+    if not en_cola: _EJECUTOR.submit(_mejorar, almacen, sesion, clave)
@@ -0,0 +1,161 @@
+# backend_arquitecturado/app/services/perfiles.py
+"""
+Perfiles de velocidad por hora del día (pico / valle / noche).
+
+Cada perfil es un arreglo de tiempos (segundos) indexado por el 'eid' de la arista, en
+paralelo al grafo: cambiar de perfil no recarga ni copia el grafo, sólo elige otro arreglo.
+Sin perfil (None) todo sigue usando el atributo travel_time.
+
+Los incidentes (services/incidentes.py) multiplican el tiempo de algunas aristas: el factor
+vivo se aplica a travel_time y a cada perfil, también a los que se calculen después.
+"""
+import hashlib
+import threading
+from array import array
+from datetime import datetime
+import numpy as np
+from app.core.config import PERFILES_VELOCIDAD, HORARIO_PERFILES, VEL_CALLE_KMH, VEL_AVENIDA_KMH
+from app.core.preparacion import nombre_via
+
+_PERFILES = {}        # nombre -> Perfil
+_PERFILES_GRAFO = None
+_FACTORES = {}        # eid -> factor vivo (incidentes); sin entrada = 1
+_TT_ORIGINAL = {}     # eid -> travel_time antes del primer incidente
+_LOCK = threading.Lock()
+
+
+class Perfil:
+    """
+    tiempos[eid]: segundos de cada arista con las velocidades del perfil (array 'd', 8 B por arista).
+    vel_max (m/s): la clase más rápida presente; acota la heurística de A*.
+    """
+    __slots__ = ("nombre", "tiempos", "vel_max")
+
+    def __init__(self, nombre, tiempos, vel_max):
+        self.nombre, self.tiempos, self.vel_max = nombre, tiempos, vel_max
+
+
+def clave_perfil(perfil):
+    """Parte de la llave de las cachés que dependen de los tiempos (None = travel_time)."""
+    return perfil.nombre if perfil is not None else None
+
+
+def firma_perfil(perfil):
+    """Clave estable entre procesos y reinicios: nombre + huella de sus velocidades (para archivos en disco)."""
+    if perfil is None: return "travel_time"
+    velocidades = repr(sorted(PERFILES_VELOCIDAD[perfil.nombre].items()))
+    return f"{perfil.nombre}_{hashlib.sha1(velocidades.encode()).hexdigest()[:8]}"
+
+
+def numerar_aristas(G):
+    # Artefactos anteriores a los perfiles no traen 'eid': se numeran una vez, sobre el mismo grafo
+    if 'num_aristas' in G.graph: return G.graph['num_aristas']
+    n = 0
+    for _, _, d in G.edges(data=True):
+        d['eid'] = n; n += 1
+    G.graph['num_aristas'] = n
+    return n
+
+
+def _kmh(velocidades, highway):
+    clase = nombre_via(highway)
+    base = clase[:-len('_link')] if clase.endswith('_link') else clase
+    return velocidades.get(base, velocidades['otro'])
+
+
+def _calcular(G, nombre):
+    velocidades = PERFILES_VELOCIDAD[nombre]
+    n = numerar_aristas(G)
+    largos, kmh = np.zeros(n), np.zeros(n)
+    por_tipo = {}
+    for _, _, d in G.edges(data=True):
+        tipo = d.get('highway')
+        v = por_tipo.get(tipo) if not isinstance(tipo, list) else None
+        if v is None:
+            v = _kmh(velocidades, tipo)
+            if not isinstance(tipo, list): por_tipo[tipo] = v
+        largos[d['eid']] = d.get('length', 10)
+        kmh[d['eid']] = v
+    tiempos = largos / (kmh / 3.6) if n else largos
+    for eid, f in _FACTORES.items(): tiempos[eid] *= f
+    return Perfil(nombre, array('d', tiempos.tobytes()), float(kmh.max() if n else max(velocidades.values())) / 3.6)
+
+
+def _reiniciar_si_cambio(G):
+    global _PERFILES_GRAFO
+    if _PERFILES_GRAFO is not G:
+        _PERFILES.clear(); _FACTORES.clear(); _TT_ORIGINAL.clear(); _PERFILES_GRAFO = G
+
+
+def get_perfil(G, nombre):
+    """Perfil `nombre` sobre el grafo, calculado una vez (None -> sin perfil)."""
+    if nombre is None: return None
+    if nombre not in PERFILES_VELOCIDAD: raise ValueError(f"Perfil desconocido: {nombre}")
+    with _LOCK:
+        _reiniciar_si_cambio(G)
+        perfil = _PERFILES.get(nombre)
+        if perfil is None:
+            perfil = _PERFILES[nombre] = _calcular(G, nombre)
+            print(f">>> 🕒 PERFIL '{nombre}': {len(perfil.tiempos)} aristas | vel. máx {perfil.vel_max*3.6:.0f} km/h")
+    return perfil
+
+
+def perfiles_calculados(G):
+    """Perfiles ya calculados sobre el grafo (los demás se calculan al pedirlos)."""
+    return list(_PERFILES.values()) if _PERFILES_GRAFO is G else []
+
+
+def tiempos_alterados(G):
+    """True si hay incidentes vivos: los tiempos ya no son los del grafo tal como se cargó."""
+    return _PERFILES_GRAFO is G and bool(_FACTORES)
+
+
+def vel_max_global():
+    """Velocidad (m/s) que ninguna arista supera en ningún perfil: cota para podas geométricas."""
+    return max([VEL_AVENIDA_KMH, VEL_CALLE_KMH] + [v for vs in PERFILES_VELOCIDAD.values() for v in vs.values()]) / 3.6
+
+
+def poner_factores(G, aristas, factores):
+    """
+    Reescribe en su lugar el tiempo de `aristas` ({eid: datos}) con `factores` ({eid: factor}, 1 = normal):
+    travel_time y cada perfil calculado. Devuelve {eid: (tiempo_antes, tiempo_ahora)} en travel_time.
+    """
+    cambios = {}
+    with _LOCK:
+        _reiniciar_si_cambio(G)
+        for eid, d in aristas.items():
+            f = factores.get(eid, 1.0)
+            previo = _FACTORES.get(eid, 1.0)
+            if f == previo: continue
+            original = _TT_ORIGINAL.setdefault(eid, d.get('travel_time', 1))
+            antes = d.get('travel_time', 1)
+            d['travel_time'] = original * f
+            for p in _PERFILES.values():
+                p.tiempos[eid] = d.get('length', 10) / (_kmh(PERFILES_VELOCIDAD[p.nombre], d.get('highway')) / 3.6) * f
+            if f == 1.0: _FACTORES.pop(eid, None); _TT_ORIGINAL.pop(eid, None)
+            else: _FACTORES[eid] = f
+            cambios[eid] = (antes, d['travel_time'])
+    return cambios
+
+
+def perfil_por_hora(hora_salida):
+    """
+    Nombre del perfil para una hora de salida: "HH:MM", "HH" o fecha ISO ("2026-10-19T08:30").
+    Lanza ValueError si no se entiende.
+    """
+    texto = str(hora_salida).strip()
+    if "T" in texto or "-" in texto:
+        f = datetime.fromisoformat(texto)
+        hora = f.hour + f.minute / 60
+    else:
+        partes = texto.split(":")
+        hora = int(partes[0]) + (int(partes[1]) / 60 if len(partes) > 1 else 0)
+    for (inicio, fin), nombre in HORARIO_PERFILES:
+        if inicio <= hora < fin: return nombre
+    raise ValueError(f"Hora de salida fuera de HORARIO_PERFILES: {texto}")
+
+
+def perfil_para(G, hora_salida):
+    """Perfil que aplica a `hora_salida` (None si no se indicó hora)."""
+    if hora_salida is None: return None
+    return get_perfil(G, perfil_por_hora(hora_salida))
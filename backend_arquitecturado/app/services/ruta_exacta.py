@@ -0,0 +1,71 @@
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+from app.core.config import TAM_CACHE_EXACTO
+
+_MEMO = OrderedDict()  # (paradas, arranque, destino, huella de la submatriz) -> orden local
+_LOCK = threading.Lock()
+
+
+def _densa(sub_matriz, n):
+    return np.array([[sub_matriz[i][j] for j in range(n)] for i in range(n)], dtype=np.float64)
+
+
+def held_karp(D, inicio, fin=None):
+    """
+    Camino hamiltoniano de costo mínimo sobre la matriz D (asimétrica) que arranca en `inicio`
+    y, si se da, termina en `fin` (fin == inicio -> circuito). DP sobre subconjuntos,
+    vectorizado por capas: una operación numpy por (tamaño de subconjunto, último nodo).
+    """
+    n = len(D)
+    resto = [i for i in range(n) if i != inicio and i != fin]
+    k = len(resto)
+    if k == 0: return [inicio] if fin is None else [inicio, fin]
+    R = D[np.ix_(resto, resto)]
+    completo = (1 << k) - 1
+    dp = np.full((1 << k, k), np.inf)
+    padre = np.full((1 << k, k), -1, dtype=np.int16)
+    bits = 1 << np.arange(k)
+    dp[bits, np.arange(k)] = D[inicio, resto]
+
+    mascaras = np.arange(1 << k)
+    tam = np.array([bin(m).count("1") for m in range(1 << k)])
+    for c in range(2, k + 1):
+        capa = mascaras[tam == c]
+        for j in range(k):
+            con_j = capa[(capa & bits[j]) != 0]
+            previo = con_j ^ bits[j]
+            cand = dp[previo] + R[:, j][None, :]
+            mejor = np.argmin(cand, axis=1)
+            dp[con_j, j] = cand[np.arange(len(con_j)), mejor]
+            padre[con_j, j] = mejor
+
+    cierre = dp[completo] + (D[resto, fin] if fin is not None else 0)
+    j = int(np.argmin(cierre))
+    orden, mascara = [], completo
+    while j != -1:
+        orden.append(resto[j])
+        j, mascara = int(padre[mascara, j]), mascara ^ int(bits[j])
+    orden = [inicio] + orden[::-1]
+    if fin is not None: orden.append(fin)
+    return orden
+
+
+def orden_exacto(indices_activos, sub_matriz, inicio, fin=None):
+    """
+    Orden óptimo (posiciones locales) con memo: la clave incluye una huella de la
+    submatriz, así que si los tiempos cambian (p. ej. refinado exacto) se recalcula.
+    """
+    D = _densa(sub_matriz, len(indices_activos))
+    clave = (tuple(indices_activos), inicio, fin, hashlib.blake2b(D.tobytes(), digest_size=12).digest())
+    with _LOCK:
+        orden = _MEMO.get(clave)
+        if orden is not None:
+            _MEMO.move_to_end(clave)
+            return list(orden)
+    orden = held_karp(D, inicio, fin)
+    with _LOCK:
+        _MEMO[clave] = tuple(orden)
+        while len(_MEMO) > TAM_CACHE_EXACTO: _MEMO.popitem(last=False)
+    return orden
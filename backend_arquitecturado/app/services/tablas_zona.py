@@ -0,0 +1,215 @@
+# backend_arquitecturado/app/services/tablas_zona.py
+"""
+Tablas precalculadas por zona (COORDS_ZONAS): tiempo y metros de cada nodo de calle dentro de la
+caja de generación de la zona (+ MARGEN_ZONA) a cada otro, sobre el mapa completo.
+
+Casi todos los planes caen dentro de una zona: con su tabla, la matriz de generar_random /
+crear_manual y las filas de /tabla salen de leer, sin Dijkstra ni SQLite.
+
+- Disco: cache/zonas/<zona>_<firma perfil>/ con nodos.npy (int64 ordenados), tiempos.npy y
+  metros.npy (uint16: segundos y metros enteros, CENTINELA_U16 = sin camino) y meta.json.
+- Al arrancar se mapean en memoria (np.load mmap_mode='r'): no se copian y los workers
+  comparten las mismas páginas del sistema.
+- Vigencia: meta.json guarda la versión del grafo y la caja; si no coinciden la tabla se ignora
+  (estado "vieja") hasta reconstruirla. Con incidentes activos no se usan.
+- Los valores son los mismos que daría dijkstra_acotado (mismo motor), redondeados a enteros.
+"""
+import json
+import os
+import shutil
+import threading
+import time
+import numpy as np
+try:
+    import fcntl
+except ImportError:  # Windows: sin candado entre procesos
+    fcntl = None
+from app.core.config import (COORDS_ZONAS, OFFSET_ALEATORIO, OFFSET_POR_ZONA, MARGEN_ZONA, USAR_TABLAS_ZONA,
+                             PERFILES_ZONA, MAX_NODOS_ZONA)
+from app.core.mapa import CACHE_DIR
+from app.core.indice_espacial import get_indice
+from app.services.busqueda import dijkstra_acotado, metros_por_arbol
+from app.services.matriz_compacta import CENTINELA_U16
+from app.services.perfiles import firma_perfil, tiempos_alterados, get_perfil
+
+CARPETA_ZONAS = os.path.join(CACHE_DIR, "zonas")
+
+_TABLAS = {}   # firma del perfil -> [TablaZona]
+_LOCK = threading.Lock()
+
+
+def caja_zona(clave, margen=0.0):
+    """(min_lat, max_lat, min_lon, max_lon) donde generar_random pone puntos en la zona `clave`."""
+    centro = COORDS_ZONAS[clave]
+    off = OFFSET_POR_ZONA.get(clave, OFFSET_ALEATORIO) + margen
+    return centro["lat"] - off, centro["lat"] + off, centro["lon"] - off, centro["lon"] + off
+
+
+def _carpeta(zona, firma):
+    return os.path.join(CARPETA_ZONAS, f"{zona}_{firma}")
+
+
+def _meta_esperada(G, zona):
+    return {"version_grafo": G.graph.get('version_grafo'), "caja": [round(x, 7) for x in caja_zona(zona, MARGEN_ZONA)]}
+
+
+class TablaZona:
+    def __init__(self, carpeta, meta):
+        self.zona, self.firma = meta["zona"], meta["perfil"]
+        self.nodos = np.load(os.path.join(carpeta, "nodos.npy"))
+        self.tiempos = np.load(os.path.join(carpeta, "tiempos.npy"), mmap_mode='r')
+        self.metros = np.load(os.path.join(carpeta, "metros.npy"), mmap_mode='r')
+
+    @property
+    def nbytes(self):
+        return self.tiempos.nbytes + self.metros.nbytes
+
+    def posiciones(self, nodos):
+        """(posiciones, dentro): posición de cada nodo en la tabla y si de verdad está."""
+        nodos = np.asarray(nodos, dtype=np.int64)
+        pos = np.minimum(np.searchsorted(self.nodos, nodos), len(self.nodos) - 1)
+        return pos, self.nodos[pos] == nodos
+
+    def consultar(self, fijo, otros, por_origen):
+        """{otro: (tiempo, metros)} de fijo -> otros (o al revés); fuera de la tabla o sin camino no aparece."""
+        if not len(self.nodos): return {}
+        pos, dentro = self.posiciones([fijo])
+        if not dentro[0]: return {}
+        otros = np.fromiter(otros, dtype=np.int64)
+        pos_o, dentro_o = self.posiciones(otros)
+        otros, pos_o = otros[dentro_o], pos_o[dentro_o]
+        i = int(pos[0])
+        t = self.tiempos[i, pos_o] if por_origen else self.tiempos[pos_o, i]
+        m = self.metros[i, pos_o] if por_origen else self.metros[pos_o, i]
+        return {int(n): (float(a), None if b == CENTINELA_U16 else float(b))
+                for n, a, b in zip(otros.tolist(), t.tolist(), m.tolist()) if a != CENTINELA_U16}
+
+
+# =============================================================================
+# CARGA Y CONSULTA
+# =============================================================================
+def estado_tablas(G):
+    """{(zona, firma): "lista" | "vieja" | "falta"} para todas las zonas y PERFILES_ZONA."""
+    res = {}
+    for zona in COORDS_ZONAS:
+        esperada = _meta_esperada(G, zona)
+        for nombre in PERFILES_ZONA:
+            firma = firma_perfil(get_perfil(G, nombre))
+            ruta = os.path.join(_carpeta(zona, firma), "meta.json")
+            if not os.path.exists(ruta): res[(zona, firma)] = "falta"; continue
+            with open(ruta, encoding="utf-8") as f: meta = json.load(f)
+            vigente = all(meta.get(k) == v for k, v in esperada.items())
+            res[(zona, firma)] = "lista" if vigente else "vieja"
+    return res
+
+
+def cargar_tablas(G):
+    """Mapea en memoria las tablas vigentes (las viejas se ignoran). Devuelve cuántas quedaron."""
+    if not USAR_TABLAS_ZONA: return 0
+    tablas, estado = {}, estado_tablas(G)
+    for (zona, firma), e in estado.items():
+        if e != "lista": continue
+        carpeta = _carpeta(zona, firma)
+        with open(os.path.join(carpeta, "meta.json"), encoding="utf-8") as f: meta = json.load(f)
+        tablas.setdefault(firma, []).append(TablaZona(carpeta, meta))
+    with _LOCK:
+        _TABLAS.clear(); _TABLAS.update(tablas)
+    listas = sum(len(v) for v in tablas.values())
+    viejas = [f"{z}/{p}" for (z, p), e in estado.items() if e == "vieja"]
+    print(f">>> 🗺️ TABLAS POR ZONA: {listas}/{len(estado)} mapeadas "
+          f"({sum(t.nbytes for v in tablas.values() for t in v)/1e6:.0f} MB)" + (f" | viejas: {viejas}" if viejas else ""))
+    return listas
+
+
+def tablas_cargadas():
+    with _LOCK: return [t for v in _TABLAS.values() for t in v]
+
+
+def tiempos_zona(G, perfil, fijo, otros, por_origen=True):
+    """
+    {otro: (tiempo, metros)} conocidos por la tabla de zona que contiene a `fijo`
+    (sólo los `otros` de la misma zona). {} si no hay tabla o hay incidentes activos.
+    """
+    if not _TABLAS or tiempos_alterados(G): return {}
+    for tabla in _TABLAS.get(firma_perfil(perfil), ()):
+        res = tabla.consultar(fijo, otros, por_origen)
+        if res: return res
+    return {}
+
+
+# =============================================================================
+# CONSTRUCCIÓN
+# =============================================================================
+def nodos_zona(G, zona):
+    """Nodos (int64 ordenados) que cubre la tabla de la zona."""
+    return np.sort(np.unique(get_indice(G).nodos_en_caja(*caja_zona(zona, MARGEN_ZONA)).astype(np.int64)))
+
+
+def bytes_tabla(k):
+    """Bytes en disco (y mapeados) de la tabla de una zona con k nodos: tiempos + metros uint16."""
+    return 2 * k * k * np.dtype(np.uint16).itemsize
+
+
+def construir_tabla(G, zona, perfil=None, max_nodos=MAX_NODOS_ZONA):
+    """
+    Una búsqueda por nodo de la zona (parada temprana al asentar toda la zona) directo a un
+    .npy mapeado (no se arma en RAM). Se escribe en una carpeta temporal y se cambia al final:
+    quien tenga mapeada la versión anterior la sigue leyendo sin problema.
+    Con más de `max_nodos` nodos no se construye (crece con k²): devuelve None.
+    """
+    firma = firma_perfil(perfil)
+    nodos = nodos_zona(G, zona)
+    k = len(nodos)
+    if max_nodos and k > max_nodos:
+        print(f">>> ⚠️ TABLA {zona}/{firma} NO CONSTRUIDA: {k} nodos > {max_nodos} "
+              f"({bytes_tabla(k)/1e6:.0f} MB); sube MAX_NODOS_ZONA o achica la caja de la zona")
+        return None
+    final = _carpeta(zona, firma)
+    tmp = f"{final}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    np.save(os.path.join(tmp, "nodos.npy"), nodos)
+    tiempos = np.lib.format.open_memmap(os.path.join(tmp, "tiempos.npy"), mode="w+", dtype=np.uint16, shape=(k, k))
+    metros = np.lib.format.open_memmap(os.path.join(tmp, "metros.npy"), mode="w+", dtype=np.uint16, shape=(k, k))
+    lista = nodos.tolist()
+    objetivos = set(lista)
+    t0 = time.perf_counter()
+    print(f">>> 🏗️ TABLA {zona}/{firma}: {k} nodos ({bytes_tabla(k) / 1e6:.0f} MB)")
+    for i, u in enumerate(lista):
+        padres = {}
+        dist = dijkstra_acotado(G, u, objetivos, padres=padres, perfil=perfil)
+        mts = metros_por_arbol(G, dist, padres, u, perfil=perfil)
+        t = np.array([dist.get(v, np.inf) for v in lista])
+        m = np.array([mts.get(v, np.inf) for v in lista])
+        tiempos[i] = np.where(t < CENTINELA_U16, np.rint(t), CENTINELA_U16)
+        metros[i] = np.where(m < CENTINELA_U16, np.rint(m), CENTINELA_U16)
+        if k >= 10 and (i + 1) % (k // 10) == 0:
+            print(f"   - {zona}/{firma}: {i + 1}/{k} filas ({time.perf_counter() - t0:.0f}s)")
+    tiempos.flush(); metros.flush()
+    del tiempos, metros
+    with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({"zona": zona, "perfil": firma, "nodos": k, "bytes": bytes_tabla(k), "creado": time.time(),
+                   **_meta_esperada(G, zona)}, f)
+    viejo = f"{final}.viejo-{os.getpid()}"
+    if os.path.exists(final): os.rename(final, viejo)
+    os.rename(tmp, final)
+    shutil.rmtree(viejo, ignore_errors=True)
+    print(f">>> ✅ TABLA {zona}/{firma} lista en {time.perf_counter() - t0:.0f}s")
+    return final
+
+
+def precalcular_zonas(G, zonas=None, forzar=False, max_nodos=MAX_NODOS_ZONA):
+    """
+    Construye las tablas que faltan o están viejas (todas con forzar) y vuelve a mapearlas.
+    Un candado de archivo evita que varios workers construyan lo mismo: el que espera
+    encuentra las tablas ya listas.
+    """
+    os.makedirs(CARPETA_ZONAS, exist_ok=True)
+    with open(os.path.join(CARPETA_ZONAS, ".candado"), "w") as candado:
+        if fcntl is not None: fcntl.flock(candado, fcntl.LOCK_EX)
+        perfiles = {firma_perfil(get_perfil(G, n)): get_perfil(G, n) for n in PERFILES_ZONA}
+        for (zona, firma), e in estado_tablas(G).items():
+            if zonas and zona not in zonas: continue
+            if e == "lista" and not forzar: continue
+            construir_tabla(G, zona, perfiles[firma], max_nodos)
+    return cargar_tablas(G)
@@ -0,0 +1,332 @@
+# backend_arquitecturado/app/services/teselas.py
+"""
+Teselas vectoriales (Mapbox Vector Tile 2.1) de la red de calles, directo del grafo cargado.
+
+Dos capas: "avenidas" (TIPOS_AVENIDA) y "calles" (desde ZOOM_MIN_CALLES). Cada línea es una
+arista, y la ida y vuelta de una calle doble se dibuja una sola vez. Propiedades: tipo (highway).
+El id del feature es el eid de la arista.
+
+Las líneas se pasan una vez a Web Mercator (0..1) y se agrupan en cubetas a ZOOM_CUBETAS:
+una tesela sólo revisa sus cubetas. Al codificar se cuantizan a la rejilla de la tesela y se
+simplifican con Douglas-Peucker. La tolerancia es fija en píxeles, así que a menor zoom quedan
+menos puntos. El protobuf se escribe a mano, sin dependencias. Cada tesela se guarda en una LRU
+y, hasta ZOOM_MAX_DISCO_TESELAS, en cache/teselas/<versión>/z/x/y.mvt (al sembrar se borran
+las carpetas de otras versiones del grafo).
+"""
+import math
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from app.core.config import (ZOOM_MIN_TESELAS, ZOOM_MIN_CALLES, TOLERANCIA_TESELA_PX, TAM_CACHE_TESELAS,
+                             ZOOM_MAX_DISCO_TESELAS, COORDS_ZONAS, ZOOMS_SEMBRAR, RADIO_SEMBRAR)
+from app.core.mapa import CACHE_DIR
+from app.core.preparacion import nombre_via, es_avenida
+
+EXTENSION = 4096      # unidades por lado de tesela (estándar MVT)
+MARGEN = 64           # unidades fuera del borde que todavía se incluyen (sin cortes en las uniones)
+ZOOM_CUBETAS = 14
+ZOOM_MAX = 22
+TIPO_MVT = "application/vnd.mapbox-vector-tile"
+CARPETA_TESELAS = os.path.join(CACHE_DIR, "teselas")
+
+_RED = None           # (grafo, {"avenidas": _Capa, "calles": _Capa, "caja": (mín, máx) en Mercator})
+_TESELAS = OrderedDict()  # (versión, z, x, y) -> bytes
+_LOCK = threading.Lock()
+
+
+def _mercator(lons, lats):
+    x = (np.asarray(lons) + 180.0) / 360.0
+    s = np.sin(np.radians(np.clip(lats, -85.05112878, 85.05112878)))
+    y = 0.5 - np.log((1 + s) / (1 - s)) / (4 * math.pi)
+    return np.column_stack([x, y])
+
+
+# =============================================================================
+# RED EN MERCATOR (UNA VEZ POR GRAFO)
+# =============================================================================
+class _Capa:
+    """Puntos de todas las líneas concatenados; inicio[i]:inicio[i+1] es la línea i."""
+
+    def __init__(self, lineas, tipos, eids):
+        self.inicio = np.cumsum([0] + [len(l) for l in lineas]).astype(np.int64)
+        self.xy = _mercator(*np.concatenate(lineas).T) if lineas else np.empty((0, 2))
+        self.tipos = np.array(tipos, dtype=object)
+        self.eids = np.array(eids, dtype=np.int64)
+        if lineas:
+            self.minimo = np.minimum.reduceat(self.xy, self.inicio[:-1])
+            self.maximo = np.maximum.reduceat(self.xy, self.inicio[:-1])
+        else:
+            self.minimo = self.maximo = np.empty((0, 2))
+        n = 2 ** ZOOM_CUBETAS
+        c0 = np.clip(np.floor(self.minimo * n), 0, n - 1).astype(np.int64)
+        c1 = np.clip(np.floor(self.maximo * n), 0, n - 1).astype(np.int64)
+        cubetas = {}
+        for i in range(len(lineas)):
+            for cx in range(c0[i, 0], c1[i, 0] + 1):
+                for cy in range(c0[i, 1], c1[i, 1] + 1):
+                    cubetas.setdefault((cx, cy), []).append(i)
+        self.cubetas = {k: np.array(v, dtype=np.int64) for k, v in cubetas.items()}
+
+    def __len__(self):
+        return len(self.eids)
+
+    def en_caja(self, z, x, y):
+        """Índices de las líneas cuya caja toca la tesela (con MARGEN)."""
+        if z <= ZOOM_CUBETAS:
+            d = 2 ** (ZOOM_CUBETAS - z)
+            trozos = [self.cubetas[(cx, cy)] for cx in range(x * d, (x + 1) * d) for cy in range(y * d, (y + 1) * d)
+                      if (cx, cy) in self.cubetas]
+        else:
+            d = z - ZOOM_CUBETAS
+            trozos = [self.cubetas.get((x >> d, y >> d), np.empty(0, dtype=np.int64))]
+        if not trozos: return np.empty(0, dtype=np.int64)
+        idx = np.unique(np.concatenate(trozos))
+        lado = 1.0 / 2 ** z
+        m = lado * MARGEN / EXTENSION
+        x0, y0 = x * lado - m, y * lado - m
+        x1, y1 = (x + 1) * lado + m, (y + 1) * lado + m
+        toca = (self.maximo[idx, 0] >= x0) & (self.minimo[idx, 0] <= x1) & \
+               (self.maximo[idx, 1] >= y0) & (self.minimo[idx, 1] <= y1)
+        return idx[toca]
+
+
+def _construir_red(G):
+    t0 = time.time()
+    capas = {"avenidas": ([], [], []), "calles": ([], [], [])}
+    vistas = set()
+    for u, v, d in G.edges(data=True):
+        # La vuelta de una calle doble tiene la misma geometría al revés: se dibuja una vez
+        clave = (min(u, v), max(u, v), round(d.get('length', 0), 1))
+        if clave in vistas: continue
+        vistas.add(clave)
+        geom = d.get('geometry')
+        if geom is not None: pts = np.asarray(geom.coords, dtype=np.float64)
+        else:
+            nu, nv = G.nodes[u], G.nodes[v]
+            pts = np.array([[nu['x'], nu['y']], [nv['x'], nv['y']]])
+        lineas, tipos, eids = capas["avenidas" if es_avenida(d.get('highway')) else "calles"]
+        lineas.append(pts); tipos.append(nombre_via(d.get('highway'))); eids.append(d.get('eid', 0))
+    red = {nombre: _Capa(*datos) for nombre, datos in capas.items()}
+    xy = np.concatenate([c.xy for c in red.values()])
+    red["caja"] = (xy.min(axis=0), xy.max(axis=0)) if len(xy) else (np.ones(2), np.zeros(2))
+    print(f">>> 🧱 RED PARA TESELAS: {len(red['avenidas'])} avenidas + {len(red['calles'])} calles "
+          f"en {time.time()-t0:.1f}s")
+    return red
+
+
+def get_red(G):
+    global _RED
+    if _RED is not None and _RED[0] is G: return _RED[1]
+    with _LOCK:
+        if _RED is None or _RED[0] is not G:
+            _RED = (G, _construir_red(G))
+            _TESELAS.clear()
+    return _RED[1]
+
+
+# =============================================================================
+# SIMPLIFICACIÓN (DOUGLAS-PEUCKER EN UNIDADES DE TESELA)
+# =============================================================================
+def _simplificar(pts, tol):
+    if len(pts) <= 2: return pts
+    conservar = np.zeros(len(pts), dtype=bool)
+    conservar[0] = conservar[-1] = True
+    pila = [(0, len(pts) - 1)]
+    while pila:
+        a, b = pila.pop()
+        if b - a < 2: continue
+        p, q = pts[a].astype(np.float64), pts[b].astype(np.float64)
+        seg = q - p
+        medio = pts[a + 1:b] - p
+        largo = math.hypot(seg[0], seg[1])
+        dist = np.abs(seg[0] * medio[:, 1] - seg[1] * medio[:, 0]) / largo if largo else np.hypot(medio[:, 0], medio[:, 1])
+        k = int(np.argmax(dist))
+        if dist[k] > tol:
+            conservar[a + 1 + k] = True
+            pila.append((a, a + 1 + k)); pila.append((a + 1 + k, b))
+    return pts[conservar]
+
+
+# =============================================================================
+# CODIFICACIÓN PROTOBUF (MVT 2.1)
+# =============================================================================
+def _varint(n, buf):
+    while n > 0x7F:
+        buf.append((n & 0x7F) | 0x80); n >>= 7
+    buf.append(n)
+
+
+def _bytes(campo, datos, buf):
+    _varint((campo << 3) | 2, buf); _varint(len(datos), buf); buf += datos
+
+
+def _zz(n):
+    return (n << 1) ^ (n >> 31)
+
+
+def _empacar(numeros):
+    b = bytearray()
+    for n in numeros: _varint(n, b)
+    return b
+
+
+def _geometria(partes):
+    """Por parte: MoveTo + LineTo; los deltas (zigzag) siguen al cursor de la parte anterior."""
+    g = bytearray()
+    cx = cy = 0
+    for pts in partes:
+        _varint(9, g)  # MoveTo, 1 punto
+        x0, y0 = int(pts[0, 0]), int(pts[0, 1])
+        _varint(_zz(x0 - cx), g); _varint(_zz(y0 - cy), g)
+        _varint(2 | ((len(pts) - 1) << 3), g)
+        for dx, dy in np.diff(pts, axis=0).tolist():
+            _varint(_zz(dx), g); _varint(_zz(dy), g)
+        cx, cy = int(pts[-1, 0]), int(pts[-1, 1])
+    return g
+
+
+def _recortar(pts):
+    """
+    Tramos de la línea cuyos segmentos tocan la tesela (con MARGEN). Las avenidas largas
+    no arrastran puntos lejanos: a zoom alto las coordenadas seguirían cabiendo en 32 bits.
+    """
+    a, b = pts[:-1], pts[1:]
+    lo, hi = -MARGEN, EXTENSION + MARGEN
+    toca = (np.maximum(a[:, 0], b[:, 0]) >= lo) & (np.minimum(a[:, 0], b[:, 0]) <= hi) & \
+           (np.maximum(a[:, 1], b[:, 1]) >= lo) & (np.minimum(a[:, 1], b[:, 1]) <= hi)
+    if toca.all(): return [pts]
+    bordes = np.flatnonzero(np.diff(np.r_[0, toca.astype(np.int8), 0]))
+    return [pts[s:e + 1] for s, e in zip(bordes[::2], bordes[1::2])]
+
+
+def _capa(nombre, capa, z, x, y):
+    idx = capa.en_caja(z, x, y)
+    if not len(idx): return None
+    escala = 2 ** z * EXTENSION
+    origen = np.array([x * EXTENSION, y * EXTENSION], dtype=np.float64)
+    tol = TOLERANCIA_TESELA_PX * EXTENSION / 256
+    valores = {}
+    cuerpo = bytearray()
+    num = 0
+    for i in idx.tolist():
+        pts = np.rint(capa.xy[capa.inicio[i]:capa.inicio[i + 1]] * escala - origen).astype(np.int64)
+        pts = pts[np.r_[True, np.any(pts[1:] != pts[:-1], axis=1)]]
+        if len(pts) < 2: continue  # a este zoom la línea cabe en un solo punto
+        partes = [_simplificar(p, tol) for p in _recortar(pts)]
+        if not partes: continue
+        tipo = capa.tipos[i]
+        if tipo not in valores: valores[tipo] = len(valores)
+        f = bytearray()
+        _varint((1 << 3) | 0, f); _varint(int(capa.eids[i]), f)           # id
+        _bytes(2, _empacar([0, valores[tipo]]), f)                         # tags: tipo = valor
+        _varint((3 << 3) | 0, f); _varint(2, f)                             # LINESTRING
+        _bytes(4, _geometria(partes), f)
+        _bytes(2, f, cuerpo)
+        num += 1
+    if not num: return None
+    buf = bytearray()
+    _varint((15 << 3) | 0, buf); _varint(2, buf)       # version
+    _bytes(1, nombre.encode(), buf)
+    buf += cuerpo
+    _bytes(3, b"tipo", buf)
+    for tipo in valores:
+        v = bytearray(); _bytes(1, tipo.encode(), v)
+        _bytes(4, v, buf)
+    _varint((5 << 3) | 0, buf); _varint(EXTENSION, buf)
+    return buf
+
+
+def generar_tesela(G, z, x, y):
+    """Bytes MVT de la tesela (b"" si no hay nada que dibujar)."""
+    if z < ZOOM_MIN_TESELAS: return b""
+    red = get_red(G)
+    tesela = bytearray()
+    for nombre in ("calles", "avenidas"):  # las avenidas al final: se pintan encima
+        if nombre == "calles" and z < ZOOM_MIN_CALLES: continue
+        capa = _capa(nombre, red[nombre], z, x, y)
+        if capa is not None: _bytes(3, capa, tesela)
+    return bytes(tesela)
+
+
+# =============================================================================
+# CACHÉ (LRU + DISCO)
+# =============================================================================
+def version_teselas(G):
+    return G.graph.get('version_grafo', 'sinversion')
+
+
+def _fuera_de_red(G, z, x, y):
+    minimo, maximo = get_red(G)["caja"]
+    lado = 1.0 / 2 ** z
+    return x * lado > maximo[0] or (x + 1) * lado < minimo[0] or y * lado > maximo[1] or (y + 1) * lado < minimo[1]
+
+
+def obtener_tesela(G, z, x, y):
+    """
+    Tesela de la LRU, de cache/teselas/ o recién generada (y guardada en ambas; en disco sólo
+    hasta ZOOM_MAX_DISCO_TESELAS). Las que quedan fuera del mapa o bajo ZOOM_MIN_TESELAS salen
+    vacías sin tocar caché ni disco.
+    """
+    if z < ZOOM_MIN_TESELAS or _fuera_de_red(G, z, x, y): return b""
+    clave = (version_teselas(G), z, x, y)
+    datos = _TESELAS.get(clave)
+    if datos is not None:
+        with _LOCK:
+            if clave in _TESELAS: _TESELAS.move_to_end(clave)
+        return datos
+    ruta = os.path.join(CARPETA_TESELAS, clave[0], str(z), str(x), f"{y}.mvt") if z <= ZOOM_MAX_DISCO_TESELAS else None
+    if ruta is None:
+        datos = generar_tesela(G, z, x, y)
+    elif os.path.exists(ruta):
+        with open(ruta, "rb") as f: datos = f.read()
+    else:
+        datos = generar_tesela(G, z, x, y)
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        temporal = f"{ruta}.{os.getpid()}.{threading.get_ident()}"
+        with open(temporal, "wb") as f: f.write(datos)
+        os.replace(temporal, ruta)  # atómico: otro worker nunca lee una tesela a medias
+    with _LOCK:
+        _TESELAS[clave] = datos
+        while len(_TESELAS) > TAM_CACHE_TESELAS: _TESELAS.popitem(last=False)
+    return datos
+
+
+def copia_teselas():
+    with _LOCK: return list(_TESELAS.values())
+
+
+def tesela_valida(z, x, y):
+    return 0 <= z <= ZOOM_MAX and 0 <= x < 2 ** z and 0 <= y < 2 ** z
+
+
+def _teselas_en_caja(z, min_lat, max_lat, min_lon, max_lon):
+    (x0, y0), (x1, y1) = (np.floor(_mercator([min_lon, max_lon], [max_lat, min_lat]) * 2 ** z)).astype(int)
+    return [(x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)]
+
+
+def purgar_teselas(G):
+    """Borra de disco las teselas de otras versiones del grafo (nunca se vuelven a leer)."""
+    if not os.path.isdir(CARPETA_TESELAS): return 0
+    viejas = [d for d in os.listdir(CARPETA_TESELAS) if d != version_teselas(G)]
+    for d in viejas: shutil.rmtree(os.path.join(CARPETA_TESELAS, d), ignore_errors=True)
+    if viejas: print(f">>> 🧹 TESELAS DE OTRAS VERSIONES BORRADAS: {viejas}")
+    return len(viejas)
+
+
+def sembrar_teselas(G, zooms=ZOOMS_SEMBRAR, radio=RADIO_SEMBRAR):
+    """Genera de antemano las teselas alrededor de cada zona de COORDS_ZONAS."""
+    purgar_teselas(G)
+    t0 = time.time()
+    total = 0
+    for z in zooms:
+        pendientes = set()
+        for zona in COORDS_ZONAS.values():
+            pendientes.update(_teselas_en_caja(z, zona["lat"] - radio, zona["lat"] + radio,
+                                               zona["lon"] - radio, zona["lon"] + radio))
+        for x, y in sorted(pendientes): obtener_tesela(G, z, x, y)
+        total += len(pendientes)
+    print(f">>> 🧱 TESELAS SEMBRADAS: {total} (zooms {list(zooms)}) en {time.time()-t0:.1f}s")
+    return total
@@ -0,0 +1,142 @@
+import math
+import threading
+from collections import OrderedDict
+import numpy as np
+from app.core.config import TAM_CACHE_TRAMOS, TAM_CELDA_INDICE
+from app.services.busqueda import arista_elegida, medir_camino
+from app.services.busqueda_dirigida import camino_mas_corto, _coords_metricas
+from app.services.perfiles import clave_perfil, vel_max_global
+from app.services.cache_tiempos import camino_guardado, guardar_camino
+
+_TRAMOS = OrderedDict()   # (perfil, u, v) -> {"path", "dist_m", "tiempo_s", "coords", "celdas"}
+_TRAMOS_GRAFO = None
+_USO_CELDAS = {}          # celda de la rejilla -> claves de los tramos que pasan por ella
+_LOCK = threading.Lock()  # protege _TRAMOS y _USO_CELDAS (la búsqueda corre fuera del candado)
+
+
+# =============================================================================
+# FUNCION AUXILIAR: TRAZADO SUAVE
+# =============================================================================
+def obtener_coords_suaves(G, lista_nodos, perfil=None):
+    coords_suaves = []
+    if not lista_nodos: return coords_suaves
+    start_node = G.nodes[lista_nodos[0]]
+    coords_suaves.append([start_node['y'], start_node['x']])
+    for i in range(len(lista_nodos) - 1):
+        try:
+            edge_data = arista_elegida(G, lista_nodos[i], lista_nodos[i+1], perfil)
+            if 'geometry' in edge_data:
+                for lon, lat in edge_data['geometry'].coords:
+                    coords_suaves.append([lat, lon])
+            else:
+                node_v = G.nodes[lista_nodos[i+1]]
+                coords_suaves.append([node_v['y'], node_v['x']])
+        except: pass
+    return coords_suaves
+
+
+# =============================================================================
+# CACHÉ DE TRAMOS
+# =============================================================================
+def obtener_tramo(G, u, v, perfil=None):
+    """
+    Camino más rápido u -> v con su distancia y tiempo, recordado entre peticiones (por perfil)
+    y en la caché en disco (services/cache_tiempos.py), que sobrevive reinicios.
+    Lanza la misma excepción que camino_mas_corto si no hay camino.
+    """
+    global _TRAMOS_GRAFO
+    clave = (clave_perfil(perfil), u, v)
+    with _LOCK:
+        if _TRAMOS_GRAFO is not G:
+            _TRAMOS.clear(); _USO_CELDAS.clear(); _TRAMOS_GRAFO = G
+        tramo = _TRAMOS.get(clave)
+        if tramo is not None:
+            _TRAMOS.move_to_end(clave)
+            return tramo
+
+    guardado = camino_guardado(G, perfil, u, v)
+    if guardado is not None:
+        path, t_s, d_m = guardado
+    else:
+        path = camino_mas_corto(G, u, v, perfil=perfil)
+        d_m, t_s = medir_camino(G, path, perfil)
+        guardar_camino(G, perfil, u, v, path, t_s, d_m)
+    tramo = {"path": path, "dist_m": d_m, "tiempo_s": t_s, "coords": None, "celdas": {_celda(G, n) for n in path}}
+    with _LOCK:
+        if clave in _TRAMOS: _quitar(clave, _TRAMOS[clave])
+        _TRAMOS[clave] = tramo
+        for c in tramo["celdas"]: _USO_CELDAS.setdefault(c, set()).add(clave)
+        if len(_TRAMOS) > TAM_CACHE_TRAMOS: _quitar(*_TRAMOS.popitem(last=False))
+    return tramo
+
+
+def copia_tramos():
+    """Lista (clave, tramo) tomada bajo el candado, para medir o recorrer sin carreras."""
+    with _LOCK: return list(_TRAMOS.items())
+
+
+def _celda(G, n):
+    d = G.nodes[n]
+    return math.floor(d['x'] / TAM_CELDA_INDICE), math.floor(d['y'] / TAM_CELDA_INDICE)
+
+
+def _quitar(clave, tramo):
+    for c in tramo["celdas"]:
+        claves = _USO_CELDAS.get(c)
+        if claves is not None:
+            claves.discard(clave)
+            if not claves: del _USO_CELDAS[c]
+
+
+# =============================================================================
+# INVALIDACIÓN (INCIDENTES)
+# =============================================================================
+def invalidar_tramos(G, subidas, bajadas):
+    """
+    Descarta los tramos que dependen de aristas cuyo tiempo cambió; se recalculan al pedirlos.
+    subidas (pares u -> v más lentos): sólo los tramos cuyo camino usa la arista
+    (índice por celda de rejilla y luego revisión exacta del camino).
+    bajadas (más rápidos): los que podrían acortarse pasando por ella, con la cota
+    geométrica d(u, a) + d(b, v) a la velocidad máxima contra el tiempo guardado.
+    Devuelve cuántos tramos se descartaron.
+    """
+    with _LOCK:
+        if _TRAMOS_GRAFO is not G or not _TRAMOS: return 0
+        return _invalidar(G, subidas, bajadas)
+
+
+def _invalidar(G, subidas, bajadas):
+    caen = set()
+    if subidas:
+        pares = set(subidas)
+        candidatos = set()
+        for a, _ in pares: candidatos |= _USO_CELDAS.get(_celda(G, a), set())
+        for clave in candidatos:
+            path = _TRAMOS[clave]["path"]
+            if any(par in pares for par in zip(path, path[1:])): caen.add(clave)
+    if bajadas:
+        xy = _coords_metricas(G)
+        claves = list(_TRAMOS)
+        origen = np.array([xy[c[1]] for c in claves])
+        destino = np.array([xy[c[2]] for c in claves])
+        tiempo = np.array([_TRAMOS[c]["tiempo_s"] for c in claves]) * vel_max_global()
+        for a, b in set(bajadas):
+            alcanza = np.hypot(*(origen - xy[a]).T) + np.hypot(*(destino - xy[b]).T) <= tiempo
+            caen.update(claves[k] for k in np.flatnonzero(alcanza))
+    for clave in caen: _quitar(clave, _TRAMOS.pop(clave))
+    return len(caen)
+
+
+def coords_tramo(G, tramo, perfil=None):
+    if tramo["coords"] is None: tramo["coords"] = obtener_coords_suaves(G, tramo["path"], perfil)
+    return tramo["coords"]
+
+
+def coords_ruta(G, ruta_nodos, perfil=None):
+    """Geometría completa de una ruta (lista de nodos de parada) desde la caché de tramos."""
+    coords = []
+    for u, v in zip(ruta_nodos[:-1], ruta_nodos[1:]):
+        try:
+            coords.extend(coords_tramo(G, obtener_tramo(G, u, v, perfil), perfil))
+        except: pass
+    return coords
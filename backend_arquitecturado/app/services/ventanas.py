@@ -0,0 +1,198 @@
+# backend_arquitecturado/app/services/ventanas.py
+"""
+Tiempos de servicio por parada y ventanas de entrega [abre, cierra] (segundos desde la salida).
+
+Las ventanas son suaves: llegar antes obliga a esperar; llegar tarde se cobra como
+"tiempo de retraso" (time warp: el reloj se regresa a `cierra` y la ruta sigue desde ahí),
+de modo que un retraso no se arrastra a todas las paradas siguientes.
+Costo de una ruta = manejo + PESO_TARDANZA * retraso.
+
+Para evaluar un movimiento (or-opt / 2-opt) en O(1) sin volver a simular la ruta, cada tramo
+contiguo se resume en una tupla y dos resúmenes se concatenan en O(1):
+    (primero, ultimo, manejo, duracion, retraso, temprano, tarde)
+- duracion: manejo + servicio + esperas forzosas del tramo.
+- temprano / tarde: a qué hora se puede empezar el tramo sin esperar / sin llegar tarde.
+Con los resúmenes de prefijos y sufijos de la ruta actual, cualquier movimiento es
+prefijo + (1-3 piezas) + sufijo. Cada movimiento se descarta primero con una cota (manejo exacto
++ retraso de las piezas, que sólo puede crecer al unirlas: 3 lecturas de la matriz) y sólo los que
+la pasan se concatenan, sin armar tuplas intermedias (_valor_cadena).
+El costo de UNA ruta completa (costo) se simula directo: ahí los resúmenes no ahorran nada.
+Contra re-simular cada movimiento (herramientas/oraculo.py): parejo hacia 12 paradas (armar
+prefijos y sufijos tras cada mejora domina), ~3x con 30 y ~6x con 60.
+"""
+import hashlib
+from app.core.config import PESO_TARDANZA
+
+INF = float('inf')
+
+
+class Restricciones:
+    """
+    Servicio (s) y ventana por posición local (la de `indices_activos` / la submatriz).
+    Sin ventanas el servicio suma lo mismo en cualquier orden y el solver no cambia.
+    """
+    __slots__ = ("servicio", "abre", "cierra", "hay_ventanas", "huella")
+
+    def __init__(self, servicio, ventanas=None):
+        n = len(servicio)
+        ventanas = ventanas or [None] * n
+        self.servicio = [float(s) for s in servicio]
+        self.abre = [float(v[0]) if v else 0.0 for v in ventanas]
+        self.cierra = [float(v[1]) if v and v[1] is not None else INF for v in ventanas]
+        self.hay_ventanas = any(v is not None for v in ventanas)
+        # Para la firma de la ruta: sólo cuenta si cambia el orden óptimo (es decir, si hay ventanas)
+        self.huella = hashlib.md5(repr((self.servicio, self.abre, self.cierra)).encode()).hexdigest()[:12] \
+            if self.hay_ventanas else None
+
+
+def nodo(r, k):
+    return (k, k, 0.0, r.servicio[k], 0.0, r.abre[k], r.cierra[k])
+
+
+def unir(a, b, m):
+    """Resumen de a seguido de b (cualquiera puede ser None = tramo vacío)."""
+    if a is None: return b
+    if b is None: return a
+    t = m[a[1]][b[0]]
+    delta = a[3] - a[4] + t
+    espera = max(b[5] - delta - a[6], 0.0)
+    retraso = max(a[5] + delta - b[6], 0.0)
+    return (a[0], b[1], a[2] + b[2] + t, a[3] + b[3] + t + espera, a[4] + b[4] + retraso,
+            max(b[5] - delta, a[5]) - espera, min(b[6] - delta, a[6]) + retraso)
+
+
+def valor(resumen):
+    return 0.0 if resumen is None else resumen[2] + PESO_TARDANZA * resumen[4]
+
+
+def _valor_cadena(m, a, *resto):
+    """valor(unir(unir(a, b), ...)) sin crear las tuplas intermedias (piezas None se saltan)."""
+    ultimo, manejo, duracion, retraso, temprano, tarde = a[1], a[2], a[3], a[4], a[5], a[6]
+    for b in resto:
+        if b is None: continue
+        t = m[ultimo][b[0]]
+        delta = duracion - retraso + t
+        espera = b[5] - delta - tarde
+        if espera < 0.0: espera = 0.0
+        tarde_b = temprano + delta - b[6]
+        if tarde_b < 0.0: tarde_b = 0.0
+        temprano = max(b[5] - delta, temprano) - espera
+        tarde = min(b[6] - delta, tarde) + tarde_b
+        manejo += b[2] + t
+        duracion += b[3] + t + espera
+        retraso += b[4] + tarde_b
+        ultimo = b[1]
+    return manejo + PESO_TARDANZA * retraso
+
+
+def costo(ruta_local, m, r):
+    """manejo + PESO_TARDANZA * retraso de una ruta, simulándola (mismo valor que resumir)."""
+    t = manejo = retraso = 0.0
+    previo = None
+    for k in ruta_local:
+        if previo is not None:
+            viaje = m[previo][k]
+            manejo += viaje; t += viaje
+        if t < r.abre[k]: t = r.abre[k]
+        elif t > r.cierra[k]: retraso += t - r.cierra[k]; t = r.cierra[k]
+        t += r.servicio[k]; previo = k
+    return manejo + PESO_TARDANZA * retraso
+
+
+def resumir(ruta_local, m, r):
+    res = None
+    for k in ruta_local: res = unir(res, nodo(r, k), m)
+    return res
+
+
+def _prefijos_sufijos(ruta_local, m, r):
+    """(prefijos, sufijos, resumen de cada parada) por posición de la ruta."""
+    n = len(ruta_local)
+    solos = [nodo(r, k) for k in ruta_local]
+    pre, suf = [None] * (n + 1), [None] * (n + 1)
+    for k in range(n): pre[k + 1] = unir(pre[k], solos[k], m)
+    for k in range(n - 1, -1, -1): suf[k] = unir(solos[k], suf[k + 1], m)
+    return pre, suf, solos
+
+
+# =============================================================================
+# MOVIMIENTOS EN O(1)
+# =============================================================================
+def or_opt(ruta_local, m, lim, r):
+    """
+    Or-opt (tramos de 1-3 sin invertir) con ventanas: mismo recorrido de movimientos que
+    logica_rutas._or_opt, pero cada uno se evalúa concatenando resúmenes. El tramo que queda
+    entre el hueco y el destino crece de una parada por paso, así que también es O(1).
+    """
+    n = len(ruta_local)
+    pre, suf, solos = _prefijos_sufijos(ruta_local, m, r)
+    actual = valor(pre[n]) - 1e-9
+    P = PESO_TARDANZA
+    for largo in (1, 2, 3):
+        for i in range(1, lim - largo + 1):
+            tramo = solos[i]
+            for k in range(i + 1, i + largo): tramo = unir(tramo, solos[k], m)
+            s = suf[i + largo]
+            fijo = tramo[2] + P * tramo[4] + (s[2] + P * s[4] if s is not None else 0.0)
+            medio = None
+            for p in range(i - 1, 0, -1):  # antes: [:p] + tramo + [p:i] + [i+largo:]
+                medio = unir(solos[p], medio, m)
+                a = pre[p]
+                cota = fijo + a[2] + P * a[4] + medio[2] + P * medio[4] + m[a[1]][tramo[0]] + m[tramo[1]][medio[0]] + \
+                    (m[medio[1]][s[0]] if s is not None else 0.0)
+                if cota < actual and _valor_cadena(m, a, tramo, medio, s) < actual:
+                    ruta_local[:] = ruta_local[:p] + ruta_local[i:i + largo] + ruta_local[p:i] + ruta_local[i + largo:]
+                    return True
+            a = pre[i]
+            base = a[2] + P * a[4] + tramo[2] + P * tramo[4]
+            medio = None
+            for p in range(i + largo + 1, lim + 1):  # después: [:i] + [i+largo:p] + tramo + [p:]
+                medio = unir(medio, solos[p - 1], m)
+                s = suf[p]
+                cota = base + medio[2] + P * medio[4] + m[a[1]][medio[0]] + m[medio[1]][tramo[0]] + \
+                    (s[2] + P * s[4] + m[tramo[1]][s[0]] if s is not None else 0.0)
+                if cota < actual and _valor_cadena(m, a, medio, tramo, s) < actual:
+                    ruta_local[:] = ruta_local[:i] + ruta_local[i + largo:p] + ruta_local[i:i + largo] + ruta_local[p:]
+                    return True
+    return False
+
+
+def dos_opt(ruta_local, m, lim, r):
+    """2-opt con ventanas: el tramo invertido se arma de una parada por paso (O(1) por movimiento)."""
+    mejoro = False
+    P = PESO_TARDANZA
+    pre, suf, solos = _prefijos_sufijos(ruta_local, m, r)
+    for i in range(1, lim - 1):
+        actual = valor(pre[len(ruta_local)]) - 1e-9
+        a = pre[i]
+        base = a[2] + P * a[4]
+        invertido = solos[i]
+        for j in range(i + 2, lim + 1):  # invierte ruta_local[i:j]
+            invertido = unir(solos[j - 1], invertido, m)
+            s = suf[j]
+            cota = base + invertido[2] + P * invertido[4] + m[a[1]][invertido[0]] + \
+                (s[2] + P * s[4] + m[invertido[1]][s[0]] if s is not None else 0.0)
+            if cota < actual and _valor_cadena(m, a, invertido, s) < actual:
+                ruta_local[i:j] = ruta_local[i:j][::-1]; mejoro = True
+                pre, suf, solos = _prefijos_sufijos(ruta_local, m, r)
+                break
+    return mejoro
+
+
+# =============================================================================
+# HORARIO (REPORTE)
+# =============================================================================
+def horario(ruta_local, m, r):
+    """
+    Simulación directa de la ruta (salida en 0): por posición (llegada, inicio del servicio, retraso),
+    con la misma regla de retraso que los resúmenes (su suma es resumir(...)[4]).
+    """
+    res, t, previo = [], 0.0, None
+    for k in ruta_local:
+        llegada = t if previo is None else t + m[previo][k]
+        inicio = max(llegada, r.abre[k])
+        retraso = max(inicio - r.cierra[k], 0.0)
+        inicio -= retraso
+        res.append((llegada, inicio, retraso))
+        t, previo = inicio + r.servicio[k], k
+    return res
@@ -0,0 +1,130 @@
+# backend_arquitecturado/app/servidor.py
+"""
+Arranque con workers pre-forkeados que comparten el grafo (copy-on-write).
+
+Con `uvicorn --workers N` cada worker carga su propio grafo, índice, landmarks y perfiles:
+N veces la RAM y N veces el tiempo de arranque. Aquí el maestro lo carga UNA vez, lo congela
+fuera del recolector (gc.freeze) y después hace fork: los workers nacen con el grafo listo y
+sus páginas siguen siendo las del maestro mientras nadie las escriba.
+
+Uso (desde backend_arquitecturado/, sólo Linux/macOS):
+    python -m app.servidor --workers 4 --puerto 8000
+
+- gc.freeze: el recolector no vuelve a recorrer (ni marcar) los objetos del grafo, así que
+  una colección en un worker no ensucia sus páginas. Los conteos de referencias sí se escriben
+  al usar un objeto: lo que se toca en cada petición termina copiado, el resto queda compartido.
+- Los arreglos numpy (perfiles, landmarks, índice, matrices) son bloques grandes que no se
+  escriben: quedan compartidos completos; las tablas por zona ya eran mmap.
+- Los workers comparten el socket (el kernel reparte las conexiones). Si uno muere, el maestro
+  lo reemplaza con otro fork (sin volver a cargar nada).
+- /salud/memoria reporta memoria compartida vs privada de cada worker.
+- Con más de un worker los escenarios TIENEN que vivir en un almacén compartido: en memoria cada
+  worker tendría su propia copia de la sesión y el kernel reparte las peticiones entre ellos
+  (ediciones perdidas, deltas armados contra otra versión). Si FLEET_ESCENARIOS no está definido
+  se usa cache/escenarios.sqlite (en memoria sólo con --workers 1).
+"""
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+
+# Almacén compartido de escenarios cuando hay varios workers y FLEET_ESCENARIOS no está definido
+ESCENARIOS_POR_DEFECTO = os.path.join("cache", "escenarios.sqlite")
+
+
+def _worker(indice, sock, args):
+    """Proceso hijo: un servidor uvicorn normal sobre el socket del maestro. No regresa."""
+    codigo = 0
+    try:
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        import uvicorn
+        from app.core.mapa import ESTADO_CARGA
+        from app.main import app
+        ESTADO_CARGA["worker"] = indice
+        gc.enable()
+        uvicorn.Server(uvicorn.Config(app, log_level=args.log_level)).run(sockets=[sock])
+    except BaseException as e:
+        print(f">>> ❌ WORKER {indice} ({os.getpid()}): {e!r}")
+        codigo = 1
+    finally:
+        sys.stdout.flush()
+        os._exit(codigo)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fleet Master Pro con workers que comparten el grafo.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--puerto", type=int, default=8000)
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+    if not hasattr(os, "fork"): raise SystemExit("❌ app.servidor necesita fork (Linux/macOS); usa uvicorn")
+    if args.workers < 1: raise SystemExit("❌ --workers debe ser al menos 1")
+
+    # Antes de importar app.*: config lee FLEET_ESCENARIOS al importarse
+    if args.workers > 1 and not os.environ.get("FLEET_ESCENARIOS"):
+        os.environ["FLEET_ESCENARIOS"] = ESCENARIOS_POR_DEFECTO
+        print(f">>> 💾 {args.workers} WORKERS SIN FLEET_ESCENARIOS: escenarios compartidos en {ESCENARIOS_POR_DEFECTO}")
+
+    # Mientras se arma el grafo (millones de objetos) el recolector sólo estorba
+    gc.disable()
+    from app.core.mapa import ESTADO_CARGA
+    from app.core.config import imprimir_resumen
+    from app.main import preparar_grafo
+    imprimir_resumen()
+    t0 = time.time()
+    if preparar_grafo() is None: raise SystemExit("❌ No se pudo cargar el grafo")
+    ESTADO_CARGA["maestro"] = os.getpid()
+    gc.collect()
+    gc.freeze()
+    print(f">>> 🧊 GRAFO CONGELADO EN EL MAESTRO ({time.time() - t0:.0f}s, "
+          f"{gc.get_freeze_count()} objetos fuera del GC)")
+
+    sock = socket.socket(socket.AF_INET6 if ":" in args.host else socket.AF_INET)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.puerto))
+    sock.listen(2048)
+
+    workers = {}  # pid -> índice
+
+    def lanzar(indice):
+        pid = os.fork()
+        if pid == 0: _worker(indice, sock, args)
+        workers[pid] = indice
+
+    deteniendo = False
+
+    def detener(signum, frame):
+        nonlocal deteniendo
+        deteniendo = True
+        for pid in list(workers):
+            try: os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError: pass
+
+    signal.signal(signal.SIGTERM, detener)
+    signal.signal(signal.SIGINT, detener)
+    for i in range(args.workers): lanzar(i)
+    print(f">>> 🚀 {args.workers} WORKERS EN http://{args.host}:{args.puerto} (maestro {os.getpid()})")
+
+    while workers:
+        try:
+            pid, estado = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        indice = workers.pop(pid, None)
+        if indice is None or deteniendo: continue
+        print(f">>> ⚠️ WORKER {indice} ({pid}) terminó (estado {estado}); lanzando otro")
+        time.sleep(1)  # si falla al arrancar, no girar en seco
+        lanzar(indice)
+    sock.close()
+    print(">>> 👋 SERVIDOR DETENIDO")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+# backend_arquitecturado/tests/test_cache_tiempos.py
+"""Caché de tiempos en disco: los tiempos del corredor de un escenario nunca pasan por exactos."""
+import sqlite3
+import networkx as nx
+import pytest
+from app.core.grafo_sintetico import generar_grafo
+from app.services import cache_tiempos
+from app.services.cache_tiempos import guardar_tiempos, tiempos_desde
+from app.services.matrices import construir_matriz_tiempos, refinar_exactos
+from app.services.matriz_compacta import MatrizPerezosa
+
+CAJA = (19.0, 19.1, -99.1, -99.0)
+
+
+@pytest.fixture(scope="module")
+def G():
+    return generar_grafo(lado=15, semilla=4)
+
+
+@pytest.fixture(autouse=True)
+def cache_limpia(tmp_path, monkeypatch):
+    # cache/tiempos.sqlite relativo a una carpeta nueva por prueba
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(cache_tiempos, "_ALMACEN", None)
+
+
+def _par(G):
+    u, v = list(G.nodes)[0], list(G.nodes)[-1]
+    return u, v, nx.shortest_path_length(G, u, v, weight='travel_time')
+
+
+def test_corredor_solo_para_cajas_contenidas(G):
+    u, v, _ = _par(G)
+    guardar_tiempos(G, None, [(u, v, 999.0)], caja=CAJA)
+    assert tiempos_desde(G, None, u, [v]) == {}                                    # sin caja: sólo exactos
+    assert tiempos_desde(G, None, u, [v], caja=CAJA)[v][0] == 999.0
+    assert tiempos_desde(G, None, u, [v], caja=(19.02, 19.08, -99.08, -99.02))[v][0] == 999.0  # corredor más chico
+    assert tiempos_desde(G, None, u, [v], caja=(18.9, 19.1, -99.1, -99.0)) == {}   # más grande: buscaría mejor
+    with pytest.raises(ValueError):
+        guardar_tiempos(G, None, [(u, v, 999.0)])
+
+
+def test_corredor_no_pisa_exacto(G):
+    u, v, t = _par(G)
+    guardar_tiempos(G, None, [(u, v, 999.0)], caja=CAJA)
+    guardar_tiempos(G, None, [(u, v, t)], exactos=True)
+    guardar_tiempos(G, None, [(u, v, 999.0)], caja=CAJA)
+    assert tiempos_desde(G, None, u, [v])[v][0] == t
+    assert tiempos_desde(G, None, u, [v], caja=CAJA)[v][0] == t
+
+
+def test_refinar_ignora_tiempos_del_corredor(G):
+    u, v, t = _par(G)
+    guardar_tiempos(G, None, [(u, v, 999.0)], caja=CAJA)
+    nodos = [u, v]
+    m = MatrizPerezosa([G.nodes[n]['y'] for n in nodos], [G.nodes[n]['x'] for n in nodos])
+    refinar_exactos(G, m, nodos, [0, 1])
+    assert m.valor(0, 1) == pytest.approx(t)
+    assert tiempos_desde(G, None, u, [v])[v][0] == pytest.approx(t)
+
+
+def test_plan_repetido_sale_de_la_cache(G, capsys):
+    nodos = list(G.nodes)[::17][:8]
+    primera = construir_matriz_tiempos(G, nodos)
+    segunda = construir_matriz_tiempos(G, nodos)
+    assert "8/8 filas desde tabla/caché" in capsys.readouterr().out
+    assert (primera.densa() == segunda.densa()).all()
+
+
+def test_migracion_marca_exactos_solo_los_que_tienen_metros(G, tmp_path):
+    u, v, _ = _par(G)
+    version, perfil = cache_tiempos._clave(G, None)
+    (tmp_path / "cache").mkdir()
+    con = sqlite3.connect(tmp_path / "cache" / "tiempos.sqlite")
+    con.execute("""CREATE TABLE pares (
+        version TEXT NOT NULL, perfil TEXT NOT NULL, u INTEGER NOT NULL, v INTEGER NOT NULL,
+        tiempo REAL NOT NULL, metros REAL, camino BLOB, usado INTEGER NOT NULL,
+        PRIMARY KEY (version, perfil, u, v)) WITHOUT ROWID""")
+    con.execute("INSERT INTO pares VALUES (?, ?, ?, ?, 10.0, 100.0, NULL, 0)", (version, perfil, u, v))
+    con.execute("INSERT INTO pares VALUES (?, ?, ?, ?, 999.0, NULL, NULL, 0)", (version, perfil, v, u))
+    con.commit(); con.close()
+    assert tiempos_desde(G, None, u, [v])[v][0] == 10.0
+    assert tiempos_desde(G, None, v, [u], caja=CAJA) == {}  # corredor viejo sin caja: no se sabe de dónde salió
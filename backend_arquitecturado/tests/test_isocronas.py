@@ -0,0 +1,36 @@
+# backend_arquitecturado/tests/test_isocronas.py
+"""/isocrona: un alcance guardado con un corte mayor no debe romper una petición con un corte menor."""
+import pytest
+from app.core.grafo_sintetico import generar_grafo
+from app.routers import endpoints
+from app.services.busqueda import dijkstra_acotado
+from app.services.isocronas import isocronas
+
+
+@pytest.fixture(scope="module")
+def G():
+    return generar_grafo(lado=20, semilla=2)
+
+
+def test_dist_no_pasa_del_corte_mayor(G):
+    origen = next(iter(G.nodes))
+    isocronas(G, origen, [1800])
+    dist, capas = isocronas(G, origen, [60])
+    assert dist and max(dist.values()) <= 60
+    assert set(capas[0]["nodos"]) == set(dist)
+
+
+def test_isocrona_corte_menor_tras_uno_mayor(G, monkeypatch):
+    monkeypatch.setattr(endpoints, "get_grafo", lambda esperar=True: G)
+    origen = next(iter(G.nodes))
+    lat, lon = G.nodes[origen]['y'], G.nodes[origen]['x']
+    # una parada pendiente a más de 1 min pero dentro de 30
+    lejos = next(n for n, t in dijkstra_acotado(G, origen, corte=1800).items() if 120 < t < 1800)
+    with endpoints.ESCENARIOS.editar("prueba_isocrona") as cache:
+        cache["puntos"] = [{"id": "P-1", "estado": "PENDIENTE", "idx": 0}]
+        cache["nodos_totales"] = [lejos]
+
+    grande = endpoints.obtener_isocrona(lat, lon, minutos="30", sesion="prueba_isocrona")
+    assert [p["id"] for p in grande["paradas_alcanzables"]] == ["P-1"]
+    chica = endpoints.obtener_isocrona(lat, lon, minutos="1", sesion="prueba_isocrona")
+    assert chica["paradas_alcanzables"] == []
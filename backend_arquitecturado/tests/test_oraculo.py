@@ -0,0 +1,45 @@
+# backend_arquitecturado/tests/test_oraculo.py
+"""
+Corrida corta y con semilla fija del oráculo diferencial (app/herramientas/oraculo.py): cada motor
+rápido contra networkx / fuerza bruta en grafos sintéticos con laterales y regresos asimétricos.
+Desde backend_arquitecturado/:  python -m pytest -q
+"""
+import pytest
+from app.core.grafo_sintetico import generar_grafo
+from app.herramientas.oraculo import crear_parser, correr
+
+MOTORES = [
+    "dijkstra_acotado + metros", "A* bidireccional + ALT", "tramos (caché + A*)",
+    "matriz (corredor)", "matriz (caché en disco)", "calcular_metricas",
+    "optimizar_indices (Held-Karp)", "optimizar_indices (heurística, % brecha)",
+    "ventanas: costo (directo y por resúmenes)", "ventanas: or-opt O(1)", "ventanas: 2-opt O(1)",
+]
+
+
+@pytest.fixture(scope="module")
+def marcador():
+    # 13 paradas: una más que UMBRAL_EXACTO para que también corra la heurística
+    return correr(crear_parser().parse_args(["--casos", "4", "--semilla", "3", "--paradas", "13", "--pares", "10"]))
+
+
+@pytest.mark.parametrize("motor", MOTORES)
+def test_motor_dentro_de_tolerancia(marcador, motor):
+    r = marcador.motores[motor]
+    assert r["casos"] > 0
+    assert r["fallas"] == 0, r["ejemplos"]
+
+
+def test_grafo_sintetico_con_paralelas_y_asimetrias():
+    G = generar_grafo(lado=15, semilla=1, prob_paralela=0.3, asimetria=0.5)
+    tiempo = lambda u, v: min(d["travel_time"] for d in G._succ[u][v].values())
+    paralelas = [(u, v) for u, v in G.edges() if len(G._succ[u][v]) > 1]
+    # alguna lateral es más rápida que la primera arista: elegir por clave 0 daría otro tiempo
+    assert any(G._succ[u][v][0]["travel_time"] > tiempo(u, v) for u, v in paralelas)
+    assert any(G.has_edge(v, u) and abs(tiempo(u, v) - tiempo(v, u)) > 1e-6 for u, v in G.edges())
+    assert any(G.has_edge(u, v) and not G.has_edge(v, u) for u, v in G.edges())
+
+
+def test_grafo_sintetico_sin_opciones_no_cambia():
+    """Las opciones nuevas en 0 no gastan números al azar: la misma cuadrícula (y versión) de antes."""
+    G = generar_grafo(lado=15, semilla=1)
+    assert (G.graph["version_grafo"], G.number_of_edges()) == ("f8a59094a64b8f88", 753)
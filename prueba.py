@@ -4,6 +4,7 @@ import matplotlib.pyplot as plt
 import random
 import numpy as np
 from matplotlib.colors import hsv_to_rgb
+from matplotlib.collections import LineCollection
 from scipy.spatial import ConvexHull
 
 # --- CONFIGURACIÓN ---
@@ -44,10 +45,23 @@ for u, v, k, data in G.edges(keys=True, data=True):
     data['travel_time'] = data.get('length', 10) / velocidad
     data['color_visual'] = '#FFD700' if tipo in lista_avs else '#333333'
 
+# Segmentos y colores de la red: se arman UNA vez y se reutilizan en las 4 figuras
+SEGMENTOS_BASE, COLORES_BASE = [], []
+for u, v, k, data in G.edges(keys=True, data=True):
+    if 'geometry' in data: SEGMENTOS_BASE.append(np.asarray(data['geometry'].coords))
+    else: SEGMENTOS_BASE.append([(G.nodes[u]['x'], G.nodes[u]['y']), (G.nodes[v]['x'], G.nodes[v]['y'])])
+    COLORES_BASE.append(data['color_visual'])
+
 def dibujar_base_oscura(ax):
     ax.set_facecolor('black')
-    ec = [d['color_visual'] for u,v,k,d in G.edges(keys=True, data=True)]
-    ox.plot_graph(G, ax=ax, node_size=0, edge_color=ec, edge_linewidth=0.5, bgcolor='black', show=False, close=False)
+    ax.add_collection(LineCollection(SEGMENTOS_BASE, colors=COLORES_BASE, linewidths=0.5))
+    ax.autoscale_view(); ax.set_aspect('equal'); ax.axis('off')
+
+# Caminos entre paradas: se calculan una vez y los reusan métricas y figuras
+CAMINOS = {}
+def camino(u, v):
+    if (u, v) not in CAMINOS: CAMINOS[(u, v)] = nx.shortest_path(G, u, v, weight='travel_time')
+    return CAMINOS[(u, v)]
 
 # 2. PUNTOS
 todos = list(G.nodes())
@@ -85,7 +99,7 @@ def get_metrics(ruta):
     d_km = 0; t_min = 0
     for i in range(len(ruta) - 1):
         try:
-            path = nx.shortest_path(G, ruta[i], ruta[i+1], weight='travel_time')
+            path = camino(ruta[i], ruta[i+1])
             for u, v in zip(path[:-1], path[1:]):
                 ed = min(G[u][v].values(), key=lambda x: x['travel_time'])
                 d_km += ed['length']; t_min += ed['travel_time']/60.0
@@ -211,7 +225,7 @@ fig2.canvas.manager.set_window_title('Mapa 2: Ruta Global')
 dibujar_base_oscura(ax2)
 for i in range(len(ruta_global)-1):
     try:
-        p = nx.shortest_path(G, ruta_global[i], ruta_global[i+1], weight='travel_time')
+        p = camino(ruta_global[i], ruta_global[i+1])
         xp=[G.nodes[n]['x'] for n in p]; yp=[G.nodes[n]['y'] for n in p]
         ax2.plot(xp, yp, c='cyan', lw=3, alpha=0.8, zorder=5)
         if len(p)>=2:
@@ -254,7 +268,7 @@ for i, pts in enumerate(zonas_nodos):
     
     for j in range(len(ruta_int)-1):
         try:
-            p = nx.shortest_path(G, ruta_int[j], ruta_int[j+1], weight='travel_time')
+            p = camino(ruta_int[j], ruta_int[j+1])
             xp=[G.nodes[n]['x'] for n in p]; yp=[G.nodes[n]['y'] for n in p]
             ax3.plot(xp, yp, c=col, lw=2, alpha=0.9, zorder=5)
         except: pass
@@ -277,14 +291,14 @@ dibujar_base_oscura(ax4)
 # Fondo
 for i in range(len(ruta_global)-1):
     try:
-        p = nx.shortest_path(G, ruta_global[i], ruta_global[i+1], weight='travel_time')
+        p = camino(ruta_global[i], ruta_global[i+1])
         ax4.plot([G.nodes[n]['x'] for n in p], [G.nodes[n]['y'] for n in p], c='#555555', lw=4, alpha=0.5, zorder=4)
     except: pass
 
 # Frente
 for i in range(len(ruta_vip)-1):
     try:
-        p = nx.shortest_path(G, ruta_vip[i], ruta_vip[i+1], weight='travel_time')
+        p = camino(ruta_vip[i], ruta_vip[i+1])
         xp=[G.nodes[n]['x'] for n in p]; yp=[G.nodes[n]['y'] for n in p]
         ax4.plot(xp, yp, c='#FFD700', lw=3, alpha=1.0, zorder=6)
         if len(p)>=2: